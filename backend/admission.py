@@ -0,0 +1,166 @@
+# Contrôle d'admission et file à priorités devant les appels LLM
+import asyncio
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Deque, Dict, Optional, Tuple
+
+# Appels LLM simultanés admis par processus ; 0 = pas de contrôle d'admission
+ADMISSION_CAPACITY = int(os.getenv("ADMISSION_CAPACITY", "32"))
+# Classes "nom:poids:profondeur_max:délai_client_s", séparées par des virgules
+ADMISSION_CLASSES = os.getenv("ADMISSION_CLASSES", "telegram:4:200:15,web:2:200:30,batch:1:2000:600")
+
+
+class AdmissionRejected(Exception):
+    """Requête refusée sans appel amont : file pleine ou délai du client déjà dépassé"""
+
+    def __init__(self, reason: str):
+        super().__init__(f"Admission rejected: {reason}")
+        self.reason = reason
+
+
+class PriorityClass:
+    """Une classe de trafic : poids pour le partage, profondeur de file, délai côté client"""
+
+    __slots__ = ("name", "weight", "max_queue", "timeout", "queue", "vtime")
+
+    def __init__(self, name: str, weight: float, max_queue: int, timeout: float):
+        self.name = name
+        self.weight = weight
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.queue: Deque[Tuple[float, asyncio.Future]] = deque()
+        # Temps virtuel : avance de 1/poids à chaque admission depuis la file
+        self.vtime = 0.0
+
+
+def parse_classes(spec: str) -> Dict[str, PriorityClass]:
+    classes = {}
+    for item in spec.split(","):
+        name, weight, max_queue, timeout = item.strip().split(":")
+        classes[name] = PriorityClass(name, float(weight), int(max_queue), float(timeout))
+    return classes
+
+
+class AdmissionController:
+    """
+    Au plus `capacity` appels LLM en cours ; au-delà, les requêtes attendent
+    dans la file de leur classe. Quand une place se libère, la classe non vide
+    au plus petit temps virtuel est servie (partage pondéré : une classe de
+    poids 4 passe 4 fois plus souvent qu'une classe de poids 1, sans jamais
+    affamer les autres). Une requête est refusée tout de suite si sa file est
+    pleine ou si l'attente estimée dépasse le délai de son client, et retirée
+    de la file dès que ce délai ne laisse plus le temps d'un appel.
+    """
+
+    def __init__(self, capacity: int = ADMISSION_CAPACITY, classes: Optional[Dict[str, PriorityClass]] = None,
+                 alpha: float = 0.1):
+        self.capacity = capacity
+        self.classes = classes or parse_classes(ADMISSION_CLASSES)
+        self.active = 0
+        self.alpha = alpha
+        # Durée moyenne d'un appel (EWMA), pour estimer l'attente
+        self.service_time = 1.0
+        self._vtime = 0.0
+        self.stats = {"admitted": 0, "queued": 0, "rejected_queue_full": 0, "rejected_deadline": 0, "shed_deadline": 0}
+
+    def timeout(self, class_name: str) -> float:
+        """Délai côté client de la classe (budget par défaut d'une requête de cette classe)"""
+        return self.classes[class_name].timeout
+
+    def queued(self) -> int:
+        return sum(len(cls.queue) for cls in self.classes.values())
+
+    @asynccontextmanager
+    async def admit(self, class_name: str, deadline: Optional[float] = None):
+        """Réserve une place pour un appel LLM ; lève AdmissionRejected si la requête est délestée"""
+        if self.capacity <= 0:
+            yield
+            return
+        cls = self.classes[class_name]
+        now = time.monotonic()
+        deadline = deadline or now + cls.timeout
+        if self.active < self.capacity and not self.queued():
+            self.active += 1
+        else:
+            await self._wait(cls, now, deadline)
+        self.stats["admitted"] += 1
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.service_time += self.alpha * (time.monotonic() - start - self.service_time)
+            self._release()
+
+    async def _wait(self, cls: PriorityClass, now: float, deadline: float):
+        if len(cls.queue) >= cls.max_queue:
+            self.stats["rejected_queue_full"] += 1
+            raise AdmissionRejected("queue_full")
+        # Attente estimée : les requêtes devant nous, servies `capacity` à la fois
+        estimated_wait = (self.queued() + 1) * self.service_time / self.capacity
+        if now + estimated_wait + self.service_time > deadline:
+            self.stats["rejected_deadline"] += 1
+            raise AdmissionRejected("deadline")
+        if not cls.queue:
+            # Une classe qui redevient active ne récupère pas le crédit de sa période d'inactivité
+            cls.vtime = max(cls.vtime, self._vtime)
+        entry = (deadline, asyncio.get_running_loop().create_future())
+        cls.queue.append(entry)
+        self.stats["queued"] += 1
+        # Passé deadline - service_time, la réponse arriverait après l'abandon du client :
+        # on quitte la file à ce moment-là sans attendre qu'une place se libère
+        try:
+            await asyncio.wait_for(entry[1], max(deadline - now - self.service_time, 0))
+        except asyncio.TimeoutError:
+            self._leave(cls, entry)
+            self.stats["shed_deadline"] += 1
+            raise AdmissionRejected("deadline") from None
+        except asyncio.CancelledError:
+            self._leave(cls, entry)
+            raise
+
+    def _leave(self, cls: PriorityClass, entry: Tuple[float, asyncio.Future]):
+        """Retire un appelant parti de la file ; rend la place si elle lui avait déjà été attribuée"""
+        future = entry[1]
+        if future.done() and not future.cancelled() and future.exception() is None:
+            self._release()
+        elif entry in cls.queue:
+            cls.queue.remove(entry)
+
+    def _release(self):
+        self.active -= 1
+        while self.active < self.capacity:
+            future = self._next_waiter()
+            if future is None:
+                break
+            self.active += 1
+            future.set_result(None)
+
+    def _next_waiter(self) -> Optional[asyncio.Future]:
+        now = time.monotonic()
+        while True:
+            candidates = [cls for cls in self.classes.values() if cls.queue]
+            if not candidates:
+                return None
+            cls = min(candidates, key=lambda c: c.vtime)
+            deadline, future = cls.queue.popleft()
+            if future.done():
+                continue  # appelant parti entre-temps
+            if now + self.service_time > deadline:
+                # Le client aura abandonné avant la réponse : inutile de payer l'appel
+                self.stats["shed_deadline"] += 1
+                future.set_exception(AdmissionRejected("deadline"))
+                continue
+            self._vtime = cls.vtime
+            cls.vtime += 1 / cls.weight
+            return future
+
+    def get_stats(self) -> dict:
+        return dict(
+            self.stats,
+            active=self.active,
+            capacity=self.capacity,
+            service_time=round(self.service_time, 3),
+            queues={name: len(cls.queue) for name, cls in self.classes.items()},
+        )
@@ -0,0 +1,339 @@
+# Cache des réponses du LLM pour les questions répétées (mémoire LRU + disque optionnel)
+import asyncio
+import json
+import logging
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+import zlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Collection, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "10000"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", str(7 * 24 * 3600)))
+ANSWER_CACHE_DB = os.getenv("ANSWER_CACHE_DB") or None
+ANSWER_CACHE_NEAR_DUPLICATES = os.getenv("ANSWER_CACHE_NEAR_DUPLICATES", "0") == "1"
+ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.8"))
+# Réponses pré-générées (voir prewarm.py), chargées au démarrage si le fichier existe
+ANSWER_SNAPSHOT_PATH = os.getenv(
+    "ANSWER_SNAPSHOT_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "answer_snapshot.json"),
+)
+
+# Mots vides retirés avant de calculer la clé. Les négations (ne, n', pas, jamais...)
+# sont volontairement conservées : elles changent le sens de la question.
+STOP_WORDS = frozenset("""
+a au aux avec c ce ces cet cette d de des du elle elles en est et eux il ils
+j je l la le les leur leurs lui m ma mais me mes moi mon nos notre nous on
+ou par pour qu que qui s sa se ses son sur t ta te tes toi ton tu un une vos
+votre vous y ca cela vrai faux dis moi stp svp alors donc bien
+""".split())
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_NAME_PLACEHOLDER = "\x00NAME\x00"
+
+
+def normalize_question(text: str) -> str:
+    """Minuscules, sans accents, sans ponctuation ni mots vides"""
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return " ".join(t for t in _TOKEN_RE.findall(text) if t not in STOP_WORDS)
+
+
+def _whole_word(text: str) -> "re.Pattern":
+    return re.compile(r"(?<!\w)" + re.escape(text) + r"(?!\w)")
+
+
+_NAME_PLACEHOLDER_RE = _whole_word(_NAME_PLACEHOLDER)
+# En dessous, un prénom ("Al", "Jo") se confond trop facilement avec un mot de la réponse
+_MIN_SHARED_NAME_LENGTH = 3
+
+
+def depersonalize(answer: str, user_name: Optional[str]) -> Optional[str]:
+    """
+    Remplace le prénom de l'utilisateur (mots entiers seulement) par un marqueur
+    pour partager la réponse. Renvoie None si la réponse ne peut pas être partagée
+    sans risque : prénom trop court, ou présent aussi à l'intérieur d'un autre mot
+    ("Max" dans "Maximum", "Al" dans "Alcool").
+    """
+    if not user_name or user_name not in answer:
+        return answer
+    if len(user_name) < _MIN_SHARED_NAME_LENGTH:
+        return None
+    shared, replaced = _whole_word(user_name).subn(_NAME_PLACEHOLDER, answer)
+    if replaced != answer.count(user_name):
+        return None
+    return shared
+
+
+def personalize(answer: str, user_name: Optional[str]) -> str:
+    return _NAME_PLACEHOLDER_RE.sub(lambda _: user_name or "", answer)
+
+
+class MinHashIndex:
+    """
+    Index MinHash/LSH pour retrouver les reformulations proches d'une question
+    déjà en cache (similarité de Jaccard sur des 4-grammes de caractères).
+    """
+
+    _PRIME = (1 << 61) - 1
+
+    def __init__(self, num_perm: int = 64, bands: int = 16, seed: int = 42):
+        rng = random.Random(seed)
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self._coeffs = [(rng.randrange(1, self._PRIME), rng.randrange(0, self._PRIME)) for _ in range(num_perm)]
+        self._buckets: Dict[Tuple[int, tuple], set] = {}
+        self._signatures: Dict[str, tuple] = {}
+
+    def signature(self, normalized: str) -> tuple:
+        text = f" {normalized} "
+        shingles = {zlib.crc32(text[i:i + 4].encode()) for i in range(max(1, len(text) - 3))}
+        return tuple(
+            min((a * s + b) % self._PRIME for s in shingles)
+            for a, b in self._coeffs
+        )
+
+    def _band_keys(self, signature: tuple):
+        for band in range(self.bands):
+            yield band, signature[band * self.rows:(band + 1) * self.rows]
+
+    def add(self, key: str, normalized: str):
+        signature = self.signature(normalized)
+        self._signatures[key] = signature
+        for band_key in self._band_keys(signature):
+            self._buckets.setdefault(band_key, set()).add(key)
+
+    def remove(self, key: str):
+        signature = self._signatures.pop(key, None)
+        if signature is None:
+            return
+        for band_key in self._band_keys(signature):
+            bucket = self._buckets.get(band_key)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self._buckets[band_key]
+
+    def query(self, normalized: str, threshold: float, prefix: str) -> Optional[str]:
+        """Renvoie la clé la plus proche (même préfixe niveau/version) au-dessus du seuil"""
+        signature = self.signature(normalized)
+        candidates = set()
+        for band_key in self._band_keys(signature):
+            candidates.update(k for k in self._buckets.get(band_key, ()) if k.startswith(prefix))
+        best_key, best_score = None, threshold
+        for key in candidates:
+            other = self._signatures[key]
+            score = sum(1 for x, y in zip(signature, other) if x == y) / self.num_perm
+            if score >= best_score:
+                best_key, best_score = key, score
+        return best_key
+
+
+class AnswerCache:
+    """
+    Cache LRU avec TTL et taille bornée, indexé par (question normalisée, niveau,
+    version du prompt). Un second niveau SQLite optionnel survit aux redémarrages.
+    Les accès SQLite passent par un thread dédié : les écritures sont différées
+    (write-behind) et aget() attend la lecture sans bloquer la boucle asyncio.
+    """
+
+    def __init__(
+        self,
+        max_size: int = ANSWER_CACHE_SIZE,
+        ttl: float = ANSWER_CACHE_TTL,
+        db_path: Optional[str] = ANSWER_CACHE_DB,
+        near_duplicates: bool = ANSWER_CACHE_NEAR_DUPLICATES,
+        similarity_threshold: float = ANSWER_CACHE_SIMILARITY,
+    ):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._index = MinHashIndex() if near_duplicates else None
+        self._db = None
+        self._disk: Optional[ThreadPoolExecutor] = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS answers ("
+                "key TEXT PRIMARY KEY, answer TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            # Un seul thread : les accès disque restent dans l'ordre de soumission
+            self._disk = ThreadPoolExecutor(max_workers=1, thread_name_prefix="answer-cache-db")
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "disk_hits": 0, "near_hits": 0,
+                      "snapshot_entries": 0, "unshareable": 0}
+
+    @staticmethod
+    def make_key(question: str, niveau: str, prompt_version: str) -> str:
+        return f"{prompt_version}|{niveau}|{normalize_question(question)}"
+
+    def get(self, question: str, niveau: str, prompt_version: str, user_name: Optional[str] = None,
+            allow_stale: bool = False) -> Optional[str]:
+        """
+        Renvoie la réponse en cache, ou None. Avec allow_stale, une réponse expirée
+        est acceptée (repli quand le fournisseur est indisponible). Lecture disque
+        synchrone : depuis la boucle asyncio, utiliser aget().
+        """
+        key = self.make_key(question, niveau, prompt_version)
+        now = 0.0 if allow_stale else time.time()
+        answer = self._lookup_memory(key, niveau, prompt_version, now)
+        if answer is None and self._db is not None:
+            answer = self._disk.submit(self._lookup_disk, key, now).result()
+        return self._count(answer, user_name)
+
+    async def aget(self, question: str, niveau: str, prompt_version: str, user_name: Optional[str] = None,
+                   allow_stale: bool = False) -> Optional[str]:
+        """get() pour les gestionnaires async : la mémoire d'abord, SQLite dans le thread dédié"""
+        key = self.make_key(question, niveau, prompt_version)
+        now = 0.0 if allow_stale else time.time()
+        answer = self._lookup_memory(key, niveau, prompt_version, now)
+        if answer is None and self._db is not None:
+            answer = await asyncio.wrap_future(self._disk.submit(self._lookup_disk, key, now))
+        return self._count(answer, user_name)
+
+    def set(self, question: str, niveau: str, prompt_version: str, answer: str, user_name: Optional[str] = None):
+        """
+        Enregistre une réponse réussie du LLM (sauf si le prénom ne peut pas en être
+        retiré sans risque). La copie SQLite est écrite en arrière-plan.
+        """
+        key = self.make_key(question, niveau, prompt_version)
+        expires_at = time.time() + self.ttl
+        answer = depersonalize(answer, user_name)
+        if answer is None:
+            # Réponse liée à ce prénom : elle n'est pas mise en cache plutôt que mal personnalisée
+            self.stats["unshareable"] += 1
+            return
+        with self._lock:
+            self._put_memory(key, answer, expires_at)
+        if self._db is not None:
+            self._disk.submit(self._store_disk, key, answer, expires_at)
+
+    def _lookup_memory(self, key: str, niveau: str, prompt_version: str, now: float) -> Optional[str]:
+        with self._lock:
+            answer = self._get_memory(key, now)
+            if answer is None and self._index is not None:
+                prefix = f"{prompt_version}|{niveau}|"
+                near_key = self._index.query(key[len(prefix):], self.similarity_threshold, prefix)
+                if near_key is not None:
+                    answer = self._get_memory(near_key, now)
+                    if answer is not None:
+                        self.stats["near_hits"] += 1
+            return answer
+
+    def _lookup_disk(self, key: str, now: float) -> Optional[str]:
+        # Thread du disque uniquement
+        row = self._db.execute("SELECT answer, expires_at FROM answers WHERE key = ?", (key,)).fetchone()
+        if not row or row[1] <= now:
+            return None
+        with self._lock:
+            self._put_memory(key, row[0], row[1])
+            self.stats["disk_hits"] += 1
+        return row[0]
+
+    def _store_disk(self, key: str, answer: str, expires_at: float):
+        # Thread du disque uniquement ; une erreur ne doit pas passer inaperçue
+        try:
+            self._db.execute(
+                "INSERT OR REPLACE INTO answers (key, answer, expires_at) VALUES (?, ?, ?)",
+                (key, answer, expires_at),
+            )
+        except sqlite3.Error:
+            logger.exception(f"Answer cache: SQLite write failed for {key[:80]}")
+
+    def _count(self, answer: Optional[str], user_name: Optional[str]) -> Optional[str]:
+        with self._lock:
+            self.stats["misses" if answer is None else "hits"] += 1
+        return None if answer is None else personalize(answer, user_name)
+
+    def _get_memory(self, key: str, now: float) -> Optional[str]:
+        # Les entrées expirées restent en place (repli possible) jusqu'à leur éviction LRU
+        entry = self._entries.get(key)
+        if entry is None or entry[0] <= now:
+            return None
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def _put_memory(self, key: str, answer: str, expires_at: float):
+        if key in self._entries:
+            self._entries.move_to_end(key)
+        elif self._index is not None:
+            self._index.add(key, key.split("|", 2)[2])
+        self._entries[key] = (expires_at, answer)
+        while len(self._entries) > self.max_size:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.stats["evictions"] += 1
+
+    def _remove(self, key: str):
+        self._entries.pop(key, None)
+        if self._index is not None:
+            self._index.remove(key)
+
+    def export(self, prompt_versions: Collection[str]) -> Dict[str, str]:
+        """Entrées valides (sans prénom) des versions de prompt données : {clé: réponse}"""
+        now = time.time()
+        with self._lock:
+            return {key: answer for key, (expires_at, answer) in self._entries.items()
+                    if expires_at > now and key.split("|", 1)[0] in prompt_versions}
+
+    def load_snapshot(self, path: str, prompt_versions: Collection[str]) -> int:
+        """
+        Charge un instantané de réponses pré-générées. Les entrées d'une version de
+        prompt qui n'existe plus sont ignorées : modifier un prompt invalide
+        l'instantané sans autre action. Renvoie le nombre d'entrées chargées.
+        """
+        with open(path, encoding="utf-8") as f:
+            entries = json.load(f).get("entries", {})
+        expires_at = time.time() + self.ttl
+        loaded = 0
+        with self._lock:
+            for key, answer in entries.items():
+                if key.split("|", 1)[0] in prompt_versions:
+                    self._put_memory(key, answer, expires_at)
+                    loaded += 1
+        self.stats["snapshot_entries"] = loaded
+        logger.info(f"Answer snapshot {path}: {loaded} entries loaded, {len(entries) - loaded} stale")
+        return loaded
+
+    def load_snapshot_if_present(self, path: Optional[str], prompt_versions: Collection[str]) -> int:
+        """Étape de préchauffage : sans effet si aucun instantané n'a été déployé"""
+        if not path or not os.path.exists(path):
+            return 0
+        return self.load_snapshot(path, prompt_versions)
+
+    def get_stats(self) -> Dict[str, int]:
+        """Compteurs hits / misses / evictions et taille courante"""
+        with self._lock:
+            return dict(self.stats, size=len(self._entries))
+
+    def close(self):
+        if self._db is not None:
+            # Les écritures différées en attente sont terminées avant la fermeture
+            self._disk.shutdown(wait=True)
+            self._db.close()
+            self._db = None
+
+
+def write_snapshot(path: str, entries: Dict[str, str], prompt_versions: Collection[str]):
+    """Écrit un instantané de réponses (remplacement atomique : le service ne lit jamais un fichier partiel)"""
+    snapshot = {
+        "created_at": time.time(),
+        "prompt_versions": sorted(prompt_versions),
+        "entries": {key: answer for key, answer in sorted(entries.items())
+                    if key.split("|", 1)[0] in prompt_versions},
+    }
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(snapshot, f, ensure_ascii=False, indent=0)
+    os.replace(tmp_path, path)
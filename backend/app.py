@@ -1,264 +1,314 @@
-import os
-import requests
-import logging
-import json
-import re
-from datetime import datetime
-from fastapi import FastAPI
-from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from dotenv import load_dotenv
-
-# Configuration du logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('factcheck_bot.log'),
-        logging.StreamHandler()
-    ]
-)
-logger = logging.getLogger(__name__)
-
-# Charger les clés depuis le .env
-load_dotenv()
-API_TOKEN_TOGETHER = os.getenv("API_TOKEN_TOGETHER")
-
-API_URL = "https://api.together.xyz/v1/chat/completions"
-HEADERS = {
-    "Authorization": f"Bearer {API_TOKEN_TOGETHER}",
-    "Content-Type": "application/json"
-}
-
-# Stockage temporaire des utilisateurs (optionnel, ici stateless)
-user_data = {}
-
-class FactCheckBot:
-    def __init__(self):
-        self.sensitive_words = {
-            "high_risk": ["sexe", "viol", "suicide", "pornographie", "meurtre", "terrorisme"],
-            "medium_risk": ["drogue", "alcool", "violence", "accident"],
-            "topics_needing_adult": ["politique", "économie", "guerre", "religion"]
-        }
-
-    def log_user_interaction(self, user_id: str, message: str, response: str, user_level: str):
-        log_entry = {
-            "timestamp": datetime.now().isoformat(),
-            "user_id": user_id,
-            "user_level": user_level,
-            "message_length": len(message),
-            "response_length": len(response),
-            "message": message[:100] + "..." if len(message) > 100 else message
-        }
-        logger.info(f"User interaction: {json.dumps(log_entry)}")
-
-    def analyze_content_safety(self, text: str, user_level: str):
-        text_lower = text.lower()
-        for word in self.sensitive_words["high_risk"]:
-            if word in text_lower:
-                if user_level == "enfant":
-                    return False, "HIGH", "⛔ Cette question n'est pas adaptée aux enfants. Tu peux demander à un adulte de t'aider."
-                elif user_level == "ado":
-                    return False, "HIGH", "⚠️ Ce sujet est très sensible. Il est préférable d'en parler avec un adulte de confiance."
-        for word in self.sensitive_words["medium_risk"]:
-            if word in text_lower:
-                if user_level == "enfant":
-                    return False, "MEDIUM", "⚠️ Ce sujet est compliqué pour ton âge. Demande plutôt à un adulte !"
-                elif user_level == "ado":
-                    return True, "MEDIUM", None
-        for topic in self.sensitive_words["topics_needing_adult"]:
-            if topic in text_lower and user_level == "enfant":
-                return False, "SUPERVISION", "🤔 C'est un sujet d'adulte. Demande plutôt à tes parents ou ton professeur !"
-        return True, "SAFE", None
-
-    def get_optimized_prompt(self, user_name: str, user_level: str, user_age: int) -> str:
-        base_identity = "Tu es DinoBot, une IA spécialisée dans la vérification d'informations."
-        prompts = {
-            "enfant": f"""
-{base_identity}
-
-CONTEXTE UTILISATEUR:
-- Nom: {user_name}
-- Âge: {user_age} ans (enfant)
-- Niveau: Primaire
-
-INSTRUCTIONS SPÉCIFIQUES:
-1. Utilise un vocabulaire très simple (niveau CE1-CE2)
-2. Explique avec des exemples concrets du quotidien
-3. Reste toujours bienveillant et encourageant
-4. Si l'information est complexe, propose de demander à un adulte
-5. Utilise un ou deux émojis pour rendre la réponse plus chaleureuse
-6. Limite ta réponse à 1 ou 2 phrases courtes
-7. Réponds toujours en français
-
-IMPORTANT :
-- NE DONNE JAMAIS d'exemple de format, de balises, ni de texte entre crochets dans ta réponse finale.
-- Ne recopie pas les mots "[Émoji] [Réponse simple] [Encouragement ou conseil]" ou tout autre exemple de format.
-- Ta réponse doit être naturelle, sans structure ni balises, juste la réponse pour l'enfant.
-            """,
-            "ado": f"""
-{base_identity}
-
-CONTEXTE UTILISATEUR:
-- Nom: {user_name}
-- Âge: {user_age} ans (adolescent)
-- Niveau: Collège/Lycée
-
-INSTRUCTIONS SPÉCIFIQUES:
-1. Utilise un langage simple, jamais infantilisant
-2. Explique de façon claire et concise (2 phrases max)
-3. Ajoute un émoji si pertinent
-4. Encourage l'esprit critique
-5. Si c'est trop complexe, propose de demander à un adulte
-6. Réponds toujours en français
-
-IMPORTANT :
-- NE DONNE JAMAIS d'exemple de format, de balises, ni de texte entre crochets dans ta réponse finale.
-- Ne recopie pas les mots "[Émoji] [Réponse simple] [Encouragement ou conseil]" ou tout autre exemple de format.
-- Ta réponse doit être naturelle, sans structure ni balises, juste la réponse pour l'ado.
-            """,
-            "adulte": f"""
-{base_identity}
-
-CONTEXTE UTILISATEUR:
-- Nom: {user_name}
-- Âge: {user_age} ans (adulte)
-- Niveau: Mature
-
-INSTRUCTIONS SPÉCIFIQUES:
-1. Fournis une réponse concise et factuelle (2-3 phrases max)
-2. Explique ta méthodologie si pertinent, mais reste bref
-3. Réponds toujours en français
-
-IMPORTANT :
-- NE DONNE JAMAIS d'exemple de format, de balises, ni de texte entre crochets dans ta réponse finale.
-- Ta réponse doit être naturelle, sans structure ni balises.
-            """
-        }
-        return prompts.get(user_level, prompts["adulte"])
-
-    def chat_with_ai(self, user_input: str, user_name: str, user_level: str, user_age: int) -> str:
-        is_safe, warning_level, safety_message = self.analyze_content_safety(user_input, user_level)
-        if not is_safe:
-            logger.warning(f"Unsafe content detected - Level: {warning_level}, User: {user_name} ({user_level})")
-            return safety_message
-        system_prompt = self.get_optimized_prompt(user_name, user_level, user_age)
-        payload = {
-            "model": "mistralai/Mixtral-8x7B-Instruct-v0.1",
-            "messages": [
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_input}
-            ],
-            "temperature": 0.3,
-            "max_tokens": 300 if user_level != "enfant" else 200,
-            "top_p": 0.85
-        }
-        try:
-            logger.info(f"API call for user {user_name} ({user_level}): {user_input[:50]}...")
-            response = requests.post(API_URL, headers=HEADERS, json=payload, timeout=30)
-            if response.status_code == 200:
-                ai_response = response.json()['choices'][0]['message']['content'].strip()
-                logger.info(f"Successful API response for {user_name}")
-                return ai_response
-            else:
-                logger.error(f"API Error {response.status_code}: {response.text}")
-                return self.get_error_message(user_level, "api_error")
-        except requests.exceptions.Timeout:
-            logger.error(f"Timeout for user {user_name}")
-            return self.get_error_message(user_level, "timeout")
-        except Exception as e:
-            logger.error(f"Unexpected error for user {user_name}: {str(e)}")
-            return self.get_error_message(user_level, "general_error")
-
-    def get_error_message(self, user_level: str, error_type: str) -> str:
-        messages = {
-            "enfant": {
-                "api_error": "😅 Oups ! J'ai un petit problème technique. Peux-tu réessayer dans quelques minutes ?",
-                "timeout": "⏰ Je réfléchis trop lentement ! Peux-tu me reposer ta question ?",
-                "general_error": "🤖 J'ai un petit bug ! Essaie de me poser ta question différemment."
-            },
-            "ado": {
-                "api_error": "⚠️ Problème technique temporaire. Réessaie dans quelques instants.",
-                "timeout": "⏱️ La connexion est lente. Peux-tu reformuler ta question ?",
-                "general_error": "🔧 Erreur système. Essaie avec une formulation différente."
-            },
-            "adulte": {
-                "api_error": "Erreur API temporaire. Veuillez réessayer ultérieurement.",
-                "timeout": "Délai de connexion dépassé. Reformulez votre question.",
-                "general_error": "Erreur technique. Essayez une formulation alternative."
-            }
-        }
-        return messages.get(user_level, messages["adulte"]).get(error_type, "Erreur inconnue.")
-
-# Instance globale du bot
-factcheck_bot = FactCheckBot()
-
-# --- FastAPI app ---
-app = FastAPI()
-
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
-class ChatRequest(BaseModel):
-    message: str
-    name: str
-    age: int
-
-# --- Filtres fact-check et sécurité ---
-def is_fact_check_question(text):
-    text = text.lower().strip()
-    if text.endswith("?"):
-        return True
-    patterns = [
-        r"est[- ]ce que", r"c'est vrai", r"c'est faux", r"est[- ]ce une info",
-        r"peut[- ]on croire", r"ai[- ]je raison", r"vrai ou faux", r"infox", r"intox",
-        r"les .* existent", r"existe[- ]t[- ]il", r"sont[- ]ils réels", r"as[- ]tu vérifié",
-        r"la vérité sur", r"mythe ou réalité", r"les gens disent que"
-    ]
-    return any(re.search(pat, text) for pat in patterns)
-
-def is_malicious_bypass_attempt(text):
-    keywords = [
-        "écris un code", "code python", "programme", "fonction", "script", "traduis", "résume",
-        "donne moi un code", "crée un", "génère", "exemple de", "poème", "dessine", "fais une blague",
-        "joue", "jouons", "imagine", "raconte", "rédige", "écris une", "fais moi un", "compile", "corrige"
-    ]
-    return any(kw in text.lower() for kw in keywords)
-
-@app.post("/chat")
-async def chat_endpoint(req: ChatRequest):
-    # Logique d'accueil et de gestion du "state" utilisateur (stateless ici)
-    if req.name == "":
-        return {"response": "👋 Bonjour ! Je suis DinoBot. Pour commencer, dis-moi ton prénom 🙂"}
-    if req.age == 0:
-        return {"response": f"Enchanté {req.name} ! Quel âge as-tu ?"}
-    try:
-        age = int(req.age)
-    except Exception:
-        return {"response": "Peux-tu m’indiquer ton âge avec un nombre ? (ex : 10)"}
-    if age < 11:
-        niveau = "enfant"
-    elif age < 15:
-        niveau = "ado"
-    else:
-        niveau = "adulte"
-    # Filtre pour éviter que l'IA réponde à un simple nombre (âge)
-    if req.message.strip().isdigit() and 3 <= int(req.message.strip()) <= 120:
-        return {"response": "Merci pour ton âge ! Pose-moi maintenant une question à vérifier (ex : 'Est-ce que les chats ont 9 vies ?')."}
-    # Filtres fact-check et sécurité
-    if is_malicious_bypass_attempt(req.message):
-        return {"response": "🚫 Je suis uniquement un assistant de vérification d'informations. Je ne peux pas faire de code, de poème ou répondre à d'autres types de demandes."}
-    if not is_fact_check_question(req.message):
-        return {"response": "❗ Je suis DinoBot. Pose-moi une question pour savoir si une information est vraie ou fausse."}
-    response = factcheck_bot.chat_with_ai(req.message, req.name, niveau, age)
-    factcheck_bot.log_user_interaction(req.name, req.message, response, niveau)
-    return {"response": response}
-
-@app.get("/")
-def read_root():
-    return {"message": "DinoBot backend is running!"}
+import asyncio
+import math
+import os
+import logging
+import json
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional, Tuple
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from pydantic import BaseModel, ValidationError
+from logging_pipeline import setup_logging
+from metrics import REFUSALS, REQUESTS, STAGE_SECONDS, CONTENT_TYPE, registry
+import factcheck_core
+from factcheck_core import PROFILES, FactCheckBot, is_fact_check_question, is_malicious_bypass_attempt
+from fact_base import fact_base
+from intent_classifier import Intent, intent_classifier
+from text_matcher import content_matcher
+from traffic_capture import traffic_capture
+from warmup import WARMUP_ENABLED, FirstRequestMiddleware, warmup
+
+logger = logging.getLogger(__name__)
+
+# Derrière un reverse proxy, identifier le client par X-Forwarded-For
+RATE_LIMIT_TRUST_PROXY = os.getenv("RATE_LIMIT_TRUST_PROXY", "0") == "1"
+
+# Sert aussi le webhook Telegram dans ce processus : les deux interfaces partagent
+# alors le même cache des réponses et le même pool HTTP (voir factcheck_core.py)
+SERVE_TELEGRAM_WEBHOOK = os.getenv("SERVE_TELEGRAM_WEBHOOK", "0") == "1"
+
+# Vérification par lots (/check/batch) : appels LLM simultanés par requête et taille maximale
+CHECK_BATCH_CONCURRENCY = int(os.getenv("CHECK_BATCH_CONCURRENCY", "16"))
+CHECK_BATCH_MAX_CLAIMS = int(os.getenv("CHECK_BATCH_MAX_CLAIMS", "5000"))
+CHECK_BATCH_DEFAULT_NAME = os.getenv("CHECK_BATCH_DEFAULT_NAME", "Rédaction")
+CHECK_BATCH_DEFAULT_AGE = int(os.getenv("CHECK_BATCH_DEFAULT_AGE", "30"))
+
+# Moteur commun, profil "web" : persona DinoBot, budget LLM de LLM_TIMEOUT_WEB secondes
+factcheck_bot = FactCheckBot(PROFILES["web"])
+
+if SERVE_TELEGRAM_WEBHOOK:
+    import telegram_webhook
+
+# --- FastAPI app ---
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Journaux (écriture disque dans un thread dédié, voir logging_pipeline.py), capture
+    # du trafic (TRAFFIC_CAPTURE=1) et ressources partagées : ouverts ici, pas à l'import
+    setup_logging("api")
+    traffic_capture.setup("api")
+    factcheck_core.setup()
+    # Index et connexions préparés en tâche de fond : le serveur répond dès maintenant
+    if WARMUP_ENABLED:
+        warmup.start()
+    if SERVE_TELEGRAM_WEBHOOK:
+        await telegram_webhook.start()
+    yield
+    if SERVE_TELEGRAM_WEBHOOK:
+        await telegram_webhook.stop()
+    await factcheck_core.aclose()
+
+app = FastAPI(lifespan=lifespan)
+
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+app.add_middleware(FirstRequestMiddleware)
+
+if SERVE_TELEGRAM_WEBHOOK:
+    app.include_router(telegram_webhook.router)
+
+class ChatRequest(BaseModel):
+    message: str
+    name: str
+    age: int
+    # Identifiant de conversation choisi par le client : les échanges sont gardés pour le contexte multi-tours
+    session_id: Optional[str] = None
+    # Question sur la réponse précédente : l'historique de la session est alors envoyé au LLM
+    follow_up: bool = False
+
+def prepare_chat(req: ChatRequest, matches: Optional[Dict[str, List[str]]] = None,
+                 intent: Optional[Intent] = None) -> Tuple[Optional[str], str, int, Dict[str, List[str]]]:
+    """
+    Étapes communes à /chat, /chat/stream et /check/batch avant l'appel au LLM.
+    `matches` et `intent` peuvent être calculés à l'avance (classification de tout un lot).
+    Returns: (réponse immédiate ou None, niveau, âge, catégories trouvées)
+    """
+    # Logique d'accueil et de gestion du "state" utilisateur (stateless ici)
+    if req.name == "":
+        return "👋 Bonjour ! Je suis DinoBot. Pour commencer, dis-moi ton prénom 🙂", "", 0, {}
+    if req.age == 0:
+        return f"Enchanté {req.name} ! Quel âge as-tu ?", "", 0, {}
+    try:
+        age = int(req.age)
+    except Exception:
+        return "Peux-tu m’indiquer ton âge avec un nombre ? (ex : 10)", "", 0, {}
+    if age < 11:
+        niveau = "enfant"
+    elif age < 15:
+        niveau = "ado"
+    else:
+        niveau = "adulte"
+    # Filtre pour éviter que l'IA réponde à un simple nombre (âge)
+    if req.message.strip().isdigit() and 3 <= int(req.message.strip()) <= 120:
+        return "Merci pour ton âge ! Pose-moi maintenant une question à vérifier (ex : 'Est-ce que les chats ont 9 vies ?').", niveau, age, {}
+    # Filtres fact-check et sécurité (une seule passe sur le message)
+    REQUESTS.inc(niveau)
+    with STAGE_SECONDS.time("filters"):
+        if matches is None:
+            matches = content_matcher.classify(req.message)
+        # Classifieur d'intention local : accepte une affirmation sans "?" ; "off_topic" laisse décider les règles
+        if intent is None:
+            intent = intent_classifier.predict(req.message)
+        is_bypass = is_malicious_bypass_attempt(req.message, matches, intent)
+        is_question = not is_bypass and is_fact_check_question(req.message, matches, intent)
+    if is_bypass:
+        REFUSALS.inc("bypass")
+        return "🚫 Je suis uniquement un assistant de vérification d'informations. Je ne peux pas faire de code, de poème ou répondre à d'autres types de demandes.", niveau, age, matches
+    if not is_question:
+        REFUSALS.inc("off_topic" if intent is not None and intent.label == "off_topic" else "non_question")
+        return "❗ Je suis DinoBot. Pose-moi une question pour savoir si une information est vraie ou fausse.", niveau, age, matches
+    return None, niveau, age, matches
+
+def client_identity(request: Request) -> str:
+    """Clé de limitation de débit : adresse du client (ou du premier proxy de confiance)"""
+    if RATE_LIMIT_TRUST_PROXY and request.headers.get("X-Forwarded-For"):
+        return request.headers["X-Forwarded-For"].split(",")[0].strip()
+    return request.client.host if request.client else "unknown"
+
+def conversation_session(req: ChatRequest, request: Request) -> Optional[str]:
+    """session_id lié à l'adresse du client : un identifiant deviné ne donne pas l'historique d'un autre"""
+    return f"{client_identity(request)}:{req.session_id}" if req.session_id else None
+
+@app.post("/chat")
+async def chat_endpoint(req: ChatRequest, request: Request):
+    with STAGE_SECONDS.time("handler"):
+        traffic_capture.record_request("web", req.message, req.name, req.age, req.session_id,
+                                       client_identity(request))
+        early_response, niveau, age, matches = prepare_chat(req)
+        if early_response is not None:
+            return {"response": early_response}
+        # Affirmation déjà vérifiée : réponse immédiate, sans appel LLM
+        session_id = conversation_session(req, request)
+        fast_response = factcheck_bot.fast_answer(req.message, niveau, matches, session_id)
+        if fast_response is not None:
+            factcheck_bot.log_user_interaction(req.name, req.message, fast_response, niveau)
+            return {"response": fast_response}
+        early_response = await factcheck_bot.check_rate_limit(client_identity(request), req.message, niveau)
+        if early_response is not None:
+            return {"response": early_response}
+        response = await factcheck_bot.achat_with_ai(req.message, req.name, niveau, age, matches,
+                                                     session_id=session_id, follow_up=req.follow_up)
+        factcheck_bot.log_user_interaction(req.name, req.message, response, niveau)
+        return {"response": response}
+
+def sse_event(data: dict) -> str:
+    return f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+@app.post("/chat/stream")
+async def chat_stream_endpoint(req: ChatRequest, request: Request):
+    # Même logique que /chat, mais les tokens sont envoyés en Server-Sent Events dès
+    # leur arrivée. Les refus avant LLM sont envoyés comme un unique événement final.
+    traffic_capture.record_request("web_stream", req.message, req.name, req.age, req.session_id,
+                                   client_identity(request))
+    early_response, niveau, age, matches = prepare_chat(req)
+    session_id = conversation_session(req, request)
+    if early_response is None:
+        early_response = factcheck_bot.fast_answer(req.message, niveau, matches, session_id)
+        if early_response is not None:
+            factcheck_bot.log_user_interaction(req.name, req.message, early_response, niveau)
+    if early_response is None:
+        early_response = await factcheck_bot.check_rate_limit(client_identity(request), req.message, niveau)
+    if early_response is not None:
+        final_event = sse_event({"response": early_response, "done": True})
+        return StreamingResponse(iter([final_event]), media_type="text/event-stream", headers=SSE_HEADERS)
+
+    async def event_stream():
+        # Si le client se déconnecte, Starlette annule ce générateur, ce qui ferme
+        # le stream en amont et arrête la génération facturée.
+        with STAGE_SECONDS.time("handler"):
+            async for event in factcheck_bot.astream_chat_with_ai(req.message, req.name, niveau, age, matches,
+                                                                  session_id=session_id,
+                                                                  follow_up=req.follow_up):
+                if event.get("done"):
+                    factcheck_bot.log_user_interaction(req.name, req.message, event["response"], niveau)
+                yield sse_event(event)
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+class BatchClaim(BaseModel):
+    message: str
+    name: str = CHECK_BATCH_DEFAULT_NAME
+    age: int = CHECK_BATCH_DEFAULT_AGE
+
+def parse_batch_claims(body: bytes, content_type: str) -> List[BatchClaim]:
+    """
+    Corps de /check/batch : liste JSON (ou {"claims": [...]}) ou NDJSON, une
+    affirmation par ligne. Chaque élément est un texte ou un objet {message, name, age}.
+    """
+    text = body.decode("utf-8")
+    if "ndjson" in content_type or "jsonl" in content_type:
+        items = [json.loads(line) for line in text.splitlines() if line.strip()]
+    else:
+        data = json.loads(text)
+        items = data.get("claims", []) if isinstance(data, dict) else data
+    if not isinstance(items, list):
+        raise ValueError("Expected a list of claims")
+    return [BatchClaim(message=item) if isinstance(item, str) else BatchClaim(**item) for item in items]
+
+@app.post("/check/batch")
+async def check_batch_endpoint(request: Request):
+    # Les filtres sont appliqués à tout le lot d'un coup, puis les appels LLM partent
+    # en parallèle (CHECK_BATCH_CONCURRENCY au plus). Les résultats sont renvoyés en
+    # NDJSON dans l'ordre où ils se terminent, avec l'indice de l'affirmation.
+    try:
+        claims = parse_batch_claims(await request.body(), request.headers.get("content-type", ""))
+    except (UnicodeDecodeError, ValueError, TypeError, ValidationError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid claims: {e}")
+    if len(claims) > CHECK_BATCH_MAX_CLAIMS:
+        raise HTTPException(status_code=413, detail=f"At most {CHECK_BATCH_MAX_CLAIMS} claims per batch")
+    all_matches = content_matcher.classify_many(claim.message for claim in claims)
+    all_intents = intent_classifier.predict_many(claim.message for claim in claims)
+    prepared = []
+    for claim, matches, intent in zip(claims, all_matches, all_intents):
+        chat_request = ChatRequest(message=claim.message, name=claim.name, age=claim.age)
+        prepared.append(prepare_chat(chat_request, matches, intent))
+    # Réponses sans appel LLM (base locale, cache) avant la réservation : seules les
+    # affirmations qui iront au LLM sont comptées sur le budget du client
+    answered = {}
+    for index, (claim, (early_response, niveau, age, matches)) in enumerate(zip(claims, prepared)):
+        if early_response is not None:
+            continue
+        fast_response = factcheck_bot.fast_answer(claim.message, niveau, matches)
+        if fast_response is not None:
+            answered[index] = ("fact_base", fast_response)
+            continue
+        cached = await factcheck_bot.cached_answer(claim.message, claim.name, niveau, matches)
+        if cached is not None:
+            answered[index] = ("checked", cached)
+    # Réservées d'un coup : un lot qui ne tient pas est refusé en entier, avant le moindre appel facturé
+    to_check = sum(1 for index, (early_response, *_) in enumerate(prepared)
+                   if early_response is None and index not in answered)
+    wait = await factcheck_core.rate_limiter.acquire_batch(client_identity(request), to_check)
+    if wait is not None:
+        REFUSALS.inc("rate_limit")
+        if math.isinf(wait):
+            raise HTTPException(status_code=429, detail=f"{to_check} claims exceed this client's hourly batch budget")
+        raise HTTPException(status_code=429, detail="Batch budget exhausted for this client",
+                            headers={"Retry-After": str(math.ceil(wait))})
+    semaphore = asyncio.Semaphore(CHECK_BATCH_CONCURRENCY)
+
+    async def check_claim(index: int, claim: BatchClaim, niveau: str, age: int, matches) -> dict:
+        async with semaphore:
+            # Le lot a déjà été réservé sur le budget du client ; reste le budget global de tokens
+            refusal = await factcheck_bot.check_rate_limit(None, claim.message, niveau)
+            if refusal is not None:
+                return {"index": index, "status": "rate_limited", "response": refusal}
+            response = await factcheck_bot.achat_with_ai(claim.message, claim.name, niveau, age, matches,
+                                                         priority="batch")
+        factcheck_bot.log_user_interaction(claim.name, claim.message, response, niveau)
+        return {"index": index, "status": "checked", "response": response}
+
+    async def result_stream():
+        tasks = []
+        for index, (claim, (early_response, niveau, age, matches)) in enumerate(zip(claims, prepared)):
+            if early_response is not None:
+                yield json.dumps({"index": index, "status": "filtered", "response": early_response},
+                                 ensure_ascii=False) + "\n"
+            elif index in answered:
+                status, response = answered[index]
+                factcheck_bot.log_user_interaction(claim.name, claim.message, response, niveau)
+                yield json.dumps({"index": index, "status": status, "response": response}, ensure_ascii=False) + "\n"
+            else:
+                tasks.append(asyncio.ensure_future(check_claim(index, claim, niveau, age, matches)))
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield json.dumps(await next_done, ensure_ascii=False) + "\n"
+        finally:
+            # Client déconnecté : les vérifications restantes sont abandonnées
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(result_stream(), media_type="application/x-ndjson")
+
+@app.get("/cache/stats")
+def cache_stats():
+    return dict(factcheck_core.answer_cache.get_stats(), single_flight=factcheck_core.single_flight.stats, fact_base=fact_base.get_stats(),
+                intent=intent_classifier.get_stats())
+
+@app.get("/llm/stats")
+def llm_stats():
+    return factcheck_core.get_stats()
+
+@app.get("/metrics")
+def metrics_endpoint():
+    return Response(registry.render(), media_type=CONTENT_TYPE)
+
+@app.get("/healthz")
+def healthz():
+    # Vivant : le processus répond, même pendant le préchauffage
+    return {"status": "ok"}
+
+@app.get("/readyz")
+def readyz():
+    return JSONResponse(warmup.get_state(), status_code=200 if warmup.ready else 503)
+
+@app.get("/")
+def read_root():
+    return {"message": "DinoBot backend is running!"}
@@ -0,0 +1,78 @@
+# Micro-batching des appels LLM pour un serveur d'inférence auto-hébergé (vLLM, llama.cpp)
+import asyncio
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, List, Set, Tuple
+
+import httpx
+
+
+class MicroBatchDispatcher:
+    """
+    Regroupe les requêtes qui arrivent dans une courte fenêtre (max_wait_ms) ou
+    jusqu'à max_batch_size, puis les envoie ensemble en rafale parallèle : les
+    serveurs à batching continu les traitent alors dans le même lot GPU.
+    Chaque appelant reçoit la réponse de sa propre requête.
+    """
+
+    def __init__(self, send: Callable[[dict], Awaitable[httpx.Response]],
+                 max_wait_ms: float = 5, max_batch_size: int = 32, history: int = 1000):
+        self._send = send
+        self.max_wait = max_wait_ms / 1000
+        self.max_batch_size = max_batch_size
+        self._pending: List[Tuple[dict, asyncio.Future]] = []
+        self._timer = None
+        # Lots en cours d'envoi : la boucle asyncio ne garde qu'une référence faible aux tâches
+        self._tasks: Set[asyncio.Task] = set()
+        # (taille du lot, latence du lot en secondes) pour les derniers lots envoyés
+        self._history: Deque[Tuple[int, float]] = deque(maxlen=history)
+        self.stats = {"batches": 0, "requests": 0, "abandoned": 0}
+
+    async def submit(self, payload: dict) -> httpx.Response:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((payload, future))
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        # Appelants déjà partis (client déconnecté, timeout) : leur requête n'est pas envoyée
+        live = [(payload, future) for payload, future in batch if not future.cancelled()]
+        self.stats["abandoned"] += len(batch) - len(live)
+        if live:
+            task = asyncio.ensure_future(self._send_batch(live))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _send_batch(self, batch: List[Tuple[dict, asyncio.Future]]):
+        start = time.perf_counter()
+        results = await asyncio.gather(*(self._send(payload) for payload, _ in batch), return_exceptions=True)
+        self._history.append((len(batch), time.perf_counter() - start))
+        self.stats["batches"] += 1
+        self.stats["requests"] += len(batch)
+        for (_, future), result in zip(batch, results):
+            if future.done():
+                continue  # appelant annulé entre-temps
+            if isinstance(result, BaseException):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    def get_stats(self) -> dict:
+        """Nombre de lots, taille et taux de remplissage moyens, latence moyenne et max des lots récents"""
+        sizes = [size for size, _ in self._history]
+        latencies = [latency for _, latency in self._history]
+        return dict(
+            self.stats,
+            avg_batch_size=sum(sizes) / len(sizes) if sizes else 0,
+            avg_occupancy=sum(sizes) / len(sizes) / self.max_batch_size if sizes else 0,
+            avg_batch_latency_ms=1000 * sum(latencies) / len(latencies) if latencies else 0,
+            max_batch_latency_ms=1000 * max(latencies) if latencies else 0,
+        )
@@ -0,0 +1 @@
+# Benchmarks et tests de charge hors ligne (voir la section Benchmarks du README)
@@ -0,0 +1,192 @@
+# Générateur de charge à débit cible (boucle ouverte) pour /chat
+#
+# Usage autonome (démarre le faux fournisseur et l'API, sans réseau) :
+#   python -m bench.loadgen --spawn --rps 50 --duration 30
+# Contre une API déjà lancée (--pid pour mesurer sa mémoire) :
+#   python -m bench.loadgen --url http://127.0.0.1:8000 --rps 50 --duration 30 --pid 12345
+import argparse
+import asyncio
+import os
+import random
+import subprocess
+import sys
+import time
+from collections import Counter
+from typing import List, Optional
+
+import httpx
+
+from bench.report import latency_summary, rss_mb, save_report
+from prompts import ERROR_MESSAGES
+
+QUESTIONS = [
+    "Est-ce que les chats ont {i} vies ?",
+    "C'est vrai que {i} dinosaures vivaient en France ?",
+    "Est-ce que la Lune est à {i} kilomètres de la Terre ?",
+    "Vrai ou faux : on voit {i} étoiles à l'oeil nu ?",
+]
+AGES = [8, 12, 35]
+# Les refus (limitation de débit, délestage, erreurs) sont des réponses 200 : reconnus à leur texte
+_ERROR_KINDS = {text: kind for messages in ERROR_MESSAGES.values() for kind, text in messages.items()}
+
+
+def response_outcome(text: Optional[str]) -> str:
+    """"answered", ou le type d'erreur ("rate_limited", "busy", "timeout"...) dont c'est le message"""
+    return _ERROR_KINDS.get(text, "answered")
+
+
+def make_request(i: int, repeat_ratio: float) -> dict:
+    """Questions uniques par défaut ; repeat_ratio en reprend une parmi 20 (effet du cache)"""
+    n = random.randrange(20) if random.random() < repeat_ratio else i
+    return {"message": random.choice(QUESTIONS).format(i=n), "name": f"user{i % 1000}", "age": random.choice(AGES)}
+
+
+async def run_load(url: str, rps: float, duration: float, repeat_ratio: float,
+                   timeout: float, pid: Optional[int]) -> dict:
+    latencies: List[float] = []
+    statuses: Counter = Counter()
+    outcomes: Counter = Counter()
+    rss_samples: List[float] = []
+    total = int(rps * duration)
+
+    async def one(client: httpx.AsyncClient, i: int):
+        start = time.perf_counter()
+        try:
+            response = await client.post(f"{url}/chat", json=make_request(i, repeat_ratio))
+            statuses[str(response.status_code)] += 1
+            if response.status_code == 200:
+                # Seules les vraies réponses comptent dans la latence et le débit
+                outcome = response_outcome(response.json().get("response"))
+                outcomes[outcome] += 1
+                if outcome == "answered":
+                    latencies.append(time.perf_counter() - start)
+        except (httpx.HTTPError, ValueError) as e:
+            statuses[type(e).__name__] += 1
+
+    async def sample_rss():
+        while True:
+            value = rss_mb(pid) if pid else None
+            if value is not None:
+                rss_samples.append(value)
+            await asyncio.sleep(0.5)
+
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=200)
+    async with httpx.AsyncClient(timeout=timeout, limits=limits) as client:
+        sampler = asyncio.ensure_future(sample_rss())
+        tasks = []
+        start = time.perf_counter()
+        # Boucle ouverte : les requêtes partent à l'heure prévue, même si les précédentes traînent
+        for i in range(total):
+            delay = start + i / rps - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.ensure_future(one(client, i)))
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - start
+        sampler.cancel()
+
+    return {
+        "requests": total,
+        "succeeded": len(latencies),
+        "statuses": dict(statuses),
+        "outcomes": dict(outcomes),
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else 0,
+        "latency": latency_summary(latencies),
+        "server_rss_mb": {
+            "peak": max(rss_samples) if rss_samples else None,
+            "final": rss_samples[-1] if rss_samples else None,
+        },
+    }
+
+
+def fetch_token_usage(url: str) -> Optional[dict]:
+    """Tokens par niveau et coût estimé, vus par le serveur (GET /llm/stats)"""
+    try:
+        return httpx.get(f"{url}/llm/stats", timeout=5).json().get("usage")
+    except (httpx.HTTPError, ValueError):
+        return None
+
+
+def server_env(mock_port: int, user_rate_limit: bool = False) -> dict:
+    """
+    Environnement de l'API pointée sur le faux fournisseur. Toute la charge vient
+    d'une seule adresse : sans `user_rate_limit`, la limite par utilisateur est
+    levée (sauf RATE_LIMIT_USER_PER_MINUTE explicite), sinon on mesurerait ses refus.
+    """
+    env = dict(
+        os.environ,
+        LLM_API_URL=f"http://127.0.0.1:{mock_port}/v1/chat/completions",
+        API_TOKEN_TOGETHER="bench",
+        LLM_BACKENDS_PATH="",
+        # Les logs par requête fausseraient la mesure
+        LOG_LEVEL=os.getenv("LOG_LEVEL", "WARNING"),
+    )
+    if not user_rate_limit:
+        env["RATE_LIMIT_USER_PER_MINUTE"] = os.getenv("RATE_LIMIT_USER_PER_MINUTE", "0")
+    return env
+
+
+def spawn_servers(api_port: int, mock_port: int, mock_args: List[str],
+                  env: Optional[dict] = None) -> List[subprocess.Popen]:
+    """Démarre le faux fournisseur et l'API (uvicorn) pointée dessus, attend qu'ils répondent"""
+    env = env or server_env(mock_port)
+    mock = subprocess.Popen([sys.executable, "-m", "bench.mock_llm", "--port", str(mock_port)] + mock_args, env=env)
+    api = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:app", "--port", str(api_port), "--log-level", "warning"], env=env
+    )
+    for port in (mock_port, api_port):
+        for _ in range(100):
+            try:
+                httpx.get(f"http://127.0.0.1:{port}/", timeout=1)
+                break
+            except httpx.HTTPError:
+                time.sleep(0.1)
+        else:
+            for process in (mock, api):
+                process.terminate()
+            raise RuntimeError(f"Le serveur du port {port} n'a pas démarré")
+    return [mock, api]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Test de charge de /chat à débit cible")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--rps", type=float, default=20)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--repeat-ratio", type=float, default=0.0, help="part de questions répétées")
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--pid", type=int, help="PID du serveur dont on mesure la mémoire")
+    parser.add_argument("--spawn", action="store_true", help="démarre le faux fournisseur et l'API")
+    parser.add_argument("--api-port", type=int, default=8765)
+    parser.add_argument("--mock-port", type=int, default=9765)
+    parser.add_argument("--mock-latency-ms", type=float, default=300)
+    parser.add_argument("--mock-error-rate", type=float, default=0.0)
+    parser.add_argument("--output", help="chemin du rapport JSON (défaut : bench_results/)")
+    args = parser.parse_args()
+
+    processes = []
+    url, pid = args.url, args.pid
+    if args.spawn:
+        mock_args = ["--latency-ms", str(args.mock_latency_ms), "--error-rate", str(args.mock_error_rate)]
+        processes = spawn_servers(args.api_port, args.mock_port, mock_args)
+        url, pid = f"http://127.0.0.1:{args.api_port}", processes[1].pid
+    try:
+        results = asyncio.run(run_load(url, args.rps, args.duration, args.repeat_ratio, args.timeout, pid))
+        results["token_usage"] = fetch_token_usage(url)
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait()
+    print(f"{results['succeeded']}/{results['requests']} répondues en {results['elapsed_s']} s, "
+          f"{results['throughput_rps']} req/s, latence {results['latency']}, mémoire {results['server_rss_mb']}")
+    print(f"  issues {results['outcomes']}, statuts HTTP {results['statuses']}")
+    for niveau, usage in (results["token_usage"] or {}).get("levels", {}).items():
+        print(f"  {niveau:<8} tokens/question {usage['per_question']}, en cache {usage['cached_ratio']:.0%}, "
+              f"{usage['cost_per_1000_questions_usd']} $ / 1000 questions")
+    config = {key: value for key, value in vars(args).items() if key != "output"}
+    print(f"Rapport : {save_report('loadgen', config, results, args.output)}")
+
+
+if __name__ == "__main__":
+    main()
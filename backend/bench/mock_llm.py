@@ -0,0 +1,180 @@
+# Faux serveur /v1/chat/completions (compatible OpenAI / Together) pour les benchmarks
+#
+# Usage : python -m bench.mock_llm --port 9000 --latency-ms 400 --sigma 0.5 --error-rate 0.01
+# puis  : LLM_API_URL=http://127.0.0.1:9000/v1/chat/completions uvicorn app:app
+# Avec --recording capture_api.jsonl, les réponses du fournisseur enregistrées par la
+# capture de trafic sont rejouées (même latence, même longueur) pour les mêmes questions.
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import random
+import time
+from typing import Dict, List, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from traffic_capture import read_capture, upstream_key
+
+# Distribution de latence log-normale : médiane MOCK_LATENCY_MS, dispersion MOCK_SIGMA
+MOCK_LATENCY_MS = float(os.getenv("MOCK_LATENCY_MS", "300"))
+MOCK_SIGMA = float(os.getenv("MOCK_SIGMA", "0.4"))
+# Part des réponses en erreur 5xx et en 429 (limite de débit)
+MOCK_ERROR_RATE = float(os.getenv("MOCK_ERROR_RATE", "0"))
+MOCK_RATE_LIMIT_RATE = float(os.getenv("MOCK_RATE_LIMIT_RATE", "0"))
+# Délai entre deux tokens en mode stream
+MOCK_TOKEN_DELAY_MS = float(os.getenv("MOCK_TOKEN_DELAY_MS", "10"))
+MOCK_ANSWER = os.getenv(
+    "MOCK_ANSWER",
+    "C'est vrai ! Les scientifiques l'ont vérifié plusieurs fois. Bonne question, continue à être curieux !",
+)
+
+# Cache de préfixe simulé : les messages de tête déjà vus sont comptés en cached_tokens
+MOCK_PREFIX_CACHE = os.getenv("MOCK_PREFIX_CACHE", "1") == "1"
+MOCK_PREFIX_CACHE_SIZE = 10000
+
+app = FastAPI()
+stats = {"requests": 0, "errors": 0, "rate_limited": 0, "recorded": 0}
+_seen_prefixes = set()
+# Réponses enregistrées (--recording) : clé de la requête -> réponses, servies à tour de rôle
+recordings: Dict[str, List[dict]] = {}
+_recording_turns: Dict[str, int] = {}
+
+
+def count_tokens(messages: list) -> tuple:
+    """
+    (tokens du prompt, tokens déjà en cache), à raison de 4 caractères par token.
+    Comme un vrai cache de préfixe, seuls les messages de tête identiques à une
+    requête précédente comptent : un message différent interrompt la réutilisation.
+    """
+    total = sum(len(m.get("content", "")) for m in messages) // 4
+    cached_chars = 0
+    digest = hashlib.sha1()
+    reusing = MOCK_PREFIX_CACHE
+    for message in messages[:-1]:
+        digest.update(json.dumps(message, sort_keys=True).encode("utf-8"))
+        key = digest.hexdigest()
+        if reusing and key in _seen_prefixes:
+            cached_chars += len(message.get("content", ""))
+        else:
+            reusing = False
+            if len(_seen_prefixes) >= MOCK_PREFIX_CACHE_SIZE:
+                _seen_prefixes.clear()
+            _seen_prefixes.add(key)
+    return total, cached_chars // 4
+
+
+def sample_latency() -> float:
+    return MOCK_LATENCY_MS / 1000 * random.lognormvariate(0, MOCK_SIGMA)
+
+
+def load_recording(paths: List[str]) -> int:
+    for event in read_capture(paths):
+        if event.get("kind") == "upstream":
+            recordings.setdefault(event["key"], []).append(event)
+    return sum(len(records) for records in recordings.values())
+
+
+def recorded_answer(messages: list) -> Optional[dict]:
+    """Réponse enregistrée pour cette question (ordre d'enregistrement, en boucle), sinon None"""
+    key = upstream_key(messages)
+    records = recordings.get(key)
+    if not records:
+        return None
+    turn = _recording_turns.get(key, 0)
+    _recording_turns[key] = turn + 1
+    stats["recorded"] += 1
+    return records[turn % len(records)]
+
+
+def filler(words: int) -> str:
+    """Texte de la longueur d'une réponse anonymisée (dont seul le nombre de mots est connu)"""
+    base = MOCK_ANSWER.split()
+    return " ".join(base[i % len(base)] for i in range(max(words, 1)))
+
+
+def usage(prompt_tokens: int, cached_tokens: int, completion_tokens: int) -> dict:
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+        "prompt_tokens_details": {"cached_tokens": cached_tokens},
+    }
+
+
+def completion(model: str, answer: str, usage: dict) -> dict:
+    return {
+        "id": f"mock-{stats['requests']}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": answer}, "finish_reason": "stop"}],
+        "usage": usage,
+    }
+
+
+async def stream_chunks(model: str, answer: str, final_usage: Optional[dict]):
+    for word in answer.split(" "):
+        await asyncio.sleep(MOCK_TOKEN_DELAY_MS / 1000)
+        chunk = {"model": model, "choices": [{"index": 0, "delta": {"content": word + " "}}]}
+        yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+    if final_usage is not None:
+        yield f"data: {json.dumps({'model': model, 'choices': [], 'usage': final_usage})}\n\n"
+    yield "data: [DONE]\n\n"
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    payload = await request.json()
+    stats["requests"] += 1
+    draw = random.random()
+    if draw < MOCK_RATE_LIMIT_RATE:
+        stats["rate_limited"] += 1
+        return JSONResponse({"error": "rate limited"}, status_code=429, headers={"Retry-After": "1"})
+    messages = payload.get("messages", [])
+    record = recorded_answer(messages) if recordings else None
+    await asyncio.sleep(record["latency_s"] if record else sample_latency())
+    if draw < MOCK_RATE_LIMIT_RATE + MOCK_ERROR_RATE:
+        stats["errors"] += 1
+        return JSONResponse({"error": "upstream unavailable"}, status_code=503)
+    model = payload.get("model", "mock")
+    answer = (record.get("content") or filler(record.get("words") or 0)) if record else MOCK_ANSWER
+    prompt_tokens, cached_tokens = count_tokens(messages)
+    completion_tokens = ((record or {}).get("usage") or {}).get("completion_tokens") or len(answer.split())
+    answer_usage = usage(prompt_tokens, cached_tokens, completion_tokens)
+    if payload.get("stream"):
+        include_usage = (payload.get("stream_options") or {}).get("include_usage")
+        return StreamingResponse(stream_chunks(model, answer, answer_usage if include_usage else None),
+                                 media_type="text/event-stream")
+    return completion(model, answer, answer_usage)
+
+
+@app.get("/stats")
+def mock_stats():
+    return stats
+
+
+def main():
+    global MOCK_LATENCY_MS, MOCK_SIGMA, MOCK_ERROR_RATE, MOCK_RATE_LIMIT_RATE
+    parser = argparse.ArgumentParser(description="Faux serveur de complétion pour les benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--latency-ms", type=float, default=MOCK_LATENCY_MS)
+    parser.add_argument("--sigma", type=float, default=MOCK_SIGMA)
+    parser.add_argument("--error-rate", type=float, default=MOCK_ERROR_RATE)
+    parser.add_argument("--rate-limit-rate", type=float, default=MOCK_RATE_LIMIT_RATE)
+    parser.add_argument("--recording", nargs="*", default=[], help="fichiers de capture de trafic (réponses amont)")
+    args = parser.parse_args()
+    MOCK_LATENCY_MS, MOCK_SIGMA = args.latency_ms, args.sigma
+    MOCK_ERROR_RATE, MOCK_RATE_LIMIT_RATE = args.error_rate, args.rate_limit_rate
+    if args.recording:
+        print(f"{load_recording(args.recording)} réponses enregistrées chargées")
+
+    import uvicorn
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
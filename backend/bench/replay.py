@@ -0,0 +1,185 @@
+# Rejeu d'un trafic capturé (TRAFFIC_CAPTURE=1, voir traffic_capture.py) contre une instance
+#
+# Usage autonome (faux fournisseur et API démarrés localement, sans réseau) :
+#   python -m bench.replay capture_api.jsonl --spawn --speed 1
+#   python -m bench.replay capture_api.jsonl capture_bot.jsonl --spawn --upstream recorded --speed 10
+# Contre une API déjà lancée, à vitesse maximale (16 requêtes en parallèle) :
+#   python -m bench.replay capture_api.jsonl --url http://127.0.0.1:8000 --speed max --concurrency 16
+#
+# Les requêtes partent aux mêmes écarts que dans la capture, divisés par --speed
+# (boucle ouverte) ; "max" les envoie aussi vite que --concurrency le permet. Les
+# questions Telegram sont rejouées sur /chat (même moteur, persona web). Le client
+# capturé est transmis dans X-Forwarded-For : avec RATE_LIMIT_TRUST_PROXY=1 (mis
+# par --spawn), la limitation par utilisateur voit la même répartition qu'en production.
+# Les refus (limitation, délestage) sont comptés à part et exclus des latences.
+import argparse
+import asyncio
+import json
+import time
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional
+
+import httpx
+
+from bench.loadgen import fetch_token_usage, response_outcome, server_env, spawn_servers
+from bench.report import latency_summary, percentile, rss_mb, save_report
+from traffic_capture import read_capture
+
+ENDPOINTS = {"web": "/chat", "web_stream": "/chat/stream", "telegram": "/chat"}
+
+
+def load_requests(paths: List[str], limit: Optional[int]) -> List[dict]:
+    requests = [event for event in read_capture(paths) if event.get("kind") == "request"]
+    return requests[:limit] if limit else requests
+
+
+async def replay(url: str, requests: List[dict], speed: Optional[float], concurrency: int,
+                 timeout: float, pid: Optional[int]) -> dict:
+    """`speed` None : vitesse maximale, `concurrency` requêtes à la fois"""
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    first_events: List[float] = []
+    statuses: Counter = Counter()
+    outcomes: Counter = Counter()
+    lags: List[float] = []
+    rss_samples: List[float] = []
+    semaphore = asyncio.Semaphore(concurrency) if speed is None else None
+
+    async def one(client: httpx.AsyncClient, envelope: dict):
+        source = envelope.get("source", "web")
+        body = {"message": envelope["message"], "name": envelope["name"], "age": envelope["age"]}
+        if envelope.get("session_id"):
+            body["session_id"] = envelope["session_id"]
+        headers = {"X-Forwarded-For": envelope["client"]} if envelope.get("client") else {}
+        start = time.perf_counter()
+        try:
+            first = None
+            if source == "web_stream":
+                async with client.stream("POST", ENDPOINTS[source], json=body, headers=headers) as response:
+                    final = None
+                    async for line in response.aiter_lines():
+                        if line.startswith("data:"):
+                            if first is None:
+                                first = time.perf_counter() - start
+                            final = line[len("data:"):]
+                    text = json.loads(final).get("response") if final else None
+            else:
+                response = await client.post(ENDPOINTS.get(source, "/chat"), json=body, headers=headers)
+                text = response.json().get("response") if response.status_code == 200 else None
+            statuses[str(response.status_code)] += 1
+            if response.status_code == 200:
+                outcome = response_outcome(text)
+                outcomes[outcome] += 1
+                if outcome == "answered":
+                    latencies[source].append(time.perf_counter() - start)
+                    if first is not None:
+                        first_events.append(first)
+        except (httpx.HTTPError, ValueError) as e:
+            statuses[type(e).__name__] += 1
+
+    async def bounded(client: httpx.AsyncClient, envelope: dict):
+        async with semaphore:
+            await one(client, envelope)
+
+    async def sample_rss():
+        while True:
+            value = rss_mb(pid) if pid else None
+            if value is not None:
+                rss_samples.append(value)
+            await asyncio.sleep(0.5)
+
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=200)
+    async with httpx.AsyncClient(base_url=url, timeout=timeout, limits=limits) as client:
+        sampler = asyncio.ensure_future(sample_rss())
+        tasks = []
+        origin = requests[0]["ts"] if requests else 0.0
+        start = time.perf_counter()
+        for envelope in requests:
+            if speed is None:
+                tasks.append(asyncio.ensure_future(bounded(client, envelope)))
+                continue
+            # Boucle ouverte : chaque requête part à son heure, même si les précédentes traînent
+            due = start + (envelope["ts"] - origin) / speed
+            delay = due - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            lags.append(max(0.0, time.perf_counter() - due))
+            tasks.append(asyncio.ensure_future(one(client, envelope)))
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - start
+        sampler.cancel()
+
+    all_latencies = [value for values in latencies.values() for value in values]
+    captured_span = requests[-1]["ts"] - requests[0]["ts"] if len(requests) > 1 else 0.0
+    return {
+        "requests": len(requests),
+        "succeeded": len(all_latencies),
+        "statuses": dict(statuses),
+        "outcomes": dict(outcomes),
+        "captured_span_s": round(captured_span, 3),
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(all_latencies) / elapsed, 2) if elapsed else 0,
+        "latency": latency_summary(all_latencies),
+        "latency_by_source": {source: latency_summary(values) for source, values in latencies.items()},
+        "stream_first_event": latency_summary(first_events),
+        # Retard d'envoi sur l'horaire prévu : s'il grandit, c'est le rejeu qui sature, pas le serveur
+        "send_lag_p99_ms": round(percentile(lags, 0.99) * 1000, 3) if lags else None,
+        "mix": dict(Counter(envelope.get("source", "web") for envelope in requests)),
+        "server_rss_mb": {
+            "peak": max(rss_samples) if rss_samples else None,
+            "final": rss_samples[-1] if rss_samples else None,
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rejeu d'un trafic capturé contre une instance de l'API")
+    parser.add_argument("captures", nargs="+", help="fichiers capture_*.jsonl (rotations .gz comprises)")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--speed", default="1", help="facteur d'accélération (1, 10...) ou max")
+    parser.add_argument("--concurrency", type=int, default=32, help="requêtes simultanées avec --speed max")
+    parser.add_argument("--limit", type=int, help="nombre maximal de requêtes rejouées")
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--pid", type=int, help="PID du serveur dont on mesure la mémoire")
+    parser.add_argument("--spawn", action="store_true", help="démarre le faux fournisseur et l'API")
+    parser.add_argument("--upstream", choices=("mock", "recorded"), default="mock",
+                        help="avec --spawn : réponses synthétiques, ou celles enregistrées dans la capture")
+    parser.add_argument("--api-port", type=int, default=8767)
+    parser.add_argument("--mock-port", type=int, default=9767)
+    parser.add_argument("--mock-latency-ms", type=float, default=300)
+    parser.add_argument("--output", help="chemin du rapport JSON (défaut : bench_results/)")
+    args = parser.parse_args()
+
+    speed = None if args.speed == "max" else float(args.speed)
+    requests = load_requests(args.captures, args.limit)
+    if not requests:
+        parser.error("aucune requête dans les fichiers de capture")
+
+    processes = []
+    url, pid = args.url, args.pid
+    if args.spawn:
+        mock_args = ["--latency-ms", str(args.mock_latency_ms)]
+        if args.upstream == "recorded":
+            mock_args += ["--recording", *args.captures]
+        env = dict(server_env(args.mock_port, user_rate_limit=True), RATE_LIMIT_TRUST_PROXY="1",
+                   TRAFFIC_CAPTURE="0")
+        processes = spawn_servers(args.api_port, args.mock_port, mock_args, env)
+        url, pid = f"http://127.0.0.1:{args.api_port}", processes[1].pid
+    try:
+        results = asyncio.run(replay(url, requests, speed, args.concurrency, args.timeout, pid))
+        results["token_usage"] = fetch_token_usage(url)
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait()
+    print(f"{results['succeeded']}/{results['requests']} répondues en {results['elapsed_s']} s "
+          f"(capture : {results['captured_span_s']} s), {results['throughput_rps']} req/s, "
+          f"latence {results['latency']}, retard d'envoi p99 {results['send_lag_p99_ms']} ms")
+    print(f"  issues {results['outcomes']}, statuts HTTP {results['statuses']}")
+    for source, summary in results["latency_by_source"].items():
+        print(f"  {source:<10} {summary}")
+    config = {key: value for key, value in vars(args).items() if key != "output"}
+    print(f"Rapport : {save_report('replay', config, results, args.output)}")
+
+
+if __name__ == "__main__":
+    main()
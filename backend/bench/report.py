@@ -0,0 +1,102 @@
+# Rapports JSON des benchmarks et comparaison entre deux exécutions
+#
+# Usage : python -m bench.report ancien.json nouveau.json
+import json
+import os
+import platform
+import subprocess
+import sys
+from datetime import datetime
+from typing import Dict, List, Optional
+
+BENCH_RESULTS_DIR = os.getenv("BENCH_RESULTS_DIR", "bench_results")
+
+
+def percentile(samples: List[float], q: float) -> Optional[float]:
+    """Quantile par rang le plus proche (q entre 0 et 1)"""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def latency_summary(samples: List[float]) -> Dict[str, Optional[float]]:
+    """p50/p95/p99, moyenne et max en millisecondes"""
+    def ms(value):
+        return round(value * 1000, 3) if value is not None else None
+    return {
+        "p50_ms": ms(percentile(samples, 0.50)),
+        "p95_ms": ms(percentile(samples, 0.95)),
+        "p99_ms": ms(percentile(samples, 0.99)),
+        "mean_ms": ms(sum(samples) / len(samples)) if samples else None,
+        "max_ms": ms(max(samples)) if samples else None,
+    }
+
+
+def rss_mb(pid: Optional[int] = None) -> Optional[float]:
+    """Mémoire résidente d'un processus (Linux, /proc), en Mo"""
+    try:
+        with open(f"/proc/{pid or os.getpid()}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def save_report(name: str, config: dict, results: dict, path: Optional[str] = None) -> str:
+    """Écrit le rapport (métadonnées + configuration + résultats) et renvoie son chemin"""
+    timestamp = datetime.now()
+    if path is None:
+        os.makedirs(BENCH_RESULTS_DIR, exist_ok=True)
+        path = os.path.join(BENCH_RESULTS_DIR, f"{name}_{timestamp:%Y%m%d_%H%M%S}.json")
+    report = {
+        "benchmark": name,
+        "timestamp": timestamp.isoformat(),
+        "git_commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": config,
+        "results": results,
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    return path
+
+
+def _flatten(data: dict, prefix: str = "") -> Dict[str, float]:
+    flat = {}
+    for key, value in data.items():
+        if isinstance(value, dict):
+            flat.update(_flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[prefix + key] = value
+    return flat
+
+
+def compare(old_path: str, new_path: str) -> List[str]:
+    """Lignes "métrique ancien -> nouveau (écart %)" pour les résultats numériques communs"""
+    with open(old_path, encoding="utf-8") as f:
+        old = _flatten(json.load(f)["results"])
+    with open(new_path, encoding="utf-8") as f:
+        new = _flatten(json.load(f)["results"])
+    lines = []
+    for key in sorted(old.keys() & new.keys()):
+        delta = f"{(new[key] - old[key]) / old[key] * 100:+.1f}%" if old[key] else "n/a"
+        lines.append(f"{key:<50} {old[key]:>12g} -> {new[key]:>12g}  ({delta})")
+    return lines
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        sys.exit("Usage: python -m bench.report ancien.json nouveau.json")
+    print("\n".join(compare(sys.argv[1], sys.argv[2])))
@@ -0,0 +1,155 @@
+# Rapport de démarrage : coût des imports et délai jusqu'à la première requête servie
+#
+# Usage : python -m bench.startup [--runs 5] [--top 15] [--output rapport.json]
+#
+# Deux mesures, sans réseau :
+# - `python -X importtime -c "import app"` : temps d'import total, modules et
+#   paquets les plus coûteux (un nouvel import lourd apparaît tout de suite) ;
+# - démarrage réel de `uvicorn app:app` pointé sur le faux fournisseur : délai
+#   entre le lancement du processus et la première réponse 200 de /chat, et
+#   jusqu'à ce que /readyz réponde 200.
+# Comparer deux rapports : python -m bench.report ancien.json nouveau.json
+import argparse
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from typing import Dict, Optional
+
+import httpx
+
+from bench.loadgen import server_env
+from bench.report import save_report
+
+_IMPORTTIME_RE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+# Question absente de la base de faits : la première requête passe par le LLM
+FIRST_QUESTION = {"message": "Est-ce que le miel se conserve éternellement ?", "name": "Bench", "age": 30}
+
+
+def import_profile(module: str, env: dict) -> Dict[str, object]:
+    """Un import à froid du module sous -X importtime : total et détail par module (µs)"""
+    output = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        env=env, capture_output=True, text=True, check=True,
+    ).stderr
+    modules = {}
+    total = 0
+    for line in output.splitlines():
+        match = _IMPORTTIME_RE.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, indent, name = int(match[1]), int(match[2]), match[3], match[4]
+        modules[name] = self_us
+        if len(indent) == 1:
+            # Imports de premier niveau : leur somme est le coût total
+            total += cumulative_us
+    return {"total_us": total, "modules": modules}
+
+
+def import_report(module: str, runs: int, top: int, env: dict) -> dict:
+    profiles = [import_profile(module, env) for _ in range(runs)]
+    # Le meilleur des essais : le moins perturbé par le reste de la machine
+    best = min(profiles, key=lambda profile: profile["total_us"])
+    packages: Counter = Counter()
+    for name, self_us in best["modules"].items():
+        packages[name.split(".")[0]] += self_us
+    return {
+        "total_ms": round(best["total_us"] / 1000, 1),
+        "median_total_ms": round(statistics.median(p["total_us"] for p in profiles) / 1000, 1),
+        "modules": len(best["modules"]),
+        "top_packages_ms": {name: round(us / 1000, 1) for name, us in packages.most_common(top)},
+        "top_modules_self_ms": {name: round(us / 1000, 1)
+                                for name, us in Counter(best["modules"]).most_common(top)},
+    }
+
+
+def _wait_until(predicate, timeout: float) -> Optional[float]:
+    start = time.monotonic()
+    while time.monotonic() - start < timeout:
+        try:
+            if predicate():
+                return time.monotonic()
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.005)
+    return None
+
+
+def first_request_run(api_port: int, env: dict, timeout: float) -> dict:
+    """Lance l'API et mesure (s) le délai jusqu'à la première réponse de /chat et jusqu'à /readyz"""
+    # Client créé avant le lancement : sa propre initialisation ne compte pas dans la mesure
+    client = httpx.Client(base_url=f"http://127.0.0.1:{api_port}", timeout=timeout)
+    launched = time.monotonic()
+    api = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:app", "--port", str(api_port), "--log-level", "warning"], env=env
+    )
+    try:
+        served = _wait_until(lambda: client.post("/chat", json=FIRST_QUESTION).status_code == 200, timeout)
+        ready = _wait_until(lambda: client.get("/readyz").status_code == 200, timeout)
+        state = client.get("/readyz").json()
+    finally:
+        client.close()
+        api.terminate()
+        api.wait()
+    return {
+        "first_request_s": round(served - launched, 4) if served else None,
+        "ready_s": round(ready - launched, 4) if ready else None,
+        # Vu du serveur (depuis le lancement de l'interpréteur, voir warmup.py)
+        "server_first_request_s": state.get("first_request_after_s"),
+        "server_ready_s": state.get("ready_after_s"),
+    }
+
+
+def first_request_report(runs: int, api_port: int, mock_port: int, env: dict, timeout: float) -> dict:
+    mock = subprocess.Popen([sys.executable, "-m", "bench.mock_llm", "--port", str(mock_port)], env=env)
+    try:
+        if _wait_until(lambda: httpx.get(f"http://127.0.0.1:{mock_port}/", timeout=1), 10) is None:
+            raise RuntimeError("Le faux fournisseur n'a pas démarré")
+        samples = [first_request_run(api_port, env, timeout) for _ in range(runs)]
+    finally:
+        mock.terminate()
+        mock.wait()
+
+    def median(key):
+        values = [sample[key] for sample in samples if sample[key] is not None]
+        return round(statistics.median(values), 4) if values else None
+
+    summary = {key: median(key) for key in samples[0]}
+    summary["failed_runs"] = sum(sample["first_request_s"] is None for sample in samples)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Coût des imports et délai jusqu'à la première requête servie")
+    parser.add_argument("--module", default="app")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--api-port", type=int, default=8766)
+    parser.add_argument("--mock-port", type=int, default=9766)
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--output", help="chemin du rapport JSON (défaut : bench_results/)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as log_dir:
+        # Les fichiers de log du serveur ne doivent pas atterrir dans le dépôt
+        env = dict(server_env(args.mock_port), LOG_DIR=log_dir)
+        imports = import_report(args.module, args.runs, args.top, env)
+        first_request = first_request_report(args.runs, args.api_port, args.mock_port, env, args.timeout)
+
+    print(f"import {args.module} : {imports['total_ms']} ms (médiane {imports['median_total_ms']} ms), "
+          f"{imports['modules']} modules")
+    for name, ms in imports["top_packages_ms"].items():
+        print(f"  {name:<30} {ms:>8} ms")
+    print(f"première requête servie : {first_request['first_request_s']} s, prêt : {first_request['ready_s']} s "
+          f"(médianes sur {args.runs} démarrages)")
+    results = {"imports": imports, "first_request": first_request}
+    config = {key: value for key, value in vars(args).items() if key != "output"}
+    print(f"Rapport : {save_report('startup', config, results, args.output)}")
+
+
+if __name__ == "__main__":
+    main()
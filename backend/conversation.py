@@ -0,0 +1,113 @@
+# Contexte multi-tours : fenêtre glissante bornée en tokens et résumé des anciens échanges
+import os
+import re
+import time
+from collections import OrderedDict, deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+from prompts import estimate_tokens
+
+# Budget en tokens de l'historique envoyé au LLM, par niveau
+CONVERSATION_BUDGETS = {
+    "enfant": int(os.getenv("CONVERSATION_TOKENS_ENFANT", "300")),
+    "ado": int(os.getenv("CONVERSATION_TOKENS_ADO", "500")),
+    "adulte": int(os.getenv("CONVERSATION_TOKENS_ADULTE", "800")),
+}
+# Taille maximale du résumé des anciens échanges (tokens)
+CONVERSATION_SUMMARY_TOKENS = int(os.getenv("CONVERSATION_SUMMARY_TOKENS", "150"))
+CONVERSATION_IDLE_TTL = float(os.getenv("CONVERSATION_IDLE_TTL", "1800"))
+CONVERSATION_MAX_SESSIONS = int(os.getenv("CONVERSATION_MAX_SESSIONS", "100000"))
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s")
+
+
+def _first_sentence(text: str, max_chars: int) -> str:
+    sentence = _SENTENCE_END.split(text.strip(), 1)[0]
+    return sentence if len(sentence) <= max_chars else sentence[:max_chars].rstrip() + "…"
+
+
+def summarize_turn(question: str, answer: str) -> str:
+    """Résumé extractif d'un échange : la question et la première phrase de la réponse"""
+    return f"Q : {_first_sentence(question, 120)} → R : {_first_sentence(answer, 160)}"
+
+
+class Conversation:
+    __slots__ = ("turns", "tokens", "summary", "last_seen")
+
+    def __init__(self):
+        # (question, réponse, tokens estimés de l'échange)
+        self.turns: Deque[Tuple[str, str, int]] = deque()
+        self.tokens = 0
+        self.summary: Deque[Tuple[str, int]] = deque()
+        self.last_seen = time.time()
+
+
+class ConversationStore:
+    """
+    Historique par session (chat_id Telegram, session_id de /chat). Les derniers
+    échanges sont gardés tant qu'ils tiennent dans le budget du niveau ; au-delà,
+    les plus anciens sont remplacés par un résumé compact, lui-même borné. La
+    taille du prompt reste donc bornée quel que soit le nombre de tours. Les
+    sessions inactives depuis idle_ttl sont évincées (LRU borné).
+    """
+
+    def __init__(self, budgets: Optional[Dict[str, int]] = None,
+                 summary_tokens: int = CONVERSATION_SUMMARY_TOKENS,
+                 idle_ttl: float = CONVERSATION_IDLE_TTL, max_sessions: int = CONVERSATION_MAX_SESSIONS):
+        self.budgets = budgets or CONVERSATION_BUDGETS
+        self.summary_tokens = summary_tokens
+        self.idle_ttl = idle_ttl
+        self.max_sessions = max_sessions
+        self._conversations: "OrderedDict[str, Conversation]" = OrderedDict()
+
+    def _evict(self, now: float):
+        while self._conversations:
+            oldest = next(iter(self._conversations.values()))
+            if len(self._conversations) <= self.max_sessions and now - oldest.last_seen < self.idle_ttl:
+                break
+            self._conversations.popitem(last=False)
+
+    def get_messages(self, session_id: str) -> List[dict]:
+        """Messages à insérer entre le prompt système et la question (vide si pas d'historique)"""
+        now = time.time()
+        self._evict(now)
+        conversation = self._conversations.get(session_id)
+        if conversation is None:
+            return []
+        conversation.last_seen = now
+        self._conversations.move_to_end(session_id)
+        messages = []
+        if conversation.summary:
+            summary = "\n".join(item for item, _ in conversation.summary)
+            messages.append({"role": "system", "content": f"Échanges précédents avec l'utilisateur :\n{summary}"})
+        for question, answer, _ in conversation.turns:
+            messages.append({"role": "user", "content": question})
+            messages.append({"role": "assistant", "content": answer})
+        return messages
+
+    def add_turn(self, session_id: str, niveau: str, question: str, answer: str):
+        now = time.time()
+        conversation = self._conversations.get(session_id)
+        if conversation is None:
+            conversation = self._conversations[session_id] = Conversation()
+        conversation.last_seen = now
+        self._conversations.move_to_end(session_id)
+        tokens = estimate_tokens(question) + estimate_tokens(answer)
+        conversation.turns.append((question, answer, tokens))
+        conversation.tokens += tokens
+        budget = self.budgets.get(niveau, self.budgets["adulte"])
+        # Les échanges qui sortent de la fenêtre sont remplacés par leur résumé
+        while conversation.tokens > budget:
+            old_question, old_answer, old_tokens = conversation.turns.popleft()
+            conversation.tokens -= old_tokens
+            item = summarize_turn(old_question, old_answer)
+            conversation.summary.append((item, estimate_tokens(item)))
+        while sum(size for _, size in conversation.summary) > self.summary_tokens:
+            conversation.summary.popleft()
+        self._evict(now)
+
+    def clear(self, session_id: str):
+        self._conversations.pop(session_id, None)
+
+    def __len__(self) -> int:
+        return len(self._conversations)
@@ -0,0 +1,288 @@
+# Base locale d'affirmations déjà vérifiées : réponses immédiates et contexte pour le LLM
+import hashlib
+import json
+import logging
+import math
+import os
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from answer_cache import STOP_WORDS
+from metrics import FACT_BASE_RELOAD_ERRORS
+from text_matcher import tokenize
+
+logger = logging.getLogger(__name__)
+
+FACT_BASE_PATH = os.getenv(
+    "FACT_BASE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "fact_base.json"),
+)
+# Confiance minimale (0-1) pour répondre depuis la base sans appeler le LLM
+FACT_BASE_FAST_PATH_THRESHOLD = float(os.getenv("FACT_BASE_FAST_PATH_THRESHOLD", "0.8"))
+# Fiches transmises au LLM comme contexte (0 = aucune) et confiance minimale pour cela
+FACT_BASE_GROUNDING_K = int(os.getenv("FACT_BASE_GROUNDING_K", "3"))
+FACT_BASE_GROUNDING_MIN = float(os.getenv("FACT_BASE_GROUNDING_MIN", "0.3"))
+# Intervalle (s) entre deux vérifications de la date de modification du fichier
+FACT_BASE_RELOAD_INTERVAL = float(os.getenv("FACT_BASE_RELOAD_INTERVAL", "10"))
+
+# Mots vides sous leur forme normalisée (même traitement que les messages)
+_STOP_TERMS = frozenset(tokenize(" ".join(STOP_WORDS)))
+# Une négation absente de la fiche inverse le sens : pas de réponse directe dans ce cas
+_NEGATIONS = frozenset(tokenize("ne n pas jamais aucun aucune rien ni plus"))
+
+VERDICT_LABELS = {"vrai": "Vrai", "faux": "Faux", "trompeur": "Trompeur", "incertain": "Incertain"}
+
+
+def terms_of(text: str) -> List[str]:
+    """Mots normalisés (accents, pluriel simple) sans les mots vides"""
+    return [t for t in tokenize(text) if t not in _STOP_TERMS]
+
+
+class FactEntry:
+    """Une affirmation vérifiée : verdict, explication par niveau et sources"""
+
+    __slots__ = ("id", "claim", "aliases", "verdict", "explanations", "sources", "digest")
+
+    def __init__(self, id: str, claim: str, verdict: str, explanations: Dict[str, str],
+                 aliases: Optional[List[str]] = None, sources: Optional[List[str]] = None):
+        self.id = id
+        self.claim = claim
+        self.aliases = aliases or []
+        self.verdict = verdict
+        self.explanations = explanations
+        self.sources = sources or []
+        # Empreinte du contenu : seules les fiches modifiées sont réindexées
+        self.digest = hashlib.sha256(json.dumps(
+            [claim, self.aliases, verdict, explanations, self.sources], ensure_ascii=False, sort_keys=True
+        ).encode("utf-8")).hexdigest()
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "FactEntry":
+        return cls(data["id"], data["claim"], data["verdict"], data["explanations"],
+                   data.get("aliases"), data.get("sources"))
+
+    def answer(self, niveau: str) -> str:
+        """Réponse prête à envoyer ; les sources sont citées à partir du niveau ado"""
+        text = self.explanations.get(niveau) or self.explanations["adulte"]
+        if niveau != "enfant" and self.sources:
+            text += "\n\nSources : " + " ; ".join(self.sources)
+        return text
+
+    def grounding_text(self) -> str:
+        verdict = VERDICT_LABELS.get(self.verdict, self.verdict)
+        text = f"- Affirmation : {self.claim}\n  Verdict : {verdict}\n  Explication : {self.explanations['adulte']}"
+        if self.sources:
+            text += "\n  Sources : " + " ; ".join(self.sources)
+        return text
+
+
+class BM25Index:
+    """
+    Index inversé BM25 sur des documents courts (énoncé d'une fiche et ses
+    formulations alternatives). Les documents sont ajoutés et retirés un par
+    un : modifier une fiche ne reconstruit pas tout l'index.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        # terme -> {clé du document: fréquence}
+        self.postings: Dict[str, Dict[str, int]] = {}
+        # clé du document -> (id de la fiche, fréquences des termes, longueur)
+        self.docs: Dict[str, Tuple[str, Counter, int]] = {}
+        self.total_length = 0
+
+    def add(self, doc_key: str, entry_id: str, terms: List[str]):
+        self.remove(doc_key)
+        counts = Counter(terms)
+        self.docs[doc_key] = (entry_id, counts, len(terms))
+        self.total_length += len(terms)
+        for term, count in counts.items():
+            self.postings.setdefault(term, {})[doc_key] = count
+
+    def remove(self, doc_key: str):
+        doc = self.docs.pop(doc_key, None)
+        if doc is None:
+            return
+        _, counts, length = doc
+        self.total_length -= length
+        for term in counts:
+            posting = self.postings[term]
+            del posting[doc_key]
+            if not posting:
+                del self.postings[term]
+
+    def idf(self, term: str) -> float:
+        df = len(self.postings.get(term, ()))
+        return math.log(1 + (len(self.docs) - df + 0.5) / (df + 0.5))
+
+    def search(self, terms: List[str], limit: int) -> List[Tuple[float, float, str, str]]:
+        """
+        Meilleurs documents pour les termes donnés.
+        Returns: [(score BM25, confiance 0-1, clé du document, id de la fiche)]
+        """
+        if not self.docs or not terms:
+            return []
+        avg_length = self.total_length / len(self.docs)
+        query = set(terms)
+        idf = {term: self.idf(term) for term in query}
+        scores: Dict[str, float] = {}
+        for term in query:
+            for doc_key, tf in self.postings.get(term, {}).items():
+                length = self.docs[doc_key][2]
+                norm = tf + self.k1 * (1 - self.b + self.b * length / avg_length)
+                scores[doc_key] = scores.get(doc_key, 0.0) + idf[term] * tf * (self.k1 + 1) / norm
+        query_weight = sum(idf.values())
+        results = []
+        for doc_key, score in sorted(scores.items(), key=lambda item: -item[1])[:limit]:
+            entry_id, counts, _ = self.docs[doc_key]
+            # Recouvrement pondéré par l'idf (Dice) : 1 si la question et le document
+            # ont exactement les mêmes termes, plus bas dès qu'un mot rare manque d'un côté
+            doc_weight = sum(self.idf(term) for term in counts)
+            common = sum(idf[term] for term in query if term in counts)
+            confidence = 2 * common / (query_weight + doc_weight) if query_weight + doc_weight else 0.0
+            results.append((score, confidence, doc_key, entry_id))
+        return results
+
+
+class FactBase:
+    """
+    Fiches vérifiées chargées depuis un fichier JSON éditable par la rédaction.
+    Une question très proche d'une fiche reçoit directement sa réponse (sans
+    appel LLM) ; les fiches proches mais moins sûres sont passées au LLM comme
+    contexte. Le fichier est relu quand sa date de modification change, et
+    seules les fiches ajoutées, modifiées ou supprimées sont réindexées.
+    """
+
+    def __init__(self, path: Optional[str] = FACT_BASE_PATH,
+                 fast_path_threshold: float = FACT_BASE_FAST_PATH_THRESHOLD,
+                 grounding_k: int = FACT_BASE_GROUNDING_K, grounding_min: float = FACT_BASE_GROUNDING_MIN,
+                 reload_interval: float = FACT_BASE_RELOAD_INTERVAL):
+        self.path = path
+        self.fast_path_threshold = fast_path_threshold
+        self.grounding_k = grounding_k
+        self.grounding_min = grounding_min
+        self.reload_interval = reload_interval
+        self.entries: Dict[str, FactEntry] = {}
+        self.index = BM25Index()
+        # Incrémentée à chaque modification de la base
+        self.version = 0
+        self._mtime = None
+        self._next_check = 0.0
+        self.stats = {"fast_path": 0, "grounded": 0, "misses": 0, "reloads": 0, "reload_errors": 0}
+        # Le fichier est lu à la première recherche (ou par ensure_loaded) : import rapide
+
+    def upsert(self, entry: FactEntry) -> bool:
+        """Ajoute ou remplace une fiche ; renvoie False si elle était déjà identique"""
+        current = self.entries.get(entry.id)
+        if current is not None and current.digest == entry.digest:
+            return False
+        if current is not None:
+            self._unindex(current)
+        self.entries[entry.id] = entry
+        for n, text in enumerate([entry.claim] + entry.aliases):
+            self.index.add(f"{entry.id}#{n}", entry.id, terms_of(text))
+        self.version += 1
+        return True
+
+    def remove(self, entry_id: str) -> bool:
+        entry = self.entries.pop(entry_id, None)
+        if entry is None:
+            return False
+        self._unindex(entry)
+        self.version += 1
+        return True
+
+    def _unindex(self, entry: FactEntry):
+        for n in range(1 + len(entry.aliases)):
+            self.index.remove(f"{entry.id}#{n}")
+
+    def reload(self) -> Tuple[int, int]:
+        """
+        Relit le fichier et applique les différences.
+        Returns: (fiches ajoutées ou modifiées, fiches supprimées)
+        """
+        self._mtime = os.path.getmtime(self.path)
+        with open(self.path, encoding="utf-8") as f:
+            data = json.load(f)
+        entries = [FactEntry.from_dict(item) for item in data.get("entries", [])]
+        changed = sum(self.upsert(entry) for entry in entries)
+        kept = {entry.id for entry in entries}
+        removed = sum(self.remove(entry_id) for entry_id in list(self.entries) if entry_id not in kept)
+        self.stats["reloads"] += 1
+        return changed, removed
+
+    def ensure_loaded(self):
+        """Charge le fichier s'il ne l'a pas encore été (préchauffage)"""
+        if self._mtime is None:
+            self._next_check = 0.0
+            self._maybe_reload()
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        if not self.path or now < self._next_check:
+            return
+        self._next_check = now + self.reload_interval
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            # Fichier absent (déplacé, remplacé) : on garde la version chargée
+            return
+        if mtime == self._mtime:
+            return
+        try:
+            self.reload()
+        except Exception:
+            # Fiche mal formée : la version chargée reste servie, mais l'erreur doit se voir.
+            # reload() a déjà noté le mtime, on ne réessaie qu'à la prochaine modification.
+            logger.exception(f"Fact base {self.path} not reloaded, keeping version {self.version}")
+            self.stats["reload_errors"] += 1
+            FACT_BASE_RELOAD_ERRORS.inc()
+
+    def _search(self, terms: List[str], k: int) -> List[Tuple[float, FactEntry, str]]:
+        self._maybe_reload()
+        results = []
+        seen = set()
+        for _, confidence, doc_key, entry_id in self.index.search(terms, 4 * k):
+            if entry_id in seen:
+                continue
+            seen.add(entry_id)
+            results.append((confidence, self.entries[entry_id], doc_key))
+        results.sort(key=lambda item: -item[0])
+        return results[:k]
+
+    def search(self, question: str, k: int = 3) -> List[Tuple[float, FactEntry]]:
+        """Fiches les plus proches de la question (une seule fois chacune) : [(confiance, fiche)]"""
+        return [(confidence, entry) for confidence, entry, _ in self._search(terms_of(question), k)]
+
+    def fast_answer(self, question: str, niveau: str) -> Optional[str]:
+        """Réponse de la fiche si la question lui correspond avec une confiance suffisante"""
+        terms = terms_of(question)
+        results = self._search(terms, 1)
+        if results and results[0][0] >= self.fast_path_threshold:
+            confidence, entry, doc_key = results[0]
+            if _NEGATIONS.intersection(terms) == _NEGATIONS.intersection(self.index.docs[doc_key][1]):
+                self.stats["fast_path"] += 1
+                return entry.answer(niveau)
+        self.stats["misses"] += 1
+        return None
+
+    def grounding(self, question: str) -> Optional[str]:
+        """Fiches proches de la question, à insérer dans le prompt comme contexte (None si aucune)"""
+        if self.grounding_k <= 0:
+            return None
+        entries = [entry for confidence, entry in self.search(question, self.grounding_k)
+                   if confidence >= self.grounding_min]
+        if not entries:
+            return None
+        self.stats["grounded"] += 1
+        return ("Fiches déjà vérifiées par notre rédaction, à utiliser seulement si elles "
+                "correspondent à la question :\n" + "\n".join(entry.grounding_text() for entry in entries))
+
+    def get_stats(self) -> dict:
+        return dict(self.stats, entries=len(self.entries), version=self.version)
+
+
+# Instance partagée, indexée à la première utilisation ou au préchauffage
+fact_base = FactBase()
@@ -0,0 +1,449 @@
+# Moteur commun de vérification : filtres, sécurité, prompts, client LLM et caches
+#
+# Importé par l'API (app.py) et le bot Telegram (fact_check_final.py). Les ressources
+# coûteuses (pool HTTP, cache des réponses, limiteur, file d'admission, historiques)
+# sont créées une seule fois par processus : si les deux interfaces tournent dans le
+# même processus (SERVE_TELEGRAM_WEBHOOK=1), elles partagent le même cache chaud et
+# le même pool de connexions. Ce qui diffère d'un déploiement à l'autre (persona,
+# budget de temps, classe d'admission) est décrit par un Profile.
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+import httpx
+from dotenv import load_dotenv
+
+from admission import AdmissionController, AdmissionRejected
+from answer_cache import ANSWER_SNAPSHOT_PATH, AnswerCache, depersonalize, normalize_question, personalize
+from conversation import ConversationStore
+from fact_base import fact_base
+from intent_classifier import Intent, intent_classifier
+from llm_client import LLM_PRECONNECT, AsyncLLMClient, CircuitOpenError, UpstreamError
+from logging_pipeline import log_event
+from metrics import REFUSALS, SAFETY_LEVELS, STAGE_SECONDS
+from prompts import ERROR_MESSAGES, PromptTemplate, estimate_tokens, prompt_registry
+from rate_limit import RateLimiter, create_rate_limiter
+from singleflight import SingleFlight
+from text_matcher import TermMatcher, content_matcher
+from warmup import warmup
+
+logger = logging.getLogger(__name__)
+
+# Serveur compatible OpenAI : Together par défaut, ou un serveur vLLM / llama.cpp auto-hébergé.
+# LLM_API_URL, LLM_MODEL et API_TOKEN_TOGETHER sont lus par setup(), après le .env
+DEFAULT_API_URL = "https://api.together.xyz/v1/chat/completions"
+DEFAULT_LLM_MODEL = "mistralai/Mixtral-8x7B-Instruct-v0.1"
+LLM_MODEL = DEFAULT_LLM_MODEL
+
+# Budget de temps d'un appel LLM (retries compris) pour chaque interface
+LLM_TIMEOUT_WEB = float(os.getenv("LLM_TIMEOUT_WEB", "30"))
+LLM_TIMEOUT_TELEGRAM = float(os.getenv("LLM_TIMEOUT_TELEGRAM", "15"))
+
+
+class Profile:
+    """Réglages d'un déploiement : persona du prompt, budget LLM, classe d'admission"""
+
+    def __init__(self, name: str, persona: str, timeout: float, priority: str, user_field: str):
+        self.name = name
+        self.persona = persona
+        self.timeout = timeout
+        # Classe par défaut dans la file d'admission (voir ADMISSION_CLASSES)
+        self.priority = priority
+        # Nom du champ identifiant l'utilisateur dans le journal des interactions
+        self.user_field = user_field
+
+
+PROFILES = {
+    "web": Profile("web", "dinobot", LLM_TIMEOUT_WEB, "web", "user_id"),
+    "telegram": Profile("telegram", "factcheck_bot", LLM_TIMEOUT_TELEGRAM, "telegram", "chat_id"),
+}
+
+# Ressources partagées du processus, créées par setup() au démarrage d'une interface
+# (lifespan de l'API, post_init du bot) : importer ce module ne fait aucune I/O
+rate_limiter: Optional[RateLimiter] = None
+llm_client: Optional[AsyncLLMClient] = None
+admission: Optional[AdmissionController] = None
+answer_cache: Optional[AnswerCache] = None
+conversations: Optional[ConversationStore] = None
+
+# Regroupement des questions identiques en cours de traitement
+single_flight = SingleFlight()
+
+# Préchauffage après le démarrage (voir warmup.py) ; sans lui, chaque étape est faite
+# à la première utilisation
+warmup.add("fact_base", fact_base.ensure_loaded)
+warmup.add("intent_model", intent_classifier.ensure_loaded)
+# Réponses pré-générées par prewarm.py (seulement au préchauffage : WARMUP=0 s'en passe)
+warmup.add("answer_snapshot", lambda: load_answer_snapshot())
+
+
+def setup():
+    """
+    Charge le .env puis crée les ressources partagées : limiteur, pool HTTP, file
+    d'admission, cache des réponses, historiques. Sans effet si déjà fait (appelé
+    par chaque interface à son démarrage, avant de servir la moindre requête).
+    """
+    global rate_limiter, llm_client, admission, answer_cache, conversations, LLM_MODEL
+    if llm_client is not None:
+        return
+    load_dotenv()
+    LLM_MODEL = os.getenv("LLM_MODEL", DEFAULT_LLM_MODEL)
+    headers = {
+        "Authorization": f"Bearer {os.getenv('API_TOKEN_TOGETHER')}",
+        "Content-Type": "application/json"
+    }
+    # Limitation de débit par utilisateur et budget global de tokens (voir rate_limit.py)
+    rate_limiter = create_rate_limiter()
+    # Pool HTTP unique (keep-alive) partagé par toutes les interfaces du processus ;
+    # le budget de chaque appel est celui du profil
+    llm_client = AsyncLLMClient(os.getenv("LLM_API_URL", DEFAULT_API_URL), headers,
+                                timeout=max(p.timeout for p in PROFILES.values()),
+                                on_rate_limited=rate_limiter.on_upstream_rate_limited)
+    # File à priorités devant les appels LLM : classes "telegram", "web" et "batch"
+    admission = AdmissionController()
+    # Cache des réponses, indexé par (question normalisée, niveau, version du prompt)
+    answer_cache = AnswerCache()
+    # Historique multi-tours par session, clés préfixées par profil (voir FactCheckBot.conversation_key)
+    conversations = ConversationStore()
+    if LLM_PRECONNECT:
+        warmup.add("llm_pool", llm_client.preconnect)
+
+
+# --- Filtres fact-check et sécurité ---
+# Les listes de mots et motifs sont dans moderation_terms.json ; on peut passer
+# le résultat de content_matcher.classify() pour ne parcourir le message qu'une fois.
+# `intent` (intent_classifier.predict) accepte d'emblée une affirmation ou une question
+# dont le classifieur est sûr ; "off_topic" ne refuse pas à lui seul (seuil pas encore
+# validé sur des journaux) : comme un résultat incertain ou absent, les règles décident.
+def is_fact_check_question(text, matches=None, intent: Optional[Intent] = None):
+    if intent is not None and intent.label in ("claim", "question"):
+        return True
+    if intent is not None and intent.label == "bypass":
+        return False
+    if text.strip().endswith("?"):
+        return True
+    if matches is None:
+        matches = content_matcher.classify(text)
+    return "fact_check_intent" in matches
+
+def is_malicious_bypass_attempt(text, matches=None, intent: Optional[Intent] = None):
+    if intent is not None and intent.label == "bypass":
+        return True
+    if matches is None:
+        matches = content_matcher.classify(text)
+    return "bypass" in matches
+
+
+class FactCheckBot:
+    def __init__(self, profile: Profile, matcher: TermMatcher = content_matcher):
+        self.profile = profile
+        # Listes de mots chargées depuis moderation_terms.json
+        self.matcher = matcher
+
+    def log_user_interaction(self, user_id, message: str, response: str, user_level: str):
+        """Enregistre les interactions (JSONL, écrit en arrière-plan) pour le debugging et l'analyse"""
+        log_entry = {
+            "event": "interaction",
+            "timestamp": datetime.now().isoformat(),
+            self.profile.user_field: user_id,
+            "user_level": user_level,
+            "message_length": len(message),
+            "response_length": len(response),
+            "message": message[:100] + "..." if len(message) > 100 else message  # Tronquer pour la confidentialité
+        }
+        log_event(log_entry)
+
+    def analyze_content_safety(self, text: str, user_level: str,
+                               matches: Optional[Dict[str, List[str]]] = None) -> Tuple[bool, str, str]:
+        """
+        Analyse la sécurité du contenu en une seule passe sur le message
+        Returns: (is_safe, warning_level, message)
+        """
+        if matches is None:
+            matches = self.matcher.classify(text)
+
+        # Vérification des mots à haut risque
+        if "high_risk" in matches:
+            if user_level == "enfant":
+                return False, "HIGH", "⛔ Cette question n'est pas adaptée aux enfants. Tu peux demander à un adulte de t'aider."
+            elif user_level == "ado":
+                return False, "HIGH", "⚠️ Ce sujet est très sensible. Il est préférable d'en parler avec un adulte de confiance."
+
+        # Vérification des mots à risque moyen
+        if "medium_risk" in matches:
+            if user_level == "enfant":
+                return False, "MEDIUM", "⚠️ Ce sujet est compliqué pour ton âge. Demande plutôt à un adulte !"
+            elif user_level == "ado":
+                return True, "MEDIUM", None  # Peut être traité mais avec précaution
+
+        # Sujets nécessitant supervision adulte
+        if "topics_needing_adult" in matches and user_level == "enfant":
+            return False, "SUPERVISION", "🤔 C'est un sujet d'adulte. Demande plutôt à tes parents ou ton professeur !"
+
+        return True, "SAFE", None
+
+    def get_template(self, user_level: str) -> PromptTemplate:
+        """Gabarit précompilé du persona du profil (sa version sert de clé de cache)"""
+        return prompt_registry.get(self.profile.persona, user_level)
+
+    def conversation_key(self, session_id: str) -> str:
+        """Clé de l'historique, préfixée par le profil : un session_id web ne croise jamais un chat_id Telegram"""
+        return f"{self.profile.name}:{session_id}"
+
+    def build_payload(self, user_input: str, system_prompt: str, max_tokens: int,
+                      history: Optional[List[dict]] = None, grounding: Optional[str] = None,
+                      user_context: Optional[str] = None) -> dict:
+        """
+        Messages ordonnés du plus partagé au plus spécifique, pour profiter du cache
+        de préfixe du fournisseur : prompt statique du niveau (identique pour tous),
+        contexte de l'utilisateur, historique de la conversation (préfixe commun
+        aux tours successifs), fiches propres à la question, puis la question.
+        """
+        return {
+            "model": LLM_MODEL,
+            "messages": [
+                {"role": "system", "content": system_prompt},
+                *([{"role": "system", "content": user_context}] if user_context else []),
+                *(history or []),
+                *([{"role": "system", "content": grounding}] if grounding else []),
+                {"role": "user", "content": user_input}
+            ],
+            "temperature": 0.3,  # Réduit pour plus de cohérence
+            "max_tokens": max_tokens,
+            "top_p": 0.85
+        }
+
+    def fast_answer(self, user_input: str, user_level: str, matches: Optional[Dict[str, List[str]]] = None,
+                    session_id: Optional[str] = None) -> Optional[str]:
+        """
+        Réponse vérifiée de la base locale (fact_base.json), sans appel LLM ni
+        limitation de débit, si la question correspond à une fiche avec une
+        confiance suffisante. Les messages refusés par l'analyse de sécurité
+        ne passent jamais par ce raccourci.
+        """
+        with STAGE_SECONDS.time("fact_base"):
+            is_safe, warning_level, _ = self.analyze_content_safety(user_input, user_level, matches)
+            answer = fact_base.fast_answer(user_input, user_level) if is_safe and warning_level == "SAFE" else None
+        if answer is not None and session_id:
+            conversations.add_turn(self.conversation_key(session_id), user_level, user_input, answer)
+        return answer
+
+    async def cached_answer(self, user_input: str, user_name: str, user_level: str,
+                            matches: Optional[Dict[str, List[str]]] = None) -> Optional[str]:
+        """
+        Réponse déjà en cache pour une question autonome, sans appel LLM ni
+        historique, ou None. Même règle de sécurité que fast_answer.
+        """
+        is_safe, warning_level, _ = self.analyze_content_safety(user_input, user_level, matches)
+        if not is_safe or warning_level != "SAFE":
+            return None
+        return await answer_cache.aget(user_input, user_level, self.get_template(user_level).version, user_name)
+
+    async def check_rate_limit(self, user_key: Optional[str], message: str, niveau: str) -> Optional[str]:
+        """None si l'appel LLM peut partir, sinon le message de refus adapté au niveau"""
+        template = self.get_template(niveau)
+        cost = template.token_count + estimate_tokens(message) + template.max_tokens
+        limit = await rate_limiter.acquire(user_key, cost)
+        if limit is None:
+            return None
+        REFUSALS.inc("rate_limit")
+        logger.warning(f"Rate limit ({limit}) reached for {self.profile.name} client {user_key}")
+        return self.get_error_message(niveau, "rate_limited")
+
+    def _check_safety(self, user_input: str, user_name: str, user_level: str,
+                      matches: Optional[Dict[str, List[str]]]) -> Optional[str]:
+        """Message de refus si le contenu n'est pas adapté au niveau, sinon None"""
+        with STAGE_SECONDS.time("safety"):
+            is_safe, warning_level, safety_message = self.analyze_content_safety(user_input, user_level, matches)
+        SAFETY_LEVELS.inc(warning_level)
+        if is_safe:
+            return None
+        REFUSALS.inc(warning_level)
+        logger.warning(f"Unsafe content detected - Level: {warning_level}, User: {user_name} ({user_level})")
+        return safety_message
+
+    async def achat_with_ai(self, user_input: str, user_name: str, user_level: str, user_age: int,
+                            matches: Optional[Dict[str, List[str]]] = None, priority: Optional[str] = None,
+                            session_id: Optional[str] = None, follow_up: bool = True) -> str:
+        """
+        Fonction de chat avec l'IA, non bloquante pour la boucle asyncio. Avec un
+        session_id, l'échange est ajouté à l'historique ; celui-ci n'est envoyé au
+        LLM (sans cache ni regroupement) que pour une question de suivi (follow_up).
+        """
+        safety_message = self._check_safety(user_input, user_name, user_level, matches)
+        if safety_message is not None:
+            return safety_message
+        priority = priority or self.profile.priority
+        template = self.get_template(user_level)
+        history = conversations.get_messages(self.conversation_key(session_id)) if session_id and follow_up else []
+        if history:
+            # Question de suivi : la réponse dépend du contexte, ni cache ni regroupement
+            answer = await self._fetch_answer(user_input, user_name, user_level, user_age, template, priority,
+                                              history)
+            conversations.add_turn(self.conversation_key(session_id), user_level, user_input, answer)
+            return answer
+        cached = await answer_cache.aget(user_input, user_level, template.version, user_name)
+        if cached is not None:
+            logger.info(f"Cache hit for user {user_name} ({user_level})")
+            answer = cached
+        else:
+            # Les demandes identiques simultanées partagent un seul appel amont
+            flight_key = (normalize_question(user_input), user_level, template.version)
+            owner = object()
+
+            async def fetch():
+                raw = await self._fetch_answer(user_input, user_name, user_level, user_age, template, priority)
+                return owner, raw, depersonalize(raw, user_name)
+
+            leader, raw, shared = await single_flight.do(flight_key, fetch)
+            if leader is owner:
+                # Demandeur à l'origine de l'appel : la réponse telle que le LLM l'a écrite
+                answer = raw
+            elif shared is not None:
+                answer = personalize(shared, user_name)
+            else:
+                # Prénom du demandeur initial impossible à retirer sans risque : appel propre
+                answer = await self._fetch_answer(user_input, user_name, user_level, user_age, template, priority)
+        if session_id:
+            conversations.add_turn(self.conversation_key(session_id), user_level, user_input, answer)
+        return answer
+
+    async def _fetch_answer(self, user_input: str, user_name: str, user_level: str, user_age: int,
+                            template: PromptTemplate, priority: str,
+                            history: Optional[List[dict]] = None) -> str:
+        """Appel effectif à l'API ; la réponse est celle destinée à ce demandeur (prénom compris)"""
+        with STAGE_SECONDS.time("prompt_build"):
+            # Fiches proches de la base locale, passées au LLM comme contexte vérifié
+            grounding = fact_base.grounding(user_input)
+            payload = self.build_payload(user_input, template.template, template.max_tokens, history, grounding,
+                                         template.render_user_context(user_name, user_age))
+        # Un seul budget pour l'attente en file et l'appel : celui du client qui attend
+        # (le profil, ou le délai de la classe pour un lot rétrogradé en "batch")
+        budget = self.profile.timeout if priority == self.profile.priority else admission.timeout(priority)
+        deadline = time.monotonic() + budget
+        try:
+            logger.info(f"API call for user {user_name} ({user_level}): {user_input[:50]}...")
+            async with admission.admit(priority, deadline):
+                remaining = min(deadline - time.monotonic(), self.profile.timeout)
+                if remaining <= 0:
+                    raise httpx.TimeoutException("LLM budget spent waiting for admission")
+                response = await llm_client.post_completion(payload, niveau=user_level, timeout=remaining)
+            if response.status_code == 200:
+                ai_response = response.json()['choices'][0]['message']['content'].strip()
+                logger.info(f"Successful API response for {user_name}")
+                if not history:
+                    answer_cache.set(user_input, user_level, template.version, ai_response, user_name)
+                return ai_response
+            else:
+                logger.error(f"API Error {response.status_code}: {response.text}")
+                return self.get_error_message(user_level, "api_error")
+        except AdmissionRejected as e:
+            # Saturé : réponse immédiate plutôt qu'une attente jusqu'au timeout du client
+            REFUSALS.inc("busy")
+            logger.warning(f"Request shed ({e.reason}, {priority}) for user {user_name}")
+            return self.get_error_message(user_level, "busy")
+        except CircuitOpenError:
+            # Fournisseur en panne : on sert une ancienne réponse si elle existe
+            logger.warning(f"Circuit breaker open, serving stale answer if any for {user_name}")
+            stale = await answer_cache.aget(user_input, user_level, template.version, user_name, allow_stale=True)
+            if stale is not None:
+                return stale
+            return self.get_error_message(user_level, "api_error")
+        except httpx.TimeoutException:
+            logger.error(f"Timeout for user {user_name}")
+            return self.get_error_message(user_level, "timeout")
+        except Exception as e:
+            logger.error(f"Unexpected error for user {user_name}: {str(e)}")
+            return self.get_error_message(user_level, "general_error")
+
+    async def astream_chat_with_ai(self, user_input: str, user_name: str, user_level: str, user_age: int,
+                                   matches: Optional[Dict[str, List[str]]] = None,
+                                   session_id: Optional[str] = None, follow_up: bool = True) -> AsyncIterator[dict]:
+        """
+        Variante streaming de achat_with_ai : produit des événements {"token": ...}
+        puis un dernier {"response": ..., "done": True} contenant la réponse complète.
+        """
+        safety_message = self._check_safety(user_input, user_name, user_level, matches)
+        if safety_message is not None:
+            yield {"response": safety_message, "done": True}
+            return
+        template = self.get_template(user_level)
+        history = conversations.get_messages(self.conversation_key(session_id)) if session_id and follow_up else []
+        cached = None if history else await answer_cache.aget(user_input, user_level, template.version, user_name)
+        if cached is not None:
+            logger.info(f"Cache hit for user {user_name} ({user_level})")
+            if session_id:
+                conversations.add_turn(self.conversation_key(session_id), user_level, user_input, cached)
+            yield {"response": cached, "done": True}
+            return
+        with STAGE_SECONDS.time("prompt_build"):
+            # Fiches proches de la base locale, passées au LLM comme contexte vérifié
+            grounding = fact_base.grounding(user_input)
+            payload = self.build_payload(user_input, template.template, template.max_tokens, history, grounding,
+                                         template.render_user_context(user_name, user_age))
+        chunks = []
+        try:
+            logger.info(f"Streaming API call for user {user_name} ({user_level}): {user_input[:50]}...")
+            async with admission.admit(self.profile.priority, time.monotonic() + self.profile.timeout):
+                async for token in llm_client.stream_completion(payload, niveau=user_level):
+                    chunks.append(token)
+                    yield {"token": token}
+        except AdmissionRejected as e:
+            REFUSALS.inc("busy")
+            logger.warning(f"Streaming request shed ({e.reason}) for user {user_name}")
+            yield {"response": self.get_error_message(user_level, "busy"), "done": True}
+            return
+        except CircuitOpenError:
+            logger.warning(f"Circuit breaker open, serving stale answer if any for {user_name}")
+            stale = await answer_cache.aget(user_input, user_level, template.version, user_name, allow_stale=True)
+            yield {"response": stale or self.get_error_message(user_level, "api_error"), "done": True}
+            return
+        except UpstreamError as e:
+            logger.error(str(e))
+            yield {"response": self.get_error_message(user_level, "api_error"), "done": True}
+            return
+        except httpx.TimeoutException:
+            logger.error(f"Timeout for user {user_name}")
+            yield {"response": self.get_error_message(user_level, "timeout"), "done": True}
+            return
+        except asyncio.CancelledError:
+            logger.info(f"Client disconnected, upstream stream cancelled for {user_name}")
+            raise
+        except Exception as e:
+            logger.error(f"Unexpected error for user {user_name}: {str(e)}")
+            yield {"response": self.get_error_message(user_level, "general_error"), "done": True}
+            return
+        ai_response = "".join(chunks).strip()
+        logger.info(f"Successful streamed API response for {user_name}")
+        if not history:
+            answer_cache.set(user_input, user_level, template.version, ai_response, user_name)
+        if session_id:
+            conversations.add_turn(self.conversation_key(session_id), user_level, user_input, ai_response)
+        yield {"response": ai_response, "done": True}
+
+    def get_error_message(self, user_level: str, error_type: str) -> str:
+        """Messages d'erreur adaptés au niveau utilisateur"""
+        return ERROR_MESSAGES.get(user_level, ERROR_MESSAGES["adulte"]).get(error_type, "Erreur inconnue.")
+
+
+def load_answer_snapshot(path: Optional[str] = ANSWER_SNAPSHOT_PATH) -> int:
+    """Charge l'instantané de prewarm.py dans le cache ; les versions de prompt périmées sont ignorées"""
+    return answer_cache.load_snapshot_if_present(path, prompt_registry.versions())
+
+
+def get_stats() -> dict:
+    """Statistiques du client LLM, du limiteur et de la file d'admission partagés"""
+    return dict(llm_client.get_stats(), rate_limit=rate_limiter.get_stats(), admission=admission.get_stats())
+
+
+async def aclose():
+    """Ferme le pool HTTP et les stockages ; sans effet si déjà fait (appelé par chaque interface)"""
+    warmup.cancel()
+    if llm_client is None:
+        return
+    await llm_client.aclose()
+    await rate_limiter.close()
+    answer_cache.close()
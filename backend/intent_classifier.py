@@ -0,0 +1,156 @@
+# Classifieur d'intention local : affirmation, question, hors sujet ou contournement
+#
+# Régression logistique multiclasse sur des n-grammes de caractères et des mots
+# hachés (pas de vocabulaire à stocker, robuste aux fautes de frappe et aux
+# accents oubliés). Le modèle (intent_model.json) est produit par train_intent.py
+# à partir de intent_data.jsonl et d'exemples étiquetés tirés des journaux.
+# Score d'un message : quelques centaines de recherches dans un dict, sans
+# dépendance externe ni GPU. Chargé à la première utilisation ou au préchauffage.
+import json
+import math
+import os
+import re
+import zlib
+from typing import Dict, Iterable, List, Optional
+
+from text_matcher import fold_accents
+
+INTENT_MODEL_PATH = os.getenv(
+    "INTENT_MODEL_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "intent_model.json"),
+)
+# Filtre actif devant le LLM (sinon seules les listes de moderation_terms.json décident)
+INTENT_CLASSIFIER = os.getenv("INTENT_CLASSIFIER", "1") == "1"
+# Probabilité minimale pour qu'une étiquette l'emporte ; en dessous, le message est "incertain"
+INTENT_THRESHOLD = float(os.getenv("INTENT_THRESHOLD", "0.85"))
+
+LABELS = ("claim", "question", "off_topic", "bypass")
+UNCERTAIN = "uncertain"
+
+_SPACES_RE = re.compile(r"\s+")
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+
+def featurize(text: str, buckets: int, ngram_min: int = 3, ngram_max: int = 5) -> List[int]:
+    """
+    Indices hachés (crc32, stable d'un processus à l'autre) des n-grammes
+    d'octets et des mots du message normalisé. La ponctuation est conservée :
+    un "?" final est un indice utile.
+    """
+    text = " " + _SPACES_RE.sub(" ", fold_accents(text)).strip() + " "
+    data = text.encode("utf-8")
+    crc32 = zlib.crc32
+    features = set()
+    for n in range(ngram_min, ngram_max + 1):
+        for i in range(len(data) - n + 1):
+            features.add(crc32(data[i:i + n]) % buckets)
+    words = _WORD_RE.findall(text)
+    for word in words:
+        features.add(zlib.crc32(b"w:" + word.encode("utf-8")) % buckets)
+    for first, second in zip(words, words[1:]):
+        features.add(zlib.crc32(f"b:{first} {second}".encode("utf-8")) % buckets)
+    return list(features)
+
+
+class Intent:
+    """Résultat du classifieur : étiquette retenue (ou "uncertain") et probabilités par étiquette"""
+
+    __slots__ = ("label", "probability", "scores")
+
+    def __init__(self, label: str, probability: float, scores: Dict[str, float]):
+        self.label = label
+        self.probability = probability
+        self.scores = scores
+
+    def __repr__(self):
+        return f"Intent({self.label}, {self.probability:.3f})"
+
+
+class IntentModel:
+    """Poids d'une régression logistique multiclasse sur des caractéristiques hachées"""
+
+    def __init__(self, labels: List[str], bias: List[float], weights: Dict[int, List[float]],
+                 buckets: int, ngram_min: int = 3, ngram_max: int = 5):
+        self.labels = list(labels)
+        self.bias = bias
+        self.weights = weights
+        self.buckets = buckets
+        self.ngram_min = ngram_min
+        self.ngram_max = ngram_max
+
+    @classmethod
+    def load(cls, path: str) -> "IntentModel":
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data["labels"], data["bias"], {int(k): v for k, v in data["weights"].items()},
+                   data["buckets"], data["ngram_min"], data["ngram_max"])
+
+    def save(self, path: str, metadata: Optional[dict] = None):
+        data = dict(metadata or {}, labels=self.labels, buckets=self.buckets, ngram_min=self.ngram_min,
+                    ngram_max=self.ngram_max, bias=self.bias,
+                    weights={str(k): v for k, v in sorted(self.weights.items())})
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, separators=(",", ":"))
+
+    def features(self, text: str) -> List[int]:
+        return featurize(text, self.buckets, self.ngram_min, self.ngram_max)
+
+    def logits(self, features: List[int]) -> List[float]:
+        # Caractéristiques binaires normalisées (norme 1) : les messages longs ne sont pas surconfiants
+        scale = 1 / math.sqrt(len(features)) if features else 0.0
+        weights = self.weights
+        rows = [weights[feature] for feature in features if feature in weights]
+        if not rows:
+            return list(self.bias)
+        return [bias + scale * sum(column) for bias, column in zip(self.bias, zip(*rows))]
+
+    def probabilities(self, text: str) -> List[float]:
+        logits = self.logits(self.features(text))
+        top = max(logits)
+        exps = [math.exp(logit - top) for logit in logits]
+        total = sum(exps)
+        return [value / total for value in exps]
+
+
+class IntentClassifier:
+    """
+    Classifieur partagé : modèle chargé à la demande, seuil réglable. Sans
+    modèle (fichier absent) ou désactivé, predict renvoie None et les filtres
+    par listes de mots s'appliquent seuls.
+    """
+
+    def __init__(self, path: Optional[str] = INTENT_MODEL_PATH, threshold: float = INTENT_THRESHOLD,
+                 enabled: bool = INTENT_CLASSIFIER):
+        self.path = path
+        self.threshold = threshold
+        self.enabled = enabled
+        self._model: Optional[IntentModel] = None
+        self.stats = {label: 0 for label in LABELS + (UNCERTAIN,)}
+
+    def ensure_loaded(self) -> Optional[IntentModel]:
+        if self._model is None and self.enabled and self.path and os.path.exists(self.path):
+            self._model = IntentModel.load(self.path)
+        return self._model
+
+    def predict(self, text: str) -> Optional[Intent]:
+        model = self.ensure_loaded()
+        if model is None:
+            return None
+        probabilities = model.probabilities(text)
+        best = max(range(len(probabilities)), key=probabilities.__getitem__)
+        probability = probabilities[best]
+        label = model.labels[best] if probability >= self.threshold else UNCERTAIN
+        self.stats[label] = self.stats.get(label, 0) + 1
+        return Intent(label, probability, dict(zip(model.labels, probabilities)))
+
+    def predict_many(self, texts: Iterable[str]) -> List[Optional[Intent]]:
+        """predict() sur une liste de textes, dans l'ordre (vérification par lots)"""
+        predict = self.predict
+        return [predict(text) for text in texts]
+
+    def get_stats(self) -> dict:
+        return dict(self.stats, enabled=self.enabled and self._model is not None, threshold=self.threshold)
+
+
+# Instance partagée ; le modèle est lu à la première prédiction ou au préchauffage
+intent_classifier = IntentClassifier()
@@ -0,0 +1,372 @@
+# Client HTTP asynchrone partagé pour l'API de complétion (Together / compatible OpenAI)
+import asyncio
+import json
+import logging
+import os
+import time
+from functools import partial
+from typing import AsyncIterator, Callable, Dict, Optional
+
+import httpx
+
+from batch_dispatcher import MicroBatchDispatcher
+from metrics import STAGE_SECONDS, UPSTREAM_IN_FLIGHT, UPSTREAM_RESPONSES, record_usage
+from model_router import Backend, ModelRouter, default_router
+from resilience import RETRYABLE_STATUS_CODES, LatencyTracker, RetryPolicy, parse_retry_after
+from token_usage import TokenUsage
+from traffic_capture import traffic_capture
+
+logger = logging.getLogger(__name__)
+
+# Limites configurables par variables d'environnement
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "256"))
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "64"))
+LLM_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "32"))
+LLM_KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY", "60"))
+LLM_HTTP2 = os.getenv("LLM_HTTP2", "0") == "1"
+# Micro-batching (utile pour un serveur vLLM / llama.cpp auto-hébergé) : 0 = désactivé
+LLM_BATCH_WINDOW_MS = float(os.getenv("LLM_BATCH_WINDOW_MS", "0"))
+LLM_BATCH_MAX_SIZE = int(os.getenv("LLM_BATCH_MAX_SIZE", "32"))
+# Résilience : timeout par tentative, retries budgétés, requêtes "hedgées"
+# (les disjoncteurs sont par fournisseur, voir model_router.py)
+LLM_ATTEMPT_TIMEOUT = float(os.getenv("LLM_ATTEMPT_TIMEOUT", "0")) or None
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+LLM_RETRY_BASE_DELAY = float(os.getenv("LLM_RETRY_BASE_DELAY", "0.25"))
+LLM_RETRY_MAX_DELAY = float(os.getenv("LLM_RETRY_MAX_DELAY", "4"))
+LLM_RETRY_BUDGET_RATIO = float(os.getenv("LLM_RETRY_BUDGET_RATIO", "0.2"))
+LLM_HEDGE = os.getenv("LLM_HEDGE", "0") == "1"
+LLM_HEDGE_QUANTILE = float(os.getenv("LLM_HEDGE_QUANTILE", "0.95"))
+# Connexion ouverte d'avance vers chaque fournisseur pendant le préchauffage (voir warmup.py)
+LLM_PRECONNECT = os.getenv("LLM_PRECONNECT", "1") == "1"
+LLM_PRECONNECT_TIMEOUT = float(os.getenv("LLM_PRECONNECT_TIMEOUT", "5"))
+
+
+def _h2_available() -> bool:
+    """HTTP/2 demande le paquet h2 (httpx[http2]) : sans lui, repli sur HTTP/1.1 plutôt qu'un échec au démarrage"""
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        logger.warning("LLM_HTTP2=1 but the h2 package is missing (pip install httpx[http2]): using HTTP/1.1")
+        return False
+    return True
+
+
+class UpstreamError(Exception):
+    """Réponse non 200 de l'API de complétion"""
+
+    def __init__(self, status_code: int, body: str):
+        super().__init__(f"API Error {status_code}: {body}")
+        self.status_code = status_code
+        self.body = body
+
+
+class CircuitOpenError(Exception):
+    """Tous les disjoncteurs sont ouverts : aucun fournisseur n'est considéré comme disponible"""
+
+
+class AsyncLLMClient:
+    """
+    Client non bloquant reposant sur un unique pool de connexions keep-alive.
+    Le nombre de requêtes simultanées est borné par un sémaphore, le nombre
+    de connexions TCP par les limites du pool httpx.
+
+    `timeout` est le budget total d'un appel, retries compris ; chaque tentative
+    est bornée par `attempt_timeout`. Chaque tentative passe par le routeur, qui
+    choisit le fournisseur : un retry peut donc basculer vers un autre fournisseur.
+    """
+
+    def __init__(
+        self,
+        api_url: str,
+        headers: Dict[str, str],
+        timeout: float = 30,
+        max_concurrency: int = LLM_MAX_CONCURRENCY,
+        max_connections: int = LLM_MAX_CONNECTIONS,
+        max_keepalive_connections: int = LLM_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry: float = LLM_KEEPALIVE_EXPIRY,
+        http2: bool = LLM_HTTP2,
+        batch_window_ms: float = LLM_BATCH_WINDOW_MS,
+        batch_max_size: int = LLM_BATCH_MAX_SIZE,
+        attempt_timeout: Optional[float] = LLM_ATTEMPT_TIMEOUT,
+        retry_policy: Optional[RetryPolicy] = None,
+        router: Optional[ModelRouter] = None,
+        hedge: bool = LLM_HEDGE,
+        on_rate_limited: Optional[Callable[[Optional[float]], None]] = None,
+    ):
+        self.api_url = api_url
+        self.headers = headers
+        self.timeout = timeout
+        self.attempt_timeout = attempt_timeout or timeout
+        self.retry_policy = retry_policy or RetryPolicy(
+            LLM_MAX_RETRIES, LLM_RETRY_BASE_DELAY, LLM_RETRY_MAX_DELAY, LLM_RETRY_BUDGET_RATIO
+        )
+        self.router = router or default_router(api_url, headers)
+        self.hedge = hedge
+        # Prévenu à chaque 429 du fournisseur (avec Retry-After), ex : RateLimiter
+        self.on_rate_limited = on_rate_limited
+        self.latencies = LatencyTracker()
+        # Tokens des réponses renvoyées, par niveau (rapport de coût, voir token_usage.py)
+        self.usage = TokenUsage()
+        self.stats = {"requests": 0, "retries": 0, "hedges": 0, "hedge_wins": 0, "breaker_rejections": 0}
+        self.max_concurrency = max_concurrency
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.http2 = http2 and _h2_available()
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.in_flight = 0
+        # Un micro-batch par fournisseur : seules les requêtes vers un même serveur sont regroupées
+        self.dispatchers = {
+            name: MicroBatchDispatcher(partial(self._post, backend), batch_window_ms, batch_max_size)
+            for name, backend in self.router.backends.items()
+        } if batch_window_ms > 0 else {}
+
+    def _get_client(self) -> httpx.AsyncClient:
+        """Crée le client httpx à la première utilisation (dans la boucle asyncio courante)"""
+        if self._client is None or self._client.is_closed:
+            # En-têtes (clé API) fournis par requête selon le fournisseur choisi
+            self._client = httpx.AsyncClient(
+                timeout=self.attempt_timeout,
+                limits=self.limits,
+                http2=self.http2,
+            )
+        return self._client
+
+    async def preconnect(self):
+        """
+        Crée le client et ouvre une connexion (DNS, TCP, TLS) vers chaque fournisseur :
+        la première vraie requête la trouve prête dans le pool. La réponse à la
+        requête HEAD est ignorée et ne compte ni pour le routeur ni dans les métriques.
+        """
+        client = self._get_client()
+        urls = {backend.api_url for backend in self.router.backends.values()}
+        results = await asyncio.gather(
+            *(client.head(url, headers={"User-Agent": "factcheck-preconnect"}, timeout=LLM_PRECONNECT_TIMEOUT)
+              for url in urls),
+            return_exceptions=True,
+        )
+        errors = [result for result in results if isinstance(result, Exception)]
+        if errors:
+            raise errors[0]
+
+    async def post_completion(self, payload: dict, niveau: Optional[str] = None,
+                              timeout: Optional[float] = None) -> httpx.Response:
+        """
+        Envoie une requête de complétion avec retries (backoff + jitter, Retry-After),
+        routage entre fournisseurs et éventuellement une requête de secours ("hedge").
+        `timeout` remplace le budget total du client pour cet appel (profil du
+        déploiement) ; il est alors aussi une échéance stricte.
+        Lève CircuitOpenError si tous les fournisseurs sont considérés comme en panne.
+        """
+        self.stats["requests"] += 1
+        self.retry_policy.on_request()
+        start = time.monotonic()
+        with STAGE_SECONDS.time("upstream"):
+            if timeout is None:
+                response = await self._call_with_retries(payload, niveau, self.timeout)
+            else:
+                try:
+                    response = await asyncio.wait_for(self._call_with_retries(payload, niveau, timeout), timeout)
+                except asyncio.TimeoutError as e:
+                    raise httpx.TimeoutException(f"LLM call exceeded {timeout}s") from e
+        if response.status_code == 200:
+            try:
+                body = response.json()
+                self.usage.record(niveau, body.get("usage"))
+                if traffic_capture.enabled:
+                    traffic_capture.record_upstream(payload, time.monotonic() - start,
+                                                    body["choices"][0]["message"]["content"], body.get("usage"))
+            except (ValueError, KeyError, IndexError):
+                pass
+        return response
+
+    async def _call_with_retries(self, payload: dict, niveau: Optional[str], budget: float) -> httpx.Response:
+        start = time.monotonic()
+        attempt = 0
+        while True:
+            retry_after = None
+            try:
+                response = await self._attempt(payload, niveau)
+            except (httpx.TimeoutException, httpx.TransportError):
+                if not self._should_retry(attempt, start, None, budget):
+                    raise
+            else:
+                if response.status_code not in RETRYABLE_STATUS_CODES:
+                    return response
+                retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                if not self._should_retry(attempt, start, retry_after, budget):
+                    return response
+            delay = self.retry_policy.delay(attempt, retry_after)
+            self.stats["retries"] += 1
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    def _should_retry(self, attempt: int, start: float, retry_after: Optional[float], budget: float) -> bool:
+        # Pas de retry si l'attente dépasse le budget total de l'appel
+        if retry_after is not None and time.monotonic() - start + retry_after >= budget:
+            return False
+        if time.monotonic() - start >= budget:
+            return False
+        return self.retry_policy.try_acquire_retry(attempt)
+
+    def _choose_backend(self, niveau: Optional[str]) -> Backend:
+        backend = self.router.choose(niveau)
+        if backend is None:
+            self.stats["breaker_rejections"] += 1
+            raise CircuitOpenError("All circuit breakers open")
+        return backend
+
+    async def _attempt(self, payload: dict, niveau: Optional[str]) -> httpx.Response:
+        """Une tentative ; si le hedging est actif, une seconde requête part après le p95 observé"""
+        backend = self._choose_backend(niveau)
+        hedge_delay = self.latencies.quantile(LLM_HEDGE_QUANTILE) if self.hedge else None
+        start = time.monotonic()
+        if hedge_delay is None:
+            response = await self._dispatch(backend, payload)
+            if response.status_code == 200:
+                self.latencies.record(time.monotonic() - start)
+            return response
+
+        first = asyncio.ensure_future(self._dispatch(backend, payload))
+        done, _ = await asyncio.wait({first}, timeout=hedge_delay)
+        if done:
+            response = first.result()
+            if response.status_code == 200:
+                self.latencies.record(time.monotonic() - start)
+            return response
+        self.stats["hedges"] += 1
+        # La requête de secours peut partir vers un autre fournisseur
+        second = asyncio.ensure_future(self._dispatch(self.router.choose(niveau) or backend, payload))
+        pending = {first, second}
+        try:
+            # La première réponse 200 l'emporte ; sinon on garde la dernière reçue
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None and task.result().status_code == 200:
+                        if task is second:
+                            self.stats["hedge_wins"] += 1
+                        self.latencies.record(time.monotonic() - start)
+                        return task.result()
+            return task.result()
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _dispatch(self, backend: Backend, payload: dict) -> httpx.Response:
+        """Envoi direct ou via le micro-batching du fournisseur s'il est activé"""
+        if backend.model:
+            payload = dict(payload, model=backend.model)
+        dispatcher = self.dispatchers.get(backend.name)
+        if dispatcher is not None:
+            return await dispatcher.submit(payload)
+        return await self._post(backend, payload)
+
+    async def _post(self, backend: Backend, payload: dict) -> httpx.Response:
+        """
+        Requête HTTP unique, en respectant la limite de concurrence ; la latence,
+        l'issue et les tokens consommés alimentent le routeur et le disjoncteur
+        du fournisseur
+        """
+        async with self._semaphore:
+            self.in_flight += 1
+            UPSTREAM_IN_FLIGHT.inc()
+            start = time.monotonic()
+            try:
+                response = await self._get_client().post(backend.api_url, json=payload, headers=backend.headers)
+            except (httpx.TimeoutException, httpx.TransportError) as e:
+                self._record(backend, start, type(e).__name__)
+                raise
+            finally:
+                self.in_flight -= 1
+                UPSTREAM_IN_FLIGHT.dec()
+        usage = None
+        if response.status_code == 200:
+            try:
+                usage = response.json().get("usage")
+            except ValueError:
+                pass
+        elif response.status_code == 429 and self.on_rate_limited is not None:
+            self.on_rate_limited(parse_retry_after(response.headers.get("Retry-After")))
+        self._record(backend, start, response.status_code, usage)
+        return response
+
+    def _record(self, backend: Backend, start: float, status, usage: Optional[dict] = None):
+        """Statut HTTP (ou nom de l'exception) d'une requête : routeur, disjoncteur et métriques"""
+        # Une erreur 4xx "définitive" vient de la requête, pas du fournisseur
+        ok = isinstance(status, int) and status not in RETRYABLE_STATUS_CODES
+        self.router.record(backend, time.monotonic() - start, ok, (usage or {}).get("total_tokens", 0))
+        UPSTREAM_RESPONSES.inc(backend.name, str(status))
+        record_usage(backend.name, usage)
+        if ok:
+            backend.breaker.record_success()
+        else:
+            backend.breaker.record_failure()
+
+    async def stream_completion(self, payload: dict, niveau: Optional[str] = None) -> AsyncIterator[str]:
+        """
+        Requête en mode stream (Server-Sent Events de l'API) : renvoie les morceaux
+        de texte au fil de l'eau. Si l'appelant abandonne l'itération, la connexion
+        est fermée et la génération côté fournisseur s'arrête.
+        """
+        backend = self._choose_backend(niveau)
+        # include_usage : le dernier morceau porte le champ usage (OpenAI, vLLM ; Together l'envoie déjà)
+        payload = dict(payload, stream=True, stream_options={"include_usage": True})
+        if backend.model:
+            payload["model"] = backend.model
+        async with self._semaphore:
+            self.in_flight += 1
+            UPSTREAM_IN_FLIGHT.inc()
+            start = time.monotonic()
+            try:
+                client = self._get_client()
+                async with client.stream("POST", backend.api_url, json=payload, headers=backend.headers) as response:
+                    if response.status_code != 200:
+                        await response.aread()
+                        self._record(backend, start, response.status_code)
+                        raise UpstreamError(response.status_code, response.text)
+                    # Latence jusqu'au début de la réponse (premier octet)
+                    self._record(backend, start, response.status_code)
+                    async for line in response.aiter_lines():
+                        if not line.startswith("data:"):
+                            continue
+                        data = line[5:].strip()
+                        if data == "[DONE]":
+                            break
+                        chunk = json.loads(data)
+                        # Le dernier morceau peut porter le champ usage (Together, OpenAI)
+                        record_usage(backend.name, chunk.get("usage"))
+                        self.usage.record(niveau, chunk.get("usage"))
+                        choices = chunk.get("choices") or []
+                        delta = choices[0].get("delta", {}).get("content") if choices else None
+                        if delta:
+                            yield delta
+            except (httpx.TimeoutException, httpx.TransportError) as e:
+                self._record(backend, start, type(e).__name__)
+                raise
+            finally:
+                self.in_flight -= 1
+                UPSTREAM_IN_FLIGHT.dec()
+                STAGE_SECONDS.observe(time.monotonic() - start, "upstream")
+
+    def get_stats(self) -> dict:
+        stats = dict(
+            self.stats,
+            in_flight=self.in_flight,
+            max_concurrency=self.max_concurrency,
+            latency_p95=self.latencies.quantile(0.95),
+            backends=self.router.get_stats(),
+            usage=self.usage.get_report(),
+        )
+        if self.dispatchers:
+            stats["batching"] = {name: dispatcher.get_stats() for name, dispatcher in self.dispatchers.items()}
+        return stats
+
+    async def aclose(self):
+        """Ferme proprement le pool de connexions"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
@@ -0,0 +1,112 @@
+# Journalisation non bloquante : les handlers écrivent depuis un thread dédié
+import atexit
+import gzip
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import shutil
+from datetime import datetime
+from typing import List
+
+LOG_DIR = os.getenv("LOG_DIR", ".")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+# Rotation par taille (octets) ou, si LOG_ROTATE_WHEN est défini ("midnight", "H"...), par période
+LOG_ROTATE_BYTES = int(os.getenv("LOG_ROTATE_BYTES", str(50 * 1024 * 1024)))
+LOG_ROTATE_WHEN = os.getenv("LOG_ROTATE_WHEN") or None
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", "10"))
+LOG_COMPRESS = os.getenv("LOG_COMPRESS", "1") == "1"
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# Logger dédié aux événements d'interaction (une ligne JSON par question)
+interaction_logger = logging.getLogger("factcheck.interactions")
+
+_listeners: List[logging.handlers.QueueListener] = []
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """Sérialise l'attribut `event` d'un enregistrement en une ligne JSON"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        event = getattr(record, "event", None)
+        if event is None:
+            event = {"message": record.getMessage()}
+        event.setdefault("timestamp", datetime.fromtimestamp(record.created).isoformat())
+        return json.dumps(event, ensure_ascii=False, default=str)
+
+
+def _gzip_rotator(source: str, dest: str):
+    with open(source, "rb") as f_in, gzip.open(dest, "wb") as f_out:
+        shutil.copyfileobj(f_in, f_out)
+    os.remove(source)
+
+
+def _rotating_handler(path: str) -> logging.Handler:
+    if LOG_ROTATE_WHEN:
+        handler = logging.handlers.TimedRotatingFileHandler(
+            path, when=LOG_ROTATE_WHEN, backupCount=LOG_BACKUP_COUNT, encoding="utf-8"
+        )
+    else:
+        handler = logging.handlers.RotatingFileHandler(
+            path, maxBytes=LOG_ROTATE_BYTES, backupCount=LOG_BACKUP_COUNT, encoding="utf-8"
+        )
+    if LOG_COMPRESS:
+        handler.namer = lambda name: name + ".gz"
+        handler.rotator = _gzip_rotator
+    return handler
+
+
+def _attach_queue(logger: logging.Logger, handlers: List[logging.Handler]):
+    """Le logger ne fait que déposer l'enregistrement dans une file ; un thread l'écrit"""
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    _listeners.append(listener)
+
+
+def setup_logging(service: str):
+    """
+    Configure la journalisation d'un processus (`service` = "api" ou "bot") :
+    - logs texte dans factcheck_<service>.log (+ console) ;
+    - événements d'interaction en JSONL dans interactions_<service>.jsonl.
+    Chaque processus écrit dans ses propres fichiers.
+    """
+    if _listeners:
+        return
+    os.makedirs(LOG_DIR, exist_ok=True)
+
+    root = logging.getLogger()
+    root.setLevel(LOG_LEVEL)
+    text_formatter = logging.Formatter(LOG_FORMAT)
+    file_handler = _rotating_handler(os.path.join(LOG_DIR, f"factcheck_{service}.log"))
+    stream_handler = logging.StreamHandler()
+    for handler in (file_handler, stream_handler):
+        handler.setFormatter(text_formatter)
+    _attach_queue(root, [file_handler, stream_handler])
+
+    attach_jsonl_file(interaction_logger, os.path.join(LOG_DIR, f"interactions_{service}.jsonl"))
+
+    atexit.register(shutdown_logging)
+
+
+def attach_jsonl_file(logger: logging.Logger, path: str):
+    """Fichier JSONL tournant, écrit en arrière-plan, pour un logger d'événements (attribut `event`)"""
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    jsonl_handler = _rotating_handler(path)
+    jsonl_handler.setFormatter(JsonLinesFormatter())
+    _attach_queue(logger, [jsonl_handler])
+
+
+def shutdown_logging():
+    """Vide les files et arrête les threads d'écriture"""
+    while _listeners:
+        _listeners.pop().stop()
+
+
+def log_event(event: dict):
+    """Publie un événement structuré ; la sérialisation JSON se fait dans le thread d'écriture"""
+    interaction_logger.info("interaction", extra={"event": event})
@@ -0,0 +1,214 @@
+# Métriques au format texte Prometheus, sans dépendance externe
+#
+# Les mises à jour sont de simples opérations sur des dicts (pas de verrou : les
+# handlers tournent dans une seule boucle asyncio), assez légères pour rester
+# actives à pleine charge. Chaque processus expose ses propres valeurs :
+# GET /metrics sur l'API, METRICS_PORT (ou la route /metrics du webhook) pour le bot.
+import os
+import threading
+from abc import ABC, abstractmethod
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Sequence, Tuple
+
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9100"))
+
+# Bornes (secondes) adaptées à la fois aux filtres (µs) et aux appels LLM (s)
+DEFAULT_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _format_labels(names: Sequence[str], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [name + '="' + str(value).replace("\\", "\\\\").replace('"', '\\"') + '"'
+             for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Metric(ABC):
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    @abstractmethod
+    def samples(self) -> List[str]:
+        ...
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"] + self.samples()
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def get(self, *labels: str) -> float:
+        return self._values.get(labels, 0)
+
+    def samples(self) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, labels)} {value}"
+                for labels, value in list(self._values.items())]
+
+
+class Gauge(Metric):
+    """Valeur instantanée (ex : requêtes en cours)"""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {} if labelnames else {(): 0.0}
+
+    def inc(self, *labels: str, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, *labels: str, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) - amount
+
+    def set(self, value: float, *labels: str):
+        self._values[labels] = value
+
+    def samples(self) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, labels)} {value}"
+                for labels, value in list(self._values.items())]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [compteurs par borne (+Inf en dernier), somme]
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, *labels: str):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    @contextmanager
+    def time(self, *labels: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def samples(self) -> List[str]:
+        lines = []
+        for labels, (counts, total) in list(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                bucket_labels = _format_labels(self.labelnames, labels, 'le="' + le + '"')
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+# Durée de chaque étape : filters, safety, prompt_build, upstream, handler
+STAGE_SECONDS = registry.register(Histogram(
+    "factcheck_stage_seconds", "Time spent in each stage of a request", ("stage",)))
+REQUESTS = registry.register(Counter(
+    "factcheck_requests_total", "Questions handled, by niveau", ("niveau",)))
+SAFETY_LEVELS = registry.register(Counter(
+    "factcheck_safety_level_total", "Safety analysis results (SAFE, MEDIUM, HIGH, SUPERVISION)", ("level",)))
+REFUSALS = registry.register(Counter(
+    "factcheck_refusals_total", "Questions refused before the LLM call, by reason", ("reason",)))
+UPSTREAM_RESPONSES = registry.register(Counter(
+    "llm_upstream_responses_total", "Upstream HTTP status codes (or error type), by backend", ("backend", "status")))
+UPSTREAM_TOKENS = registry.register(Counter(
+    "llm_tokens_total", "Tokens reported in the upstream usage field, by backend", ("backend", "kind")))
+LEVEL_TOKENS = registry.register(Counter(
+    "factcheck_llm_tokens_by_level_total", "Tokens of the completions returned to users, by niveau",
+    ("niveau", "kind")))
+FACT_BASE_RELOAD_ERRORS = registry.register(Counter(
+    "factcheck_fact_base_reload_errors_total", "Fact base reloads that failed (the loaded version is kept)"))
+UPSTREAM_IN_FLIGHT = registry.register(Gauge(
+    "llm_in_flight_requests", "Upstream requests currently in flight"))
+# Délai depuis le lancement du processus : fin du préchauffage, première requête servie
+STARTUP_SECONDS = registry.register(Gauge(
+    "factcheck_startup_seconds", "Seconds from process start to readiness and to the first served request",
+    ("phase",)))
+
+
+def cached_tokens(usage: dict) -> int:
+    """
+    Tokens d'entrée lus dans le cache de préfixe du fournisseur : format OpenAI / vLLM
+    (prompt_tokens_details.cached_tokens) ou champ cached_tokens direct
+    """
+    details = usage.get("prompt_tokens_details") or {}
+    return int(details.get("cached_tokens") or usage.get("cached_tokens") or 0)
+
+
+def record_usage(backend: str, usage: Optional[dict]):
+    """Compte les tokens du champ `usage` d'une réponse de complétion"""
+    if not usage:
+        return
+    for kind in ("prompt_tokens", "completion_tokens"):
+        if usage.get(kind):
+            UPSTREAM_TOKENS.inc(backend, kind[:-len("_tokens")], amount=usage[kind])
+    cached = cached_tokens(usage)
+    if cached:
+        UPSTREAM_TOKENS.inc(backend, "cached", amount=cached)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # pas de log par scrape
+
+
+def start_metrics_server(port: int = METRICS_PORT, host: str = "0.0.0.0") -> Optional[ThreadingHTTPServer]:
+    """Sert GET /metrics dans un thread (processus sans serveur HTTP, ex : bot en polling) ; port 0 = désactivé"""
+    if not port:
+        return None
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    return server
@@ -0,0 +1,129 @@
+# Routage des requêtes LLM entre plusieurs fournisseurs compatibles OpenAI
+import json
+import os
+import random
+from typing import Dict, List, Optional
+
+from resilience import CircuitBreaker
+
+LLM_BACKENDS_PATH = os.getenv("LLM_BACKENDS_PATH") or None
+LLM_ROUTER_ALPHA = float(os.getenv("LLM_ROUTER_ALPHA", "0.2"))
+LLM_ROUTER_EXPLORE = float(os.getenv("LLM_ROUTER_EXPLORE", "0.05"))
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+LLM_BREAKER_RESET = float(os.getenv("LLM_BREAKER_RESET", "30"))
+
+
+class Backend:
+    """Un fournisseur (URL, modèle, clé, coût) et ses statistiques observées"""
+
+    def __init__(self, name: str, api_url: str, model: Optional[str] = None, api_key: Optional[str] = None,
+                 cost_per_1k_tokens: float = 0.0, initial_latency: float = 1.0):
+        self.name = name
+        self.api_url = api_url
+        self.model = model
+        self.headers = {"Content-Type": "application/json"}
+        if api_key:
+            self.headers["Authorization"] = f"Bearer {api_key}"
+        self.cost_per_1k_tokens = cost_per_1k_tokens
+        self.breaker = CircuitBreaker(LLM_BREAKER_FAILURES, LLM_BREAKER_RESET)
+        # Moyennes mobiles exponentielles ; latence initiale optimiste pour explorer
+        self.ewma_latency = initial_latency
+        self.ewma_error = 0.0
+        self.requests = 0
+        self.tokens = 0
+
+    def score(self) -> float:
+        """Plus petit = meilleur : latence pénalisée par le taux d'erreur"""
+        return self.ewma_latency * (1 + 4 * self.ewma_error)
+
+    def get_stats(self) -> dict:
+        return {
+            "model": self.model,
+            "requests": self.requests,
+            "ewma_latency": round(self.ewma_latency, 4),
+            "ewma_error": round(self.ewma_error, 4),
+            "breaker_state": self.breaker.state,
+            "tokens": self.tokens,
+            "estimated_cost": round(self.tokens / 1000 * self.cost_per_1k_tokens, 6),
+        }
+
+
+class ModelRouter:
+    """
+    Choisit un fournisseur par requête selon la latence et le taux d'erreur
+    observés (EWMA), en respectant des préférences par niveau : le premier
+    fournisseur préféré est favorisé, les suivants sont pénalisés d'un facteur
+    `preference_penalty` par rang. Un petit taux d'exploration garde les
+    statistiques des autres fournisseurs à jour. Les fournisseurs dont le
+    disjoncteur est ouvert sont ignorés.
+    """
+
+    def __init__(self, backends: List[Backend], niveau_preferences: Optional[Dict[str, List[str]]] = None,
+                 alpha: float = LLM_ROUTER_ALPHA, explore: float = LLM_ROUTER_EXPLORE,
+                 preference_penalty: float = 1.5):
+        if not backends:
+            raise ValueError("Au moins un fournisseur LLM est requis")
+        self.backends = {backend.name: backend for backend in backends}
+        self.niveau_preferences = niveau_preferences or {}
+        self.alpha = alpha
+        self.explore = explore
+        self.preference_penalty = preference_penalty
+
+    @classmethod
+    def from_config(cls, path: str) -> "ModelRouter":
+        """Charge les fournisseurs depuis un fichier JSON (voir llm_backends.example.json)"""
+        with open(path, encoding="utf-8") as f:
+            config = json.load(f)
+        backends = [
+            Backend(
+                entry["name"],
+                entry["api_url"],
+                entry["model"],
+                os.getenv(entry["api_key_env"]) if entry.get("api_key_env") else None,
+                entry.get("cost_per_1k_tokens", 0.0),
+            )
+            for entry in config["backends"]
+        ]
+        return cls(backends, config.get("niveau_preferences"))
+
+    def _candidates(self, niveau: Optional[str]) -> List[tuple]:
+        preferences = self.niveau_preferences.get(niveau or "", [])
+        candidates = []
+        for backend in self.backends.values():
+            rank = preferences.index(backend.name) if backend.name in preferences else len(preferences)
+            candidates.append((backend.score() * self.preference_penalty ** rank, backend))
+        candidates.sort(key=lambda item: item[0])
+        return candidates
+
+    def choose(self, niveau: Optional[str] = None) -> Optional[Backend]:
+        """Meilleur fournisseur disponible, ou None si tous les disjoncteurs sont ouverts"""
+        candidates = self._candidates(niveau)
+        if len(candidates) > 1 and random.random() < self.explore:
+            random.shuffle(candidates)
+        for _, backend in candidates:
+            if backend.breaker.allow_request():
+                return backend
+        return None
+
+    def record(self, backend: Backend, latency: float, ok: bool, tokens: int = 0):
+        backend.requests += 1
+        backend.tokens += tokens
+        # Un échec rapide (503 immédiat) ne doit pas faire paraître le fournisseur plus rapide
+        if ok or latency > backend.ewma_latency:
+            backend.ewma_latency += self.alpha * (latency - backend.ewma_latency)
+        backend.ewma_error += self.alpha * ((0.0 if ok else 1.0) - backend.ewma_error)
+
+    def get_stats(self) -> Dict[str, dict]:
+        return {name: backend.get_stats() for name, backend in self.backends.items()}
+
+
+def default_router(api_url: str, headers: Dict[str, str]) -> ModelRouter:
+    """
+    Routeur depuis LLM_BACKENDS_PATH, sinon un seul fournisseur (API_URL du bot)
+    qui garde le modèle indiqué dans le payload
+    """
+    if LLM_BACKENDS_PATH:
+        return ModelRouter.from_config(LLM_BACKENDS_PATH)
+    backend = Backend("default", api_url)
+    backend.headers = dict(headers)
+    return ModelRouter([backend])
@@ -0,0 +1,175 @@
+# Pré-génération des réponses aux questions les plus fréquentes, par niveau
+#
+# Usage (après un déploiement ou une modification de prompt) :
+#   python prewarm.py interactions_api.jsonl interactions_bot.jsonl capture_api.jsonl --top 200
+#
+# Lit les journaux d'interactions (interactions_*.jsonl) et les captures de trafic
+# (capture_*.jsonl), rotations .gz comprises ; regroupe les questions par forme
+# normalisée puis par reformulations proches (MinHash) ; classe les groupes par
+# fréquence et génère, pour chacun des plus fréquents, la réponse de chaque niveau
+# et de chaque profil (persona web et Telegram) via achat_with_ai. Chaque réponse
+# obtenue est ajoutée au point de reprise : relancer la commande reprend là où
+# elle s'était arrêtée.
+# Le résultat est un instantané (ANSWER_SNAPSHOT_PATH) chargé par le service
+# au démarrage ; ses entrées sont liées à la version du prompt qui les a produites.
+import argparse
+import asyncio
+import gzip
+import json
+import logging
+import os
+from collections import Counter
+from typing import Dict, Iterator, List, Tuple
+
+from answer_cache import (ANSWER_CACHE_SIMILARITY, ANSWER_SNAPSHOT_PATH, MinHashIndex, normalize_question,
+                          write_snapshot)
+import factcheck_core
+from factcheck_core import PROFILES, FactCheckBot, is_fact_check_question, is_malicious_bypass_attempt
+from fact_base import fact_base
+from intent_classifier import intent_classifier
+from prompts import prompt_registry
+from text_matcher import content_matcher
+
+# Âge représentatif de chaque niveau, et prénom fictif (retiré des réponses mises en cache)
+NIVEAU_AGES = {"enfant": 9, "ado": 13, "adulte": 30}
+PREWARM_NAME = "Camille"
+# Le journal des interactions tronque les messages à 100 caractères (+ "...") : inutilisables
+_TRUNCATED_LENGTH = 103
+
+
+def iter_questions(paths: List[str]) -> Iterator[str]:
+    """Questions complètes des journaux d'interactions et des captures de trafic"""
+    for path in paths:
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    continue
+                message = event.get("message")
+                if event.get("kind", "request") != "request" or not isinstance(message, str):
+                    continue
+                if len(message) == _TRUNCATED_LENGTH and message.endswith("..."):
+                    continue
+                yield message.strip()
+
+
+def rank_questions(questions: Iterator[str], top: int, similarity: float = ANSWER_CACHE_SIMILARITY
+                   ) -> List[Tuple[str, int]]:
+    """
+    Groupes de questions les plus fréquents : [(formulation la plus courante, occurrences)].
+    Les demandes hors vérification, les tentatives de contournement et les
+    questions déjà couvertes par la base de faits sont écartées.
+    """
+    by_form: Dict[str, Counter] = {}
+    for question in questions:
+        normalized = normalize_question(question)
+        if normalized:
+            by_form.setdefault(normalized, Counter())[question] += 1
+
+    # Reformulations proches rattachées à la forme la plus fréquente du groupe
+    index = MinHashIndex()
+    clusters: Dict[str, Counter] = {}
+    for normalized, texts in sorted(by_form.items(), key=lambda item: -sum(item[1].values())):
+        representative = index.query(normalized, similarity, "")
+        if representative is None:
+            index.add(normalized, normalized)
+            clusters[normalized] = Counter(texts)
+        else:
+            clusters[representative].update(texts)
+
+    ranked = []
+    for texts in sorted(clusters.values(), key=lambda texts: -sum(texts.values())):
+        question = texts.most_common(1)[0][0]
+        matches = content_matcher.classify(question)
+        intent = intent_classifier.predict(question)
+        if (is_malicious_bypass_attempt(question, matches, intent)
+                or not is_fact_check_question(question, matches, intent)):
+            continue
+        if fact_base.fast_answer(question, "adulte") is not None:
+            continue
+        ranked.append((question, sum(texts.values())))
+        if len(ranked) >= top:
+            break
+    return ranked
+
+
+def load_checkpoint(path: str) -> Dict[str, str]:
+    entries = {}
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    item = json.loads(line)
+                except ValueError:
+                    continue  # dernière ligne incomplète après une interruption
+                entries[item["key"]] = item["answer"]
+    return entries
+
+
+async def generate(questions: List[str], profiles: List[str], concurrency: int,
+                   checkpoint_path: str, done: Dict[str, str]) -> Dict[str, int]:
+    """Génère les réponses manquantes (concurrence bornée), en les ajoutant au point de reprise"""
+    factcheck_core.setup()
+    answer_cache = factcheck_core.answer_cache
+    semaphore = asyncio.Semaphore(concurrency)
+    counts = Counter()
+    bots = [FactCheckBot(PROFILES[name]) for name in profiles]
+
+    async def one(bot: FactCheckBot, question: str, niveau: str, checkpoint):
+        key = answer_cache.make_key(question, niveau, bot.get_template(niveau).version)
+        if key in done:
+            counts["skipped"] += 1
+            return
+        async with semaphore:
+            await bot.achat_with_ai(question, PREWARM_NAME, niveau, NIVEAU_AGES[niveau], priority="batch")
+        # Seules les réponses réussies du LLM entrent dans le cache (pas les refus ni les erreurs),
+        # déjà sans le prénom
+        answer = answer_cache.export({key.split("|", 1)[0]}).get(key)
+        if answer is None:
+            counts["not_cached"] += 1
+            return
+        done[key] = answer
+        checkpoint.write(json.dumps({"key": key, "answer": answer}, ensure_ascii=False) + "\n")
+        checkpoint.flush()
+        counts["generated"] += 1
+
+    with open(checkpoint_path, "a", encoding="utf-8") as checkpoint:
+        await asyncio.gather(*(one(bot, question, niveau, checkpoint)
+                               for question in questions for bot in bots for niveau in NIVEAU_AGES))
+    await factcheck_core.aclose()
+    return dict(counts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pré-génère les réponses aux questions les plus fréquentes")
+    parser.add_argument("logs", nargs="+", help="interactions_*.jsonl et/ou capture_*.jsonl (.gz acceptés)")
+    parser.add_argument("--top", type=int, default=200, help="nombre de groupes de questions")
+    parser.add_argument("--profiles", nargs="+", choices=sorted(PROFILES), default=sorted(PROFILES))
+    parser.add_argument("--concurrency", type=int, default=4, help="appels LLM simultanés")
+    parser.add_argument("--output", default=ANSWER_SNAPSHOT_PATH, help="instantané à écrire")
+    parser.add_argument("--checkpoint", help="point de reprise (défaut : <output>.checkpoint.jsonl)")
+    parser.add_argument("--dry-run", action="store_true", help="affiche le classement sans appeler le LLM")
+    args = parser.parse_args()
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"), format="%(asctime)s - %(name)s - %(message)s")
+
+    ranked = rank_questions(iter_questions(args.logs), args.top)
+    for question, count in ranked[:20]:
+        print(f"{count:>6}  {question}")
+    if args.dry_run:
+        return
+
+    checkpoint_path = args.checkpoint or f"{args.output}.checkpoint.jsonl"
+    versions = prompt_registry.versions()
+    # Les entrées d'anciennes versions de prompt ne sont pas reprises
+    done = {key: answer for key, answer in load_checkpoint(checkpoint_path).items()
+            if key.split("|", 1)[0] in versions}
+    counts = asyncio.run(generate([question for question, _ in ranked], args.profiles, args.concurrency,
+                                  checkpoint_path, done))
+    write_snapshot(args.output, done, versions)
+    print(f"{len(ranked)} questions, {counts} ; instantané : {args.output} ({len(done)} réponses)")
+
+
+if __name__ == "__main__":
+    main()
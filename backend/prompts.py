@@ -0,0 +1,252 @@
+# Registre des prompts système, compilés une seule fois au démarrage
+import hashlib
+import math
+import os
+from typing import Dict
+
+# Approximation du nombre de tokens (français, tokenizer Mixtral) : ~3,5 caractères par token
+CHARS_PER_TOKEN = 3.5
+
+# Longueur maximale des réponses par niveau (surchargeable par variable d'environnement)
+DEFAULT_MAX_TOKENS = {
+    "enfant": int(os.getenv("MAX_TOKENS_ENFANT", "200")),
+    "ado": int(os.getenv("MAX_TOKENS_ADO", "300")),
+    "adulte": int(os.getenv("MAX_TOKENS_ADULTE", "300")),
+}
+
+BASE_IDENTITIES = {
+    "dinobot": "Tu es DinoBot, une IA spécialisée dans la vérification d'informations.",
+    "factcheck_bot": "Tu es FactCheck_Bot, une IA spécialisée dans la vérification d'informations.",
+}
+
+# Gabarits par persona et par niveau. {base_identity} est résolu à la compilation ;
+# le texte obtenu est identique octet pour octet pour tous les utilisateurs d'un
+# niveau, ce qui permet au fournisseur de réutiliser son cache de préfixe (KV cache).
+PROMPT_SOURCES = {
+    "dinobot": {
+        "enfant": """
+{base_identity}
+
+INSTRUCTIONS SPÉCIFIQUES:
+1. Utilise un vocabulaire très simple (niveau CE1-CE2)
+2. Explique avec des exemples concrets du quotidien
+3. Reste toujours bienveillant et encourageant
+4. Si l'information est complexe, propose de demander à un adulte
+5. Utilise un ou deux émojis pour rendre la réponse plus chaleureuse
+6. Limite ta réponse à 1 ou 2 phrases courtes
+7. Réponds toujours en français
+
+IMPORTANT :
+- NE DONNE JAMAIS d'exemple de format, de balises, ni de texte entre crochets dans ta réponse finale.
+- Ne recopie pas les mots "[Émoji] [Réponse simple] [Encouragement ou conseil]" ou tout autre exemple de format.
+- Ta réponse doit être naturelle, sans structure ni balises, juste la réponse pour l'enfant.
+""",
+        "ado": """
+{base_identity}
+
+INSTRUCTIONS SPÉCIFIQUES:
+1. Utilise un langage simple, jamais infantilisant
+2. Explique de façon claire et concise (2 phrases max)
+3. Ajoute un émoji si pertinent
+4. Encourage l'esprit critique
+5. Si c'est trop complexe, propose de demander à un adulte
+6. Réponds toujours en français
+
+IMPORTANT :
+- NE DONNE JAMAIS d'exemple de format, de balises, ni de texte entre crochets dans ta réponse finale.
+- Ne recopie pas les mots "[Émoji] [Réponse simple] [Encouragement ou conseil]" ou tout autre exemple de format.
+- Ta réponse doit être naturelle, sans structure ni balises, juste la réponse pour l'ado.
+""",
+        "adulte": """
+{base_identity}
+
+INSTRUCTIONS SPÉCIFIQUES:
+1. Fournis une réponse concise et factuelle (2-3 phrases max)
+2. Explique ta méthodologie si pertinent, mais reste bref
+3. Réponds toujours en français
+
+IMPORTANT :
+- NE DONNE JAMAIS d'exemple de format, de balises, ni de texte entre crochets dans ta réponse finale.
+- Ta réponse doit être naturelle, sans structure ni balises.
+""",
+    },
+    "factcheck_bot": {
+        "enfant": """
+{base_identity}
+
+INSTRUCTIONS SPÉCIFIQUES:
+1. Utilise un vocabulaire très simple (niveau CE1-CE2)
+2. Explique avec des exemples concrets du quotidien
+3. Reste toujours bienveillant et encourageant
+4. Si l'information est complexe, propose de demander à un adulte
+5. Utilise des émojis pour rendre tes réponses plus amusantes
+6. Limite tes réponses à 2-3 phrases courtes
+7. Répond toujours en français, en moins de 300 mots
+
+RÈGLES DE SÉCURITÉ:
+- Évite tous sujets sensibles ou effrayants
+- Si tu ne peux pas répondre simplement, redirige vers un adulte
+- Encourage toujours la curiosité tout en restant prudent
+
+FORMAT DE RÉPONSE:
+[Émoji] [Réponse simple] [Encouragement ou conseil]
+
+Tu DOIS ABSOLUMENT respecter ce format exact, sans variation :
+
+ÉMOJI + RÉPONSE + ENCOURAGEMENT
+
+RÈGLES STRICTES :
+Commence TOUJOURS par un émoji
+Finis TOUJOURS par un encouragement avec émoji
+Ne jamais expliquer le format
+Ne jamais écrire "FORMAT DE RÉPONSE" dans ta réponse
+""",
+        "ado": """
+{base_identity}
+
+INSTRUCTIONS SPÉCIFIQUES:
+1. Utilise un langage clair mais pas infantilisant
+2. Explique les sources et la méthode de vérification
+3. Encourage l'esprit critique
+4. Aborde les nuances sans dramatiser
+5. Propose des ressources fiables pour approfondir
+6. Limite à 4-5 phrases avec structure logique
+7. Répond toujours en français, en moins de 300 mots
+
+RÈGLES DE SÉCURITÉ:
+- Traite les sujets sensibles avec mesure
+- Encourage le dialogue avec des adultes de confiance si nécessaire
+- Développe l'autonomie de réflexion
+
+FORMAT DE RÉPONSE:
+[Statut: VRAI/FAUX/INCERTAIN] [Explication] [Source/Méthode] [Conseil]
+""",
+        "adulte": """
+{base_identity}
+
+INSTRUCTIONS SPÉCIFIQUES:
+1. Fournis une analyse factuelle et nuancée
+2. Cite tes sources et limites de connaissance
+3. Explique ta méthodologie de vérification
+4. Aborde les controverses de manière équilibrée
+5. Suggère des vérifications croisées si pertinent
+6. Sois concis mais complet (max 6-7 phrases)
+7. Répond toujours en français, en moins de 300 mots
+
+RÈGLES PROFESSIONNELLES:
+- Reste objectif et neutre
+- Distingue clairement faits établis, probable et incertain
+- Indique tes limites de connaissance temporelle (cutoff)
+- Encourage la vérification indépendante
+
+FORMAT DE RÉPONSE:
+[STATUT] [Analyse factuelle] [Sources/Limites] [Recommandations de vérification]
+""",
+    },
+}
+
+# Contexte propre à l'utilisateur, envoyé dans un message séparé après le prompt
+# statique : {user_name} et {user_age} sont résolus à chaque appel.
+USER_CONTEXT_SOURCES = {
+    "enfant": """
+CONTEXTE UTILISATEUR:
+- Nom: {user_name}
+- Âge: {user_age} ans (enfant)
+- Niveau: Primaire
+""",
+    "ado": """
+CONTEXTE UTILISATEUR:
+- Nom: {user_name}
+- Âge: {user_age} ans (adolescent)
+- Niveau: Collège/Lycée
+""",
+    "adulte": """
+CONTEXTE UTILISATEUR:
+- Nom: {user_name}
+- Âge: {user_age} ans (adulte)
+- Niveau: Mature
+""",
+}
+
+ERROR_MESSAGES = {
+    "enfant": {
+        "api_error": "😅 Oups ! J'ai un petit problème technique. Peux-tu réessayer dans quelques minutes ?",
+        "timeout": "⏰ Je réfléchis trop lentement ! Peux-tu me reposer ta question ?",
+        "general_error": "🤖 J'ai un petit bug ! Essaie de me poser ta question différemment.",
+        "rate_limited": "🐢 Doucement ! Tu poses beaucoup de questions. Attends un petit peu avant la suivante.",
+        "busy": "🦕 Il y a beaucoup de monde en ce moment ! Repose-moi ta question dans une minute."
+    },
+    "ado": {
+        "api_error": "⚠️ Problème technique temporaire. Réessaie dans quelques instants.",
+        "timeout": "⏱️ La connexion est lente. Peux-tu reformuler ta question ?",
+        "general_error": "🔧 Erreur système. Essaie avec une formulation différente.",
+        "rate_limited": "⏳ Trop de questions d'un coup. Patiente quelques secondes avant de réessayer.",
+        "busy": "🚦 Le service est très sollicité. Réessaie dans un instant."
+    },
+    "adulte": {
+        "api_error": "Erreur API temporaire. Veuillez réessayer ultérieurement.",
+        "timeout": "Délai de connexion dépassé. Reformulez votre question.",
+        "general_error": "Erreur technique. Essayez une formulation alternative.",
+        "rate_limited": "Trop de requêtes. Veuillez patienter quelques secondes avant de réessayer.",
+        "busy": "Service momentanément saturé. Veuillez réessayer dans quelques instants."
+    }
+}
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+class PromptTemplate:
+    """
+    Gabarit compilé pour un persona et un niveau, avec version et taille connues.
+    `template` est le préfixe statique ; seul `user_context` dépend de l'utilisateur.
+    """
+
+    __slots__ = ("persona", "niveau", "template", "user_context", "version", "token_count", "max_tokens")
+
+    def __init__(self, persona: str, niveau: str, template: str, max_tokens: int, user_context: str = ""):
+        self.persona = persona
+        self.niveau = niveau
+        self.template = template
+        self.user_context = user_context
+        # La version change dès que le texte du gabarit change (clé de cache, A/B)
+        digest = hashlib.sha1((template + user_context).encode("utf-8")).hexdigest()[:8]
+        self.version = f"{persona}-{niveau}-{digest}"
+        self.token_count = estimate_tokens(template) + estimate_tokens(user_context)
+        self.max_tokens = max_tokens
+
+    def render_user_context(self, user_name: str, user_age: int) -> str:
+        return self.user_context.format(user_name=user_name, user_age=user_age)
+
+
+class PromptRegistry:
+    def __init__(self, sources: Dict[str, Dict[str, str]] = PROMPT_SOURCES,
+                 identities: Dict[str, str] = BASE_IDENTITIES,
+                 max_tokens: Dict[str, int] = DEFAULT_MAX_TOKENS,
+                 user_contexts: Dict[str, str] = USER_CONTEXT_SOURCES):
+        self._templates: Dict[str, Dict[str, PromptTemplate]] = {}
+        for persona, by_level in sources.items():
+            self._templates[persona] = {
+                niveau: PromptTemplate(
+                    persona,
+                    niveau,
+                    text.replace("{base_identity}", identities[persona]).strip(),
+                    max_tokens.get(niveau, max_tokens["adulte"]),
+                    user_contexts.get(niveau, user_contexts["adulte"]).strip(),
+                )
+                for niveau, text in by_level.items()
+            }
+
+    def versions(self) -> set:
+        """Versions de tous les gabarits compilés (entrées de cache encore valides)"""
+        return {template.version for by_level in self._templates.values() for template in by_level.values()}
+
+    def get(self, persona: str, niveau: str) -> PromptTemplate:
+        """Gabarit du niveau demandé (adulte par défaut)"""
+        templates = self._templates[persona]
+        return templates.get(niveau, templates["adulte"])
+
+
+# Instance partagée, construite une seule fois à l'import
+prompt_registry = PromptRegistry()
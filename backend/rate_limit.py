@@ -0,0 +1,200 @@
+# Limitation de débit : seaux de jetons par utilisateur et budget global de tokens LLM
+import asyncio
+import math
+import os
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+# Par utilisateur (chat_id Telegram ou client web) : questions par minute et rafale tolérée
+RATE_LIMIT_USER_PER_MINUTE = float(os.getenv("RATE_LIMIT_USER_PER_MINUTE", "20"))
+RATE_LIMIT_USER_BURST = float(os.getenv("RATE_LIMIT_USER_BURST", "5"))
+# Budget global en tokens par minute (prompt estimé + max_tokens) ; 0 = illimité
+RATE_LIMIT_GLOBAL_TPM = float(os.getenv("RATE_LIMIT_GLOBAL_TPM", "0"))
+# Vérification par lots (/check/batch) : affirmations envoyées au LLM par heure et par client,
+# réservées d'un coup pour tout le lot ; 0 = illimité
+RATE_LIMIT_BATCH_CLAIMS_PER_HOUR = float(os.getenv("RATE_LIMIT_BATCH_CLAIMS_PER_HOUR", "5000"))
+# "queue" : attendre jusqu'à RATE_LIMIT_MAX_WAIT secondes qu'un jeton se libère ; "reject" : refuser tout de suite
+RATE_LIMIT_POLICY = os.getenv("RATE_LIMIT_POLICY", "queue")
+RATE_LIMIT_MAX_WAIT = float(os.getenv("RATE_LIMIT_MAX_WAIT", "5"))
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "1000000"))
+# "memory" (par processus) ou "redis" (partagé entre workers, nécessite le paquet redis)
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")
+RATE_LIMIT_REDIS_URL = os.getenv("RATE_LIMIT_REDIS_URL", "redis://localhost:6379/0")
+
+
+class MemoryBucketStore:
+    """
+    Seaux de jetons en mémoire : (jetons, horodatage, instant où le seau sera
+    plein) par clé, dans un LRU. Un seau redevenu plein est équivalent à une clé
+    absente : il est évincé, la mémoire ne dépend donc que du nombre
+    d'utilisateurs actifs, pas du nombre total de clés.
+    """
+
+    def __init__(self, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, Tuple[float, float, float]]" = OrderedDict()
+
+    def _evict(self, now: float):
+        while self._buckets:
+            full_at = next(iter(self._buckets.values()))[2]
+            if len(self._buckets) < self.max_keys and now < full_at:
+                break
+            self._buckets.popitem(last=False)
+
+    async def take(self, key: str, cost: float, rate: float, capacity: float) -> float:
+        """Prend `cost` jetons ; renvoie 0 si accordé, sinon l'attente (s) avant que ce soit possible"""
+        now = time.monotonic()
+        self._evict(now)
+        tokens, updated, _ = self._buckets.get(key, (capacity, now, now))
+        tokens = min(capacity, tokens + (now - updated) * rate)
+        if tokens >= cost:
+            tokens -= cost
+            self._buckets[key] = (tokens, now, now + (capacity - tokens) / rate)
+            self._buckets.move_to_end(key)
+            return 0.0
+        return (cost - tokens) / rate
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+class RedisBucketStore:
+    """Seaux partagés entre processus, mis à jour atomiquement par un script Lua"""
+
+    _SCRIPT = """
+    local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+    local cost, rate, capacity, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3]), tonumber(ARGV[4])
+    local tokens = tonumber(bucket[1]) or capacity
+    local updated = tonumber(bucket[2]) or now
+    tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+    if tokens >= cost then
+        redis.call('HSET', KEYS[1], 'tokens', tokens - cost, 'updated', now)
+        redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+        return '0'
+    end
+    return tostring((cost - tokens) / rate)
+    """
+
+    def __init__(self, url: str = RATE_LIMIT_REDIS_URL, prefix: str = "factcheck:ratelimit:"):
+        try:
+            import redis.asyncio as redis
+        except ImportError as e:
+            raise RuntimeError("RATE_LIMIT_BACKEND=redis nécessite le paquet redis (pip install redis)") from e
+        self._redis = redis.from_url(url)
+        self._script = self._redis.register_script(self._SCRIPT)
+        self.prefix = prefix
+
+    async def take(self, key: str, cost: float, rate: float, capacity: float) -> float:
+        # Horloge murale : elle doit être commune à tous les processus
+        wait = await self._script(keys=[self.prefix + key], args=[cost, rate, capacity, time.time()])
+        return float(wait)
+
+    async def close(self):
+        await self._redis.aclose()
+
+
+class RateLimiter:
+    """
+    Deux limites avant chaque appel LLM : un seau par utilisateur (questions par
+    minute) et un budget global de tokens par minute. Au-delà, la politique
+    "queue" attend si la place se libère en moins de max_wait secondes, sinon
+    la requête est refusée. Un 429 du fournisseur suspend le budget global
+    pendant la durée indiquée par Retry-After.
+    """
+
+    def __init__(self, store=None, user_per_minute: float = RATE_LIMIT_USER_PER_MINUTE,
+                 user_burst: float = RATE_LIMIT_USER_BURST, global_tpm: float = RATE_LIMIT_GLOBAL_TPM,
+                 policy: str = RATE_LIMIT_POLICY, max_wait: float = RATE_LIMIT_MAX_WAIT,
+                 batch_claims_per_hour: float = RATE_LIMIT_BATCH_CLAIMS_PER_HOUR):
+        self.store = store or MemoryBucketStore()
+        self.user_rate = user_per_minute / 60
+        self.user_burst = user_burst
+        self.global_rate = global_tpm / 60
+        self.global_capacity = global_tpm
+        self.batch_rate = batch_claims_per_hour / 3600
+        self.batch_capacity = batch_claims_per_hour
+        self.policy = policy
+        self.max_wait = max_wait if policy == "queue" else 0.0
+        self._paused_until = 0.0
+        self.stats = {"allowed": 0, "queued": 0, "rejected_user": 0, "rejected_global": 0, "upstream_pauses": 0,
+                      "rejected_batches": 0}
+
+    async def _take(self, key: str, cost: float, rate: float, capacity: float, deadline: float) -> bool:
+        # Une requête plus coûteuse que le seau entier ne pourrait jamais passer : on la plafonne
+        cost = min(cost, capacity)
+        queued = False
+        while True:
+            wait = await self.store.take(key, cost, rate, capacity)
+            if wait == 0:
+                return True
+            if time.monotonic() + wait > deadline:
+                return False
+            if not queued:
+                queued = True
+                self.stats["queued"] += 1
+            await asyncio.sleep(wait)
+
+    async def acquire(self, user_key: Optional[str], cost_tokens: float) -> Optional[str]:
+        """
+        Attend (selon la politique) puis réserve la place d'un appel LLM.
+        Returns: None si accordé, sinon la limite atteinte ("user" ou "global")
+        """
+        deadline = time.monotonic() + self.max_wait
+        if user_key is not None and self.user_rate > 0:
+            if not await self._take(f"user:{user_key}", 1, self.user_rate, self.user_burst, deadline):
+                self.stats["rejected_user"] += 1
+                return "user"
+        pause = self._paused_until - time.monotonic()
+        if pause > 0:
+            if time.monotonic() + pause > deadline:
+                self.stats["rejected_global"] += 1
+                return "global"
+            await asyncio.sleep(pause)
+        if self.global_rate > 0:
+            if not await self._take("global", cost_tokens, self.global_rate, self.global_capacity, deadline):
+                self.stats["rejected_global"] += 1
+                return "global"
+        self.stats["allowed"] += 1
+        return None
+
+    async def acquire_batch(self, client_key: str, claims: int) -> Optional[float]:
+        """
+        Réserve d'un coup la place de `claims` appels LLM d'un lot sur le seau du client,
+        sans attente. Returns: None si accordé, sinon l'attente (s) avant que le lot
+        puisse passer (inf s'il dépasse le budget horaire entier)
+        """
+        if self.batch_rate <= 0 or claims <= 0:
+            return None
+        if claims > self.batch_capacity:
+            wait = math.inf
+        else:
+            wait = await self.store.take(f"batch:{client_key}", claims, self.batch_rate, self.batch_capacity)
+        if wait == 0:
+            return None
+        self.stats["rejected_batches"] += 1
+        return wait
+
+    def on_upstream_rate_limited(self, retry_after: Optional[float]):
+        """Le fournisseur a répondu 429 : plus d'appels globaux avant Retry-After (1 s par défaut)"""
+        self.stats["upstream_pauses"] += 1
+        self._paused_until = max(self._paused_until, time.monotonic() + (retry_after or 1.0))
+
+    def get_stats(self) -> dict:
+        stats = dict(self.stats, policy=self.policy)
+        if isinstance(self.store, MemoryBucketStore):
+            stats["tracked_keys"] = len(self.store)
+        return stats
+
+    async def close(self):
+        if isinstance(self.store, RedisBucketStore):
+            await self.store.close()
+
+
+def create_rate_limiter(backend: str = RATE_LIMIT_BACKEND) -> RateLimiter:
+    """Construit le limiteur avec le stockage choisi par RATE_LIMIT_BACKEND ("memory" ou "redis")"""
+    if backend == "redis":
+        return RateLimiter(RedisBucketStore())
+    if backend == "memory":
+        return RateLimiter()
+    raise ValueError(f"RATE_LIMIT_BACKEND inconnu: {backend}")
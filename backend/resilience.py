@@ -0,0 +1,117 @@
+# Briques de résilience pour les appels amont : retries, disjoncteur, latences observées
+import random
+import time
+from collections import deque
+from email.utils import parsedate_to_datetime
+from typing import Deque, Optional
+
+# Statuts qui justifient une nouvelle tentative (surcharge ou panne temporaire)
+RETRYABLE_STATUS_CODES = frozenset({408, 425, 429, 500, 502, 503, 504})
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """En-tête Retry-After en secondes (nombre ou date HTTP)"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class RetryPolicy:
+    """
+    Backoff exponentiel avec jitter complet, plafonné, qui respecte Retry-After.
+    Un budget limite les retries à une fraction des requêtes (budget_ratio) pour
+    ne pas amplifier une panne du fournisseur.
+    """
+
+    def __init__(self, max_retries: int = 2, base_delay: float = 0.25, max_delay: float = 4.0,
+                 budget_ratio: float = 0.2, budget_max: float = 10.0):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget_ratio = budget_ratio
+        self.budget_max = budget_max
+        self._budget = budget_max
+
+    def on_request(self):
+        self._budget = min(self.budget_max, self._budget + self.budget_ratio)
+
+    def try_acquire_retry(self, attempt: int) -> bool:
+        if attempt >= self.max_retries or self._budget < 1:
+            return False
+        self._budget -= 1
+        return True
+
+    def delay(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+
+
+class CircuitBreaker:
+    """
+    Disjoncteur : après failure_threshold échecs consécutifs, les appels échouent
+    immédiatement pendant reset_timeout secondes, puis une requête d'essai est
+    autorisée (état semi-ouvert) pour tester le rétablissement.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_started: Optional[float] = None
+
+    def allow_request(self) -> bool:
+        if self.state == self.CLOSED:
+            return True
+        now = time.monotonic()
+        if self.state == self.OPEN and now - self._opened_at >= self.reset_timeout:
+            self.state = self.HALF_OPEN
+            self._trial_started = None
+        # Une seule requête d'essai à la fois ; un essai sans issue (annulé) expire
+        if self.state == self.HALF_OPEN and (
+            self._trial_started is None or now - self._trial_started >= self.reset_timeout
+        ):
+            self._trial_started = now
+            return True
+        return False
+
+    def record_success(self):
+        self.state = self.CLOSED
+        self._failures = 0
+        self._trial_started = None
+
+    def record_failure(self):
+        self._failures += 1
+        if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+            self.state = self.OPEN
+            self._opened_at = time.monotonic()
+            self._trial_started = None
+
+
+class LatencyTracker:
+    """Fenêtre glissante des latences réussies, pour calculer un quantile (ex : p95)"""
+
+    def __init__(self, window: int = 500, min_samples: int = 20):
+        self._samples: Deque[float] = deque(maxlen=window)
+        self.min_samples = min_samples
+
+    def record(self, latency: float):
+        self._samples.append(latency)
+
+    def quantile(self, q: float) -> Optional[float]:
+        if len(self._samples) < self.min_samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
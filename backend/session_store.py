@@ -0,0 +1,205 @@
+# Stockage des sessions utilisateur du bot Telegram (mémoire bornée ou SQLite)
+import os
+import sqlite3
+from abc import ABC, abstractmethod
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Optional
+
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "memory")
+SESSION_DB_PATH = os.getenv("SESSION_DB_PATH", "sessions.db")
+SESSION_IDLE_TTL = float(os.getenv("SESSION_IDLE_TTL", str(30 * 24 * 3600)))
+SESSION_MAX_SIZE = int(os.getenv("SESSION_MAX_SIZE", "1000000"))
+SESSION_BATCH_SIZE = int(os.getenv("SESSION_BATCH_SIZE", "100"))
+SESSION_FLUSH_INTERVAL = float(os.getenv("SESSION_FLUSH_INTERVAL", "1.0"))
+
+
+class UserSession:
+    """État d'un utilisateur ; __slots__ pour garder une empreinte mémoire minimale"""
+
+    __slots__ = ("chat_id", "step", "name", "age", "niveau", "start_time", "interactions", "last_seen",
+                 "stored_step")
+
+    def __init__(self, chat_id: int, step: str = "awaiting_name", name: Optional[str] = None,
+                 age: Optional[int] = None, niveau: Optional[str] = None,
+                 start_time: Optional[datetime] = None, interactions: int = 0,
+                 last_seen: Optional[float] = None):
+        self.chat_id = chat_id
+        self.step = step
+        self.name = name
+        self.age = age
+        self.niveau = niveau
+        self.start_time = start_time or datetime.now()
+        self.interactions = interactions
+        self.last_seen = last_seen or time.time()
+        # Étape telle qu'écrite dans le stockage durable (None : jamais écrite)
+        self.stored_step: Optional[str] = None
+
+
+class SessionStore(ABC):
+    """Interface commune des backends de sessions"""
+
+    @abstractmethod
+    def get(self, chat_id: int) -> Optional[UserSession]:
+        ...
+
+    @abstractmethod
+    def save(self, session: UserSession):
+        ...
+
+    @abstractmethod
+    def delete(self, chat_id: int):
+        ...
+
+    def create(self, chat_id: int) -> UserSession:
+        session = UserSession(chat_id)
+        self.save(session)
+        return session
+
+    def flush(self):
+        """Écrit les modifications en attente (no-op pour la mémoire)"""
+
+    def close(self):
+        self.flush()
+
+
+class MemorySessionStore(SessionStore):
+    """Sessions en mémoire, évincées après SESSION_IDLE_TTL d'inactivité (LRU borné)"""
+
+    def __init__(self, idle_ttl: float = SESSION_IDLE_TTL, max_size: int = SESSION_MAX_SIZE):
+        self.idle_ttl = idle_ttl
+        self.max_size = max_size
+        self._sessions: "OrderedDict[int, UserSession]" = OrderedDict()
+        self.evictions = 0
+
+    def _evict(self, now: float):
+        # Les sessions sont rangées par dernière activité : les plus anciennes en tête
+        while self._sessions:
+            oldest = next(iter(self._sessions.values()))
+            if len(self._sessions) <= self.max_size and now - oldest.last_seen < self.idle_ttl:
+                break
+            self._sessions.popitem(last=False)
+            self.evictions += 1
+
+    def get(self, chat_id: int) -> Optional[UserSession]:
+        now = time.time()
+        self._evict(now)
+        session = self._sessions.get(chat_id)
+        if session is not None:
+            session.last_seen = now
+            self._sessions.move_to_end(chat_id)
+        return session
+
+    def save(self, session: UserSession):
+        session.last_seen = time.time()
+        self._sessions[session.chat_id] = session
+        self._sessions.move_to_end(session.chat_id)
+        self._evict(session.last_seen)
+
+    def delete(self, chat_id: int):
+        self._sessions.pop(chat_id, None)
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+
+class SQLiteSessionStore(SessionStore):
+    """
+    Sessions durables dans SQLite (mode WAL), conservées d'un redémarrage ou d'un
+    déploiement à l'autre ; une seule instance du bot à la fois (voir
+    telegram_webhook.py). Les changements d'étape (prénom → âge → prêt), les
+    créations et les suppressions sont écrits tout de suite : le processus
+    suivant ne redemande pas le prénom ou l'âge. Le reste (compteur
+    d'interactions, dernière activité) est regroupé et envoyé par lots.
+    """
+
+    _COLUMNS = ("chat_id", "step", "name", "age", "niveau", "start_time", "interactions", "last_seen")
+
+    def __init__(self, path: str = SESSION_DB_PATH, idle_ttl: float = SESSION_IDLE_TTL,
+                 batch_size: int = SESSION_BATCH_SIZE, flush_interval: float = SESSION_FLUSH_INTERVAL):
+        self.idle_ttl = idle_ttl
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "chat_id INTEGER PRIMARY KEY, step TEXT NOT NULL, name TEXT, age INTEGER, niveau TEXT, "
+            "start_time REAL NOT NULL, interactions INTEGER NOT NULL, last_seen REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS sessions_last_seen ON sessions (last_seen)")
+        self._db.commit()
+        self._lock = threading.Lock()
+        # chat_id -> session à écrire, ou None pour une suppression
+        self._pending: Dict[int, Optional[UserSession]] = {}
+        self._last_flush = time.time()
+
+    def get(self, chat_id: int) -> Optional[UserSession]:
+        with self._lock:
+            if chat_id in self._pending:
+                return self._pending[chat_id]
+            row = self._db.execute(
+                f"SELECT {', '.join(self._COLUMNS)} FROM sessions WHERE chat_id = ?", (chat_id,)
+            ).fetchone()
+        if row is None or time.time() - row[7] >= self.idle_ttl:
+            return None
+        session = UserSession(row[0], row[1], row[2], row[3], row[4],
+                              datetime.fromtimestamp(row[5]), row[6], row[7])
+        session.stored_step = session.step
+        return session
+
+    def save(self, session: UserSession):
+        session.last_seen = time.time()
+        with self._lock:
+            self._pending[session.chat_id] = session
+        if session.step != session.stored_step:
+            self.flush()
+        else:
+            self._maybe_flush()
+
+    def delete(self, chat_id: int):
+        with self._lock:
+            self._pending[chat_id] = None
+        self.flush()
+
+    def _maybe_flush(self):
+        if len(self._pending) >= self.batch_size or time.time() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._last_flush = time.time()
+            if not pending:
+                return
+            upserts = [
+                (s.chat_id, s.step, s.name, s.age, s.niveau, s.start_time.timestamp(), s.interactions, s.last_seen)
+                for s in pending.values() if s is not None
+            ]
+            deletes = [(chat_id,) for chat_id, s in pending.items() if s is None]
+            for session in pending.values():
+                if session is not None:
+                    session.stored_step = session.step
+            with self._db:
+                self._db.executemany(
+                    f"INSERT OR REPLACE INTO sessions ({', '.join(self._COLUMNS)}) VALUES ({', '.join('?' * len(self._COLUMNS))})",
+                    upserts,
+                )
+                self._db.executemany("DELETE FROM sessions WHERE chat_id = ?", deletes)
+                self._db.execute("DELETE FROM sessions WHERE last_seen < ?", (time.time() - self.idle_ttl,))
+
+    def close(self):
+        self.flush()
+        self._db.close()
+
+
+def create_session_store(backend: str = SESSION_BACKEND) -> SessionStore:
+    """Construit le backend choisi par SESSION_BACKEND ("memory" ou "sqlite")"""
+    if backend == "sqlite":
+        return SQLiteSessionStore()
+    if backend == "memory":
+        return MemorySessionStore()
+    raise ValueError(f"SESSION_BACKEND inconnu: {backend}")
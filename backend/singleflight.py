@@ -0,0 +1,34 @@
+# Regroupement des appels identiques en cours ("single-flight")
+import asyncio
+from typing import Awaitable, Callable, Dict, Hashable, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """
+    Les appels concurrents avec la même clé attendent un seul appel amont et
+    reçoivent tous son résultat (ou son exception). Contrairement au cache, cela
+    couvre aussi la rafale de requêtes qui arrive avant que la réponse soit connue.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Task] = {}
+        self.stats = {"calls": 0, "collapsed": 0}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        task = self._calls.get(key)
+        if task is not None:
+            self.stats["collapsed"] += 1
+        else:
+            self.stats["calls"] += 1
+            # L'appel tourne dans sa propre tâche : si le premier demandeur est
+            # annulé (client déconnecté), les autres reçoivent quand même la réponse.
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda _: self._calls.pop(key, None))
+        return await asyncio.shield(task)
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._calls)
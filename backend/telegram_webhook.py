@@ -0,0 +1,110 @@
+# Réception des updates Telegram par webhook (application ASGI)
+#
+# Lancement : TELEGRAM_MODE=webhook python fact_check_final.py
+#         ou  uvicorn telegram_webhook:app --host 0.0.0.0 --port 8443
+#
+# Une seule instance à la fois : l'ordre des updates d'un même chat n'est garanti
+# qu'à l'intérieur d'un processus (PerChatUpdateProcessor), et le stockage des
+# sessions n'est pas partagé entre machines. Les updates sont traitées en
+# parallèle dans cette instance (TELEGRAM_MAX_CONCURRENT_UPDATES).
+#
+# Le webhook peut aussi être servi par l'API (SERVE_TELEGRAM_WEBHOOK=1 dans app.py) :
+# les deux interfaces partagent alors le moteur de factcheck_core.py.
+import logging
+import os
+from contextlib import asynccontextmanager
+
+from fastapi import APIRouter, FastAPI, HTTPException, Request, Response
+from fastapi.responses import JSONResponse
+from telegram import Update
+
+import fact_check_final as bot
+from metrics import CONTENT_TYPE, registry
+from warmup import warmup
+
+logger = logging.getLogger(__name__)
+
+# URL publique de base (ex : https://bot.example.org) ; si absente, le webhook
+# n'est pas enregistré au démarrage (il l'a déjà été, par exemple lors d'un déploiement précédent).
+TELEGRAM_WEBHOOK_URL = os.getenv("TELEGRAM_WEBHOOK_URL")
+TELEGRAM_WEBHOOK_SECRET = os.getenv("TELEGRAM_WEBHOOK_SECRET")
+TELEGRAM_WEBHOOK_PATH = os.getenv("TELEGRAM_WEBHOOK_PATH", "/telegram/webhook")
+TELEGRAM_WEBHOOK_MAX_CONNECTIONS = int(os.getenv("TELEGRAM_WEBHOOK_MAX_CONNECTIONS", "40"))
+
+application = bot.build_application()
+
+
+async def start():
+    await application.initialize()
+    # Même ordre que run_polling : post_init avant start (post_init / post_shutdown ne
+    # sont appelés automatiquement que par run_polling/run_webhook)
+    await bot.post_init(application)
+    if TELEGRAM_WEBHOOK_URL:
+        # Les updates en attente ne sont pas supprimées : rien n'est perdu pendant un déploiement
+        await application.bot.set_webhook(
+            url=TELEGRAM_WEBHOOK_URL.rstrip("/") + TELEGRAM_WEBHOOK_PATH,
+            secret_token=TELEGRAM_WEBHOOK_SECRET,
+            max_connections=TELEGRAM_WEBHOOK_MAX_CONNECTIONS,
+            allowed_updates=Update.ALL_TYPES,
+            drop_pending_updates=False,
+        )
+        logger.info(f"Webhook Telegram enregistré sur {TELEGRAM_WEBHOOK_URL}{TELEGRAM_WEBHOOK_PATH}")
+    await application.start()
+
+
+async def stop():
+    await application.stop()
+    await application.shutdown()
+    await bot.post_shutdown(application)
+
+
+# Route du webhook, incluse dans l'application ci-dessous ou dans celle de app.py
+router = APIRouter()
+
+
+@router.post(TELEGRAM_WEBHOOK_PATH)
+async def telegram_webhook(request: Request):
+    if TELEGRAM_WEBHOOK_SECRET and request.headers.get("X-Telegram-Bot-Api-Secret-Token") != TELEGRAM_WEBHOOK_SECRET:
+        raise HTTPException(status_code=403)
+    try:
+        update = Update.de_json(await request.json(), application.bot)
+    except (ValueError, TypeError, AttributeError) as e:
+        # 400 et non 500 : Telegram renverrait indéfiniment une update qu'on ne saura jamais lire
+        logger.warning(f"Invalid Telegram update rejected: {e}")
+        raise HTTPException(status_code=400, detail="Invalid update")
+    # La file est consommée par l'application : réponse immédiate à Telegram,
+    # traitement concurrent borné par TELEGRAM_MAX_CONCURRENT_UPDATES
+    await application.update_queue.put(update)
+    return Response(status_code=200)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    bot.setup_process()
+    await start()
+    yield
+    await stop()
+
+
+app = FastAPI(lifespan=lifespan)
+app.include_router(router)
+
+
+@app.get("/metrics")
+def metrics_endpoint():
+    return Response(registry.render(), media_type=CONTENT_TYPE)
+
+
+@app.get("/healthz")
+def healthz():
+    return {"status": "ok"}
+
+
+@app.get("/readyz")
+def readyz():
+    return JSONResponse(warmup.get_state(), status_code=200 if warmup.ready else 503)
+
+
+@app.get("/")
+def read_root():
+    return {"message": "FactCheck_Bot webhook is running!"}
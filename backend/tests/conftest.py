@@ -0,0 +1,5 @@
+# Les modules du backend sont à plat : on les importe depuis le dossier parent
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
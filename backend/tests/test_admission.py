@@ -0,0 +1,89 @@
+import asyncio
+import time
+
+import pytest
+
+from admission import AdmissionController, AdmissionRejected, parse_classes
+
+
+def controller(spec: str, capacity: int = 1) -> AdmissionController:
+    admission = AdmissionController(capacity=capacity, classes=parse_classes(spec))
+    # Appels supposés instantanés : seule l'attente en file compte pour les délais
+    admission.service_time = 0.001
+    return admission
+
+
+def test_waiters_are_served_by_weight():
+    admission = controller("high:4:100:60,low:1:100:60")
+    order = []
+
+    async def call(class_name: str):
+        async with admission.admit(class_name):
+            order.append(class_name)
+            await asyncio.sleep(0)
+
+    async def run():
+        async with admission.admit("low"):
+            # La place est prise : tout le monde attend, les "low" arrivés en premier
+            tasks = [asyncio.create_task(call(name)) for name in ["low"] * 4 + ["high"] * 8]
+            await asyncio.sleep(0)
+        await asyncio.gather(*tasks)
+
+    asyncio.run(run())
+    # Poids 4 contre 1 : quatre "high" passent pour un "low", sans affamer les "low"
+    assert order[:5].count("high") == 4
+    assert order.count("low") == 4
+    assert admission.active == 0
+
+
+def test_full_queue_is_rejected_at_once():
+    admission = controller("web:1:1:60")
+
+    async def run():
+        async with admission.admit("web"):
+            waiter = asyncio.create_task(admission.admit("web").__aenter__())
+            await asyncio.sleep(0)
+            with pytest.raises(AdmissionRejected) as rejected:
+                async with admission.admit("web"):
+                    pass
+            waiter.cancel()
+            return rejected.value.reason
+
+    assert asyncio.run(run()) == "queue_full"
+    assert admission.stats["rejected_queue_full"] == 1
+
+
+def test_expired_waiter_is_shed_without_a_release():
+    admission = controller("web:1:100:60")
+
+    async def run():
+        async with admission.admit("web"):
+            started = time.monotonic()
+            with pytest.raises(AdmissionRejected) as rejected:
+                async with admission.admit("web", deadline=time.monotonic() + 0.05):
+                    pass
+            # Délesté à l'échéance, alors que la place n'a jamais été rendue
+            waited = time.monotonic() - started
+            assert admission.queued() == 0
+        return rejected.value.reason, waited
+
+    reason, waited = asyncio.run(run())
+    assert reason == "deadline"
+    assert waited < 1
+    assert admission.stats["shed_deadline"] == 1
+    assert admission.active == 0
+
+
+def test_request_that_cannot_meet_its_deadline_is_rejected_up_front():
+    admission = controller("web:1:100:60")
+    admission.service_time = 10
+
+    async def run():
+        async with admission.admit("web"):
+            with pytest.raises(AdmissionRejected) as rejected:
+                async with admission.admit("web", deadline=time.monotonic() + 5):
+                    pass
+        return rejected.value.reason
+
+    assert asyncio.run(run()) == "deadline"
+    assert admission.stats["rejected_deadline"] == 1
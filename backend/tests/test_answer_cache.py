@@ -0,0 +1,67 @@
+import asyncio
+
+import pytest
+
+from answer_cache import AnswerCache, depersonalize, normalize_question, personalize
+
+
+@pytest.mark.parametrize("cached_for, answer, served_to, expected", [
+    ("Max", "Max, c'est faux ! Maximum une vie.", "Léa", None),
+    ("Al", "Alcool : c'est faux, Al.", "Zoé", None),
+    ("Max", "Faux, Max ! Les chats n'ont qu'une vie.", "Léa", "Faux, Léa ! Les chats n'ont qu'une vie."),
+    ("Al", "Les chats n'ont qu'une vie.", "Zoé", "Les chats n'ont qu'une vie."),
+])
+def test_cached_answer_for_another_user(cached_for, answer, served_to, expected):
+    cache = AnswerCache(db_path=None)
+    cache.set("Est-ce que les chats ont 9 vies ?", "adulte", "v1", answer, cached_for)
+    assert cache.get("Est-ce que les chats ont 9 vies ?", "adulte", "v1", served_to) == expected
+
+
+def test_name_inside_another_word_is_not_shared():
+    assert depersonalize("Maximum une vie.", "Max") is None
+    assert depersonalize("Maximum une vie, Max.", "Max") is None
+    assert depersonalize("Bravo Al, l'alcool est dangereux.", "Al") is None
+
+
+def test_round_trip_keeps_other_words():
+    shared = depersonalize("Bravo Léa ! Léa a raison.", "Léa")
+    assert "Léa" not in shared
+    assert personalize(shared, "Max") == "Bravo Max ! Max a raison."
+
+
+def test_unshareable_answers_are_counted():
+    cache = AnswerCache(db_path=None)
+    cache.set("Les chats ont 9 vies ?", "adulte", "v1", "Maximum une vie, Max.", "Max")
+    assert cache.get_stats()["unshareable"] == 1
+    assert cache.get_stats()["size"] == 0
+
+
+@pytest.mark.parametrize("plain, negated", [
+    ("C'est un mythe ?", "Ce n'est qu'un mythe ?"),
+    ("Les chats ont 9 vies ?", "Les chats n'ont pas 9 vies ?"),
+    ("La Lune est en fromage ?", "La Lune n'est jamais en fromage ?"),
+])
+def test_negated_question_has_its_own_key(plain, negated):
+    assert normalize_question(plain) != normalize_question(negated)
+    cache = AnswerCache(db_path=None)
+    cache.set(plain, "adulte", "v1", "Réponse à la forme simple")
+    assert cache.get(negated, "adulte", "v1") is None
+    assert cache.get(plain, "adulte", "v1") == "Réponse à la forme simple"
+
+
+def test_sqlite_tier_survives_a_restart(tmp_path):
+    path = str(tmp_path / "answers.db")
+    cache = AnswerCache(db_path=path)
+    cache.set("Est-ce que les chats ont 9 vies ?", "adulte", "v1", "Faux, Léa !", "Léa")
+    # Écriture différée : terminée au plus tard à la fermeture
+    cache.close()
+
+    restarted = AnswerCache(db_path=path)
+    answer = asyncio.run(restarted.aget("Est-ce que les chats ont 9 vies ?", "adulte", "v1", "Max"))
+    assert answer == "Faux, Max !"
+    assert restarted.get_stats()["disk_hits"] == 1
+    # Deuxième lecture : servie par la mémoire
+    assert restarted.get("Est-ce que les chats ont 9 vies ?", "adulte", "v1", "Zoé") == "Faux, Zoé !"
+    assert restarted.get_stats()["disk_hits"] == 1
+    assert asyncio.run(restarted.aget("Autre question ?", "adulte", "v1")) is None
+    restarted.close()
@@ -0,0 +1,40 @@
+import os
+import subprocess
+import sys
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_in(tmp_path, script: str) -> subprocess.CompletedProcess:
+    """Exécute `script` dans un processus neuf, dossier courant et journaux dans tmp_path"""
+    (tmp_path / ".env").write_text("API_TOKEN_TOGETHER=from-dotenv\n", encoding="utf-8")
+    env = dict(os.environ, PYTHONPATH=BACKEND, LOG_DIR=str(tmp_path / "logs"), TRAFFIC_CAPTURE="1",
+               TRAFFIC_CAPTURE_DIR=str(tmp_path / "capture"), WARMUP="0")
+    env.pop("API_TOKEN_TOGETHER", None)
+    return subprocess.run([sys.executable, "-c", script], cwd=tmp_path, env=env, capture_output=True, text=True)
+
+
+def test_importing_the_app_does_no_io(tmp_path):
+    result = run_in(tmp_path, (
+        "import os, app, factcheck_core, logging_pipeline\n"
+        "assert factcheck_core.llm_client is None and factcheck_core.answer_cache is None\n"
+        "assert not logging_pipeline._listeners\n"
+        "assert 'API_TOKEN_TOGETHER' not in os.environ\n"
+    ))
+    assert result.returncode == 0, result.stderr
+    # Ni journaux, ni capture : seul le .env du test est présent
+    assert sorted(os.listdir(tmp_path)) == [".env"]
+
+
+def test_startup_opens_logs_and_shared_resources(tmp_path):
+    result = run_in(tmp_path, (
+        "from fastapi.testclient import TestClient\n"
+        "import app, factcheck_core\n"
+        "with TestClient(app.app) as client:\n"
+        "    assert client.get('/healthz').status_code == 200\n"
+        "    headers = factcheck_core.llm_client.router.backends['default'].headers\n"
+        "    assert headers['Authorization'] == 'Bearer from-dotenv'\n"
+    ))
+    assert result.returncode == 0, result.stderr
+    assert "factcheck_api.log" in os.listdir(tmp_path / "logs")
+    assert "capture_api.jsonl" in os.listdir(tmp_path / "capture")
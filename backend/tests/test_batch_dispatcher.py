@@ -0,0 +1,64 @@
+import asyncio
+
+import httpx
+
+from batch_dispatcher import MicroBatchDispatcher
+
+
+class StubServer:
+    """Faux serveur : enregistre les rafales reçues et renvoie à chaque requête son propre identifiant"""
+
+    def __init__(self, delay: float = 0.01):
+        self.delay = delay
+        self.received = []
+
+    async def send(self, payload: dict) -> httpx.Response:
+        self.received.append(payload["id"])
+        await asyncio.sleep(self.delay)
+        if payload["id"] == "boom":
+            raise httpx.ConnectError("refused")
+        return httpx.Response(200, json={"id": payload["id"]})
+
+
+def test_requests_in_window_form_one_batch_and_get_their_own_answer():
+    server = StubServer()
+    dispatcher = MicroBatchDispatcher(server.send, max_wait_ms=20, max_batch_size=32)
+
+    async def run():
+        return await asyncio.gather(*(dispatcher.submit({"id": i}) for i in range(5)))
+
+    responses = asyncio.run(run())
+    assert [response.json()["id"] for response in responses] == [0, 1, 2, 3, 4]
+    assert dispatcher.stats["batches"] == 1
+    assert dispatcher.get_stats()["avg_batch_size"] == 5
+    assert not dispatcher._tasks
+
+
+def test_full_batch_is_sent_without_waiting_and_errors_go_to_their_caller():
+    server = StubServer()
+    dispatcher = MicroBatchDispatcher(server.send, max_wait_ms=10_000, max_batch_size=2)
+
+    async def run():
+        return await asyncio.wait_for(
+            asyncio.gather(dispatcher.submit({"id": "ok"}), dispatcher.submit({"id": "boom"}),
+                           return_exceptions=True), timeout=1)
+
+    ok, boom = asyncio.run(run())
+    assert ok.json()["id"] == "ok"
+    assert isinstance(boom, httpx.ConnectError)
+
+
+def test_cancelled_callers_are_not_sent_upstream():
+    server = StubServer()
+    dispatcher = MicroBatchDispatcher(server.send, max_wait_ms=20, max_batch_size=32)
+
+    async def run():
+        gone = asyncio.ensure_future(dispatcher.submit({"id": "gone"}))
+        kept = asyncio.ensure_future(dispatcher.submit({"id": "kept"}))
+        await asyncio.sleep(0)
+        gone.cancel()
+        return await kept
+
+    assert asyncio.run(run()).json()["id"] == "kept"
+    assert server.received == ["kept"]
+    assert dispatcher.stats["abandoned"] == 1
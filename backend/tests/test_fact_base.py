@@ -0,0 +1,39 @@
+import json
+import logging
+import os
+
+from fact_base import FactBase
+from metrics import FACT_BASE_RELOAD_ERRORS
+
+ENTRY = {
+    "id": "chats-9-vies",
+    "claim": "Les chats ont 9 vies",
+    "verdict": "faux",
+    "explanations": {"enfant": "Non, un chat n'a qu'une vie.", "ado": "Faux.", "adulte": "Faux."},
+}
+
+
+def write(path, content, mtime):
+    path.write_text(content, encoding="utf-8")
+    os.utime(path, (mtime, mtime))
+
+
+def test_malformed_edit_is_logged_and_counted(tmp_path, caplog):
+    path = tmp_path / "fact_base.json"
+    write(path, json.dumps({"entries": [ENTRY]}), 1_000_000)
+    base = FactBase(str(path), reload_interval=0)
+    base.ensure_loaded()
+    assert "chats-9-vies" in base.entries
+
+    errors = FACT_BASE_RELOAD_ERRORS.get()
+    write(path, '{"entries": [', 1_000_100)
+    with caplog.at_level(logging.ERROR, logger="fact_base"):
+        assert base.search("Les chats ont 9 vies")
+    assert "chats-9-vies" in base.entries
+    assert base.stats["reload_errors"] == 1
+    assert FACT_BASE_RELOAD_ERRORS.get() == errors + 1
+    assert any(record.exc_info for record in caplog.records)
+
+    # Même fichier invalide : pas de nouvelle tentative avant la prochaine modification
+    base.search("Les chats ont 9 vies")
+    assert base.stats["reload_errors"] == 1
@@ -0,0 +1,53 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+from fact_check_final import PerChatUpdateProcessor
+
+
+def update(chat_id):
+    return SimpleNamespace(effective_chat=SimpleNamespace(id=chat_id))
+
+
+def test_busy_chat_does_not_hold_every_slot():
+    processor = PerChatUpdateProcessor(2)
+    done = []
+
+    async def handle(name, delay):
+        await asyncio.sleep(delay)
+        done.append((name, time.monotonic()))
+
+    async def run():
+        started = time.monotonic()
+        busy = [asyncio.create_task(processor.process_update(update(1), handle(f"busy-{i}", 0.1)))
+                for i in range(4)]
+        await asyncio.sleep(0)
+        other = asyncio.create_task(processor.process_update(update(2), handle("other", 0.1)))
+        await asyncio.gather(*busy, other)
+        return started
+
+    started = asyncio.run(run())
+    finished = dict(done)
+    # Le chat 2 n'attend pas les quatre updates du chat 1
+    assert finished["other"] - started < 0.2
+    # Les updates d'un même chat restent dans l'ordre, l'une après l'autre
+    assert [name for name, _ in done if name.startswith("busy")] == [f"busy-{i}" for i in range(4)]
+    assert finished["busy-3"] - started >= 0.4
+    assert not processor._chat_locks
+
+
+def test_concurrency_limit_still_applies():
+    processor = PerChatUpdateProcessor(2)
+    running, peak = [0], [0]
+
+    async def handle():
+        running[0] += 1
+        peak[0] = max(peak[0], running[0])
+        await asyncio.sleep(0.02)
+        running[0] -= 1
+
+    async def run():
+        await asyncio.gather(*(processor.process_update(update(chat_id), handle()) for chat_id in range(6)))
+
+    asyncio.run(run())
+    assert peak[0] == 2
@@ -0,0 +1,108 @@
+import asyncio
+
+import httpx
+import pytest
+
+import factcheck_core
+from answer_cache import AnswerCache
+from factcheck_core import PROFILES, FactCheckBot, is_fact_check_question
+from intent_classifier import Intent
+
+
+@pytest.fixture
+def llm(monkeypatch):
+    """Faux fournisseur : répond `answer` (le prénom du prompt remplacé par {name}) après `delay` secondes"""
+    calls = []
+    state = {"answer": "Faux, {name} !", "delay": 0.05}
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request)
+        await asyncio.sleep(state["delay"])
+        name = "Max" if "Max" in request.content.decode("utf-8") else "Léa"
+        content = state["answer"].format(name=name)
+        return httpx.Response(200, json={"choices": [{"message": {"content": content}}]})
+
+    factcheck_core.setup()
+    monkeypatch.setattr(factcheck_core, "answer_cache", AnswerCache(db_path=None))
+    monkeypatch.setattr(factcheck_core.llm_client, "_client",
+                        httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+    state["calls"] = calls
+    return state
+
+
+def ask_together(*names):
+    bot = FactCheckBot(PROFILES["web"])
+
+    async def run():
+        return await asyncio.gather(*(bot.achat_with_ai("Est-ce que les chats ont 9 vies ?", name, "adulte", 30)
+                                      for name in names))
+    return asyncio.run(run())
+
+
+def test_coalesced_callers_share_one_call(llm):
+    assert ask_together("Max", "Léa") == ["Faux, Max !", "Faux, Léa !"]
+    assert len(llm["calls"]) == 1
+
+
+def test_leader_gets_the_raw_answer(llm):
+    llm["answer"] = "Faux, {name} ! Maximum une vie."
+    max_answer, lea_answer = ask_together("Max", "Léa")
+    assert max_answer == "Faux, Max ! Maximum une vie."
+    # "Maximum" ne doit pas devenir "Léaimum" chez l'autre demandeur
+    assert lea_answer == "Faux, Léa ! Maximum une vie."
+    assert len(llm["calls"]) == 2
+
+
+def test_conversation_keys_are_per_profile(llm, monkeypatch):
+    monkeypatch.setattr(factcheck_core, "conversations", factcheck_core.ConversationStore())
+    web, telegram = FactCheckBot(PROFILES["web"]), FactCheckBot(PROFILES["telegram"])
+    asyncio.run(telegram.achat_with_ai("Est-ce que les chats ont 9 vies ?", "Léa", "adulte", 30,
+                                       session_id="42"))
+    assert factcheck_core.conversations.get_messages(telegram.conversation_key("42"))
+    # Même identifiant côté web : historique vide, et rien n'est écrit dans celui de Telegram
+    assert factcheck_core.conversations.get_messages(web.conversation_key("42")) == []
+    asyncio.run(web.achat_with_ai("La Terre est-elle plate ?", "Max", "adulte", 30, session_id="42"))
+    assert len(factcheck_core.conversations.get_messages(telegram.conversation_key("42"))) == 2
+
+
+def test_off_topic_intent_does_not_refuse_by_itself():
+    off_topic = Intent("off_topic", 0.9, {})
+    # Les règles acceptent (question) : le classifieur ne suffit pas à refuser
+    assert is_fact_check_question("Est-ce que la Lune est en fromage ?", {}, off_topic)
+    # Les règles refusent aussi : refus
+    assert not is_fact_check_question("Salut, ça va", {}, off_topic)
+    assert not is_fact_check_question("Est-ce vrai ?", {}, Intent("bypass", 0.9, {}))
+
+
+def test_standalone_questions_in_a_session_still_use_the_cache(llm, monkeypatch):
+    monkeypatch.setattr(factcheck_core, "conversations", factcheck_core.ConversationStore())
+    bot = FactCheckBot(PROFILES["web"])
+    question = "Est-ce que les chats ont 9 vies ?"
+
+    async def run():
+        await bot.achat_with_ai(question, "Léa", "adulte", 30, session_id="a", follow_up=False)
+        await bot.achat_with_ai(question, "Max", "adulte", 30, session_id="b", follow_up=False)
+        # Deuxième question de la session "a", sans lien avec la première : cache aussi
+        await bot.achat_with_ai(question, "Léa", "adulte", 30, session_id="a", follow_up=False)
+        return await bot.achat_with_ai("Et pourquoi ?", "Léa", "adulte", 30, session_id="a", follow_up=True)
+
+    answer = asyncio.run(run())
+    assert answer == "Faux, Léa !"
+    assert len(llm["calls"]) == 2
+    # La question de suivi part avec l'historique de la session
+    assert question in llm["calls"][1].content.decode("utf-8")
+    assert len(factcheck_core.conversations.get_messages(bot.conversation_key("a"))) == 6
+
+
+def test_cached_answer_needs_no_llm_call(llm):
+    bot = FactCheckBot(PROFILES["web"])
+
+    async def run():
+        before = await bot.cached_answer("Est-ce que les chats ont 9 vies ?", "Léa", "adulte")
+        await bot.achat_with_ai("Est-ce que les chats ont 9 vies ?", "Max", "adulte", 30)
+        return before, await bot.cached_answer("Est-ce que les chats ont 9 vies ?", "Léa", "adulte")
+
+    before, after = asyncio.run(run())
+    assert before is None
+    assert after == "Faux, Léa !"
+    assert len(llm["calls"]) == 1
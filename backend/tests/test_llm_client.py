@@ -0,0 +1,163 @@
+import asyncio
+import time
+from email.utils import formatdate
+
+import httpx
+import pytest
+
+from llm_client import AsyncLLMClient
+from model_router import Backend, ModelRouter
+from resilience import CircuitBreaker, RetryPolicy, parse_retry_after
+
+PAYLOAD = {"messages": [{"role": "user", "content": "?"}]}
+
+
+def ok(content: str = "ok") -> httpx.Response:
+    return httpx.Response(200, json={"choices": [{"message": {"content": content}}]})
+
+
+def make_client(handler, retry_policy: RetryPolicy = None, hedge: bool = False, **kwargs) -> AsyncLLMClient:
+    """Client sans jitter (délais de backoff nuls) vers un seul fournisseur simulé"""
+    router = ModelRouter([Backend("mock", "http://mock.test/v1/chat/completions")], explore=0.0)
+    client = AsyncLLMClient("http://unused.test", {}, timeout=5, router=router, batch_window_ms=0, hedge=hedge,
+                            retry_policy=retry_policy or RetryPolicy(max_retries=2, base_delay=0.0, max_delay=0.0,
+                                                                     budget_ratio=1.0, budget_max=100),
+                            **kwargs)
+    client._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return client
+
+
+def test_parse_retry_after_accepts_seconds_and_http_dates():
+    assert parse_retry_after("2.5") == 2.5
+    assert parse_retry_after("-3") == 0.0
+    assert parse_retry_after(formatdate(time.time() + 60, usegmt=True)) == pytest.approx(60, abs=2)
+    assert parse_retry_after("bientôt") is None
+    assert parse_retry_after(None) is None
+
+
+def test_retry_waits_for_retry_after():
+    calls = []
+    notified = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(time.monotonic())
+        if len(calls) == 1:
+            return httpx.Response(429, headers={"Retry-After": "0.2"})
+        return ok()
+
+    client = make_client(handler, on_rate_limited=notified.append)
+    response = asyncio.run(client.post_completion(PAYLOAD))
+    assert response.status_code == 200
+    # Le backoff (nul ici) est allongé jusqu'au Retry-After du fournisseur, qui est aussi signalé au limiteur
+    assert calls[1] - calls[0] >= 0.2
+    assert notified == [0.2]
+    assert client.stats["retries"] == 1
+
+
+def test_retry_after_beyond_the_budget_returns_the_error_at_once():
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request)
+        return httpx.Response(503, headers={"Retry-After": "30"})
+
+    client = make_client(handler)
+    started = time.monotonic()
+    response = asyncio.run(client.post_completion(PAYLOAD, timeout=1))
+    assert response.status_code == 503
+    assert len(calls) == 1
+    assert time.monotonic() - started < 0.5
+
+
+def test_transport_errors_are_retried_then_raised():
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request)
+        raise httpx.ConnectError("connection refused", request=request)
+
+    client = make_client(handler)
+    with pytest.raises(httpx.ConnectError):
+        asyncio.run(client.post_completion(PAYLOAD))
+    # Une tentative et max_retries retries
+    assert len(calls) == 3
+
+
+def test_retry_budget_caps_retries_across_requests():
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request)
+        return httpx.Response(503)
+
+    # Budget initial d'un seul retry, sans recharge : la seconde requête n'est pas retentée
+    client = make_client(handler, RetryPolicy(max_retries=2, base_delay=0.0, max_delay=0.0,
+                                              budget_ratio=0.0, budget_max=1))
+    asyncio.run(client.post_completion(PAYLOAD))
+    asyncio.run(client.post_completion(PAYLOAD))
+    assert len(calls) == 3
+    assert client.stats["retries"] == 1
+
+
+def test_hedge_wins_and_cancels_the_slow_request():
+    state = {"calls": 0, "cancelled": 0}
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        state["calls"] += 1
+        if state["calls"] > 1:
+            return ok("hedge")
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            state["cancelled"] += 1
+            raise
+        return ok("slow")
+
+    client = make_client(handler, hedge=True)
+    # p95 observé de 50 ms : la requête de secours part au bout de 50 ms
+    for _ in range(client.latencies.min_samples):
+        client.latencies.record(0.05)
+
+    async def run():
+        response = await client.post_completion(PAYLOAD)
+        # Annulée par le client, et non par la fermeture de la boucle à la fin du test
+        await asyncio.sleep(0.01)
+        return response, dict(state)
+
+    started = time.monotonic()
+    response, state_after = asyncio.run(run())
+    assert response.json()["choices"][0]["message"]["content"] == "hedge"
+    assert time.monotonic() - started < 1
+    assert state_after == {"calls": 2, "cancelled": 1}
+    assert client.stats["hedges"] == 1
+    assert client.stats["hedge_wins"] == 1
+
+
+def test_no_hedge_before_enough_latency_samples():
+    calls = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request)
+        await asyncio.sleep(0.1)
+        return ok()
+
+    client = make_client(handler, hedge=True)
+    assert asyncio.run(client.post_completion(PAYLOAD)).status_code == 200
+    assert len(calls) == 1
+    assert client.stats["hedges"] == 0
+
+
+def test_breaker_trial_that_never_reports_expires():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.record_failure()
+    assert not breaker.allow_request()
+    time.sleep(0.06)
+    # Requête d'essai partie puis annulée : sans issue, elle ne bloque le fournisseur qu'un reset_timeout
+    assert breaker.allow_request()
+    assert not breaker.allow_request()
+    time.sleep(0.06)
+    assert breaker.allow_request()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
@@ -0,0 +1,25 @@
+import pytest
+
+from metrics import Counter, Metric, Registry
+
+
+def test_metric_without_samples_fails_at_instantiation():
+    class Incomplete(Metric):
+        kind = "gauge"
+
+    with pytest.raises(TypeError):
+        Incomplete("incomplete", "No samples")
+
+
+def test_counter_renders_labelled_samples():
+    registry = Registry()
+    refusals = registry.register(Counter("refusals_total", "Refusals, by reason", ("reason",)))
+    refusals.inc("bypass")
+    refusals.inc("bypass")
+    refusals.inc('a "quoted" reason')
+    assert registry.render() == (
+        "# HELP refusals_total Refusals, by reason\n"
+        "# TYPE refusals_total counter\n"
+        'refusals_total{reason="bypass"} 2\n'
+        'refusals_total{reason="a \\"quoted\\" reason"} 1\n'
+    )
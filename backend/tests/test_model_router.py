@@ -0,0 +1,135 @@
+import asyncio
+import time
+from collections import Counter
+
+import httpx
+import pytest
+
+from llm_client import AsyncLLMClient, CircuitOpenError
+from model_router import Backend, ModelRouter
+from resilience import CircuitBreaker, RetryPolicy
+
+
+def make_router(primary_latency: float = 0.4, secondary_latency: float = 0.5, **kwargs) -> ModelRouter:
+    # "primary" part favori (latence initiale plus faible), sans exploration aléatoire
+    primary = Backend("primary", "http://primary.test/v1/chat/completions", initial_latency=primary_latency)
+    secondary = Backend("secondary", "http://secondary.test/v1/chat/completions", initial_latency=secondary_latency)
+    for backend in (primary, secondary):
+        backend.breaker = CircuitBreaker(failure_threshold=3, reset_timeout=0.2)
+    return ModelRouter([primary, secondary], explore=0.0, **kwargs)
+
+
+class FakeBackends:
+    """Deux fournisseurs derrière un MockTransport ; `failing` répondent 503"""
+
+    def __init__(self):
+        self.failing = {"primary.test"}
+        self.hits = Counter()
+
+    def handler(self, request: httpx.Request) -> httpx.Response:
+        host = request.url.host
+        self.hits[host] += 1
+        if host in self.failing:
+            return httpx.Response(503, text="overloaded")
+        return httpx.Response(200, json={"choices": [{"message": {"content": host}}]})
+
+
+@pytest.fixture
+def fake():
+    return FakeBackends()
+
+
+def make_client(router: ModelRouter, fake: FakeBackends) -> AsyncLLMClient:
+    client = AsyncLLMClient("http://unused.test", {}, timeout=5, router=router, batch_window_ms=0, hedge=False,
+                            retry_policy=RetryPolicy(max_retries=2, base_delay=0.0, max_delay=0.0,
+                                                     budget_ratio=1.0, budget_max=100))
+    client._client = httpx.AsyncClient(transport=httpx.MockTransport(fake.handler))
+    return client
+
+
+def complete(client: AsyncLLMClient) -> httpx.Response:
+    return asyncio.run(client.post_completion({"messages": [{"role": "user", "content": "?"}]}))
+
+
+def test_ewma_score_prefers_fast_and_reliable_backends():
+    router = make_router()
+    primary, secondary = router.backends["primary"], router.backends["secondary"]
+    assert router.choose() is primary
+    for _ in range(10):
+        router.record(primary, 2.0, ok=True)
+    assert router.choose() is secondary
+    for _ in range(10):
+        router.record(primary, 0.1, ok=True)
+        router.record(secondary, 0.1, ok=False)
+    assert primary.score() < secondary.score()
+    assert router.choose() is primary
+
+
+def test_niveau_preference_outweighs_small_latency_gap():
+    router = make_router(niveau_preferences={"enfant": ["secondary"]})
+    assert router.choose("enfant") is router.backends["secondary"]
+    assert router.choose("adulte") is router.backends["primary"]
+
+
+def test_failing_backend_loses_traffic_to_the_other(fake):
+    router = make_router()
+    client = make_client(router, fake)
+
+    # Le 503 du favori est rattrapé par un retry vers l'autre fournisseur, qui devient le favori
+    response = complete(client)
+    assert response.status_code == 200
+    assert response.json()["choices"][0]["message"]["content"] == "secondary.test"
+    assert fake.hits == {"primary.test": 1, "secondary.test": 1}
+    fake.hits.clear()
+    for _ in range(5):
+        assert complete(client).status_code == 200
+    assert fake.hits == {"secondary.test": 5}
+
+
+def test_breaker_opens_then_goes_half_open_and_closes_on_recovery(fake):
+    # Écart de latence trop grand pour que le score seul bascule : c'est le disjoncteur qui coupe
+    router = make_router(primary_latency=0.01, secondary_latency=10)
+    client = make_client(router, fake)
+    primary = router.backends["primary"]
+
+    assert complete(client).status_code == 503
+    assert fake.hits == {"primary.test": 3}
+    assert primary.breaker.state == CircuitBreaker.OPEN
+
+    # Disjoncteur ouvert : tout le trafic va vers "secondary", sans tentative vers "primary"
+    fake.hits.clear()
+    for _ in range(5):
+        assert complete(client).status_code == 200
+    assert fake.hits == {"secondary.test": 5}
+
+    # Après reset_timeout, une seule requête d'essai part vers "primary" (semi-ouvert) ;
+    # réussie, elle referme le disjoncteur
+    time.sleep(0.25)
+    fake.failing.clear()
+    fake.hits.clear()
+    assert complete(client).status_code == 200
+    assert fake.hits == {"primary.test": 1}
+    assert primary.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_failed_trial_reopens_the_breaker(fake):
+    router = make_router(primary_latency=0.01, secondary_latency=10)
+    client = make_client(router, fake)
+    primary = router.backends["primary"]
+    complete(client)
+    time.sleep(0.25)
+    assert primary.breaker.allow_request()
+    assert primary.breaker.state == CircuitBreaker.HALF_OPEN
+    # Une seule requête d'essai à la fois
+    assert not primary.breaker.allow_request()
+    primary.breaker.record_failure()
+    assert primary.breaker.state == CircuitBreaker.OPEN
+
+
+def test_all_breakers_open_raises(fake):
+    router = make_router()
+    client = make_client(router, fake)
+    fake.failing = {"primary.test", "secondary.test"}
+    with pytest.raises(CircuitOpenError):
+        for _ in range(10):
+            complete(client)
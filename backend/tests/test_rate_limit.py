@@ -0,0 +1,33 @@
+import asyncio
+import math
+
+import pytest
+
+from rate_limit import RateLimiter
+
+
+def test_batch_is_reserved_whole_per_client():
+    limiter = RateLimiter(user_per_minute=0, global_tpm=0, batch_claims_per_hour=100)
+
+    async def run():
+        return [await limiter.acquire_batch("client-a", 60), await limiter.acquire_batch("client-a", 60),
+                await limiter.acquire_batch("client-b", 60), await limiter.acquire_batch("client-a", 40)]
+
+    first, second, other_client, rest = asyncio.run(run())
+    assert first is None
+    # 40 affirmations restantes : le second lot de 60 est refusé en entier, avec l'attente avant qu'il passe
+    assert second == pytest.approx(20 * 36, rel=0.01)
+    assert other_client is None
+    assert rest is None
+    assert limiter.stats["rejected_batches"] == 1
+
+
+def test_batch_larger_than_budget_never_fits():
+    limiter = RateLimiter(batch_claims_per_hour=100)
+    assert math.isinf(asyncio.run(limiter.acquire_batch("client", 101)))
+
+
+def test_unlimited_or_empty_batches_are_free():
+    assert asyncio.run(RateLimiter(batch_claims_per_hour=0).acquire_batch("client", 10_000)) is None
+    assert asyncio.run(RateLimiter(batch_claims_per_hour=10).acquire_batch("client", 0)) is None
+
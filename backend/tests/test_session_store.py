@@ -0,0 +1,37 @@
+import pytest
+
+from session_store import SessionStore, SQLiteSessionStore
+
+
+def test_onboarding_steps_are_visible_to_another_process(tmp_path):
+    path = str(tmp_path / "sessions.db")
+    writer = SQLiteSessionStore(path, batch_size=100, flush_interval=3600)
+    reader = SQLiteSessionStore(path, batch_size=100, flush_interval=3600)
+
+    session = writer.create(42)
+    assert reader.get(42).step == "awaiting_name"
+    session.name, session.step = "Léa", "awaiting_age"
+    writer.save(session)
+    assert reader.get(42).name == "Léa"
+    session.age, session.niveau, session.step = 9, "enfant", "ready"
+    writer.save(session)
+    assert reader.get(42).step == "ready"
+
+    # Compteurs : regroupés, visibles au prochain flush
+    session.interactions += 1
+    writer.save(session)
+    assert reader.get(42).interactions == 0
+    writer.flush()
+    assert reader.get(42).interactions == 1
+
+    writer.delete(42)
+    assert reader.get(42) is None
+
+
+def test_backend_missing_a_method_fails_at_instantiation():
+    class Incomplete(SessionStore):
+        def get(self, chat_id):
+            return None
+
+    with pytest.raises(TypeError):
+        Incomplete()
@@ -0,0 +1,47 @@
+import asyncio
+import importlib
+
+import pytest
+from telegram import User
+
+import fact_check_final
+
+
+@pytest.fixture
+def webhook(monkeypatch):
+    """telegram_webhook avec un bot qui ne contacte pas Telegram"""
+    monkeypatch.setattr(fact_check_final, "TELEGRAM_BOT_TOKEN", "123:TEST")
+    monkeypatch.setattr(fact_check_final, "WARMUP_ENABLED", False)
+    monkeypatch.setattr(fact_check_final, "SESSION_FLUSH_INTERVAL", 0.01)
+    module = importlib.import_module("telegram_webhook")
+    monkeypatch.setattr(module, "TELEGRAM_WEBHOOK_URL", None)
+
+    async def get_me(self, *args, **kwargs):
+        self._bot_user = User(123, "Test", True, username="test_bot")
+        return self._bot_user
+
+    monkeypatch.setattr(type(module.application.bot), "get_me", get_me)
+    events = []
+
+    async def aclose():
+        events.append("aclose")
+
+    monkeypatch.setattr(fact_check_final.factcheck_core, "aclose", aclose)
+    monkeypatch.setattr(fact_check_final.session_store, "flush", lambda: events.append("flush"))
+    return module, events
+
+
+def test_webhook_app_starts_and_stops(webhook):
+    module, events = webhook
+
+    async def run():
+        await module.start()
+        assert module.application.running
+        await asyncio.sleep(0.05)
+        # Sans annulation de la tâche de flush, stop() attendait cette boucle sans fin
+        await asyncio.wait_for(module.stop(), timeout=5)
+
+    asyncio.run(run())
+    assert not module.application.running
+    assert "flush" in events and events[-2:] == ["aclose", "flush"]
+    assert fact_check_final._flush_task.cancelled()
@@ -0,0 +1,62 @@
+import pytest
+
+from factcheck_core import PROFILES, FactCheckBot
+from text_matcher import TermMatcher, content_matcher
+
+# Messages refusés à un enfant par le filtre d'origine (recherche de sous-chaînes)
+BLOCKED_FOR_ENFANT = [
+    ("Les violeurs vont-ils en prison ?", "HIGH"),
+    ("Elle a été violée, c'est vrai ?", "HIGH"),
+    ("Le suicide est-il contagieux ?", "HIGH"),
+    ("Les meurtres ont augmenté ?", "HIGH"),
+    ("Mon oncle est alcoolique, c'est une maladie ?", "MEDIUM"),
+    ("Les accidentés de la route guérissent-ils ?", "MEDIUM"),
+    ("Est-ce que les drogues douces existent ?", "MEDIUM"),
+    ("La violence à la télé rend violent ?", "HIGH"),
+    ("Est-ce que la guerre est finie ?", "SUPERVISION"),
+    ("La politique, c'est compliqué ?", "SUPERVISION"),
+]
+
+
+@pytest.mark.parametrize("message, level", BLOCKED_FOR_ENFANT)
+def test_messages_blocked_by_the_original_filter_stay_blocked(message, level):
+    bot = FactCheckBot(PROFILES["web"])
+    is_safe, warning_level, warning = bot.analyze_content_safety(message, "enfant")
+    assert (is_safe, warning_level) == (False, level)
+    assert warning
+
+
+@pytest.mark.parametrize("message", [
+    "Est-ce que les chats ont 9 vies ?",
+    "La Tour Eiffel grandit-elle en été ?",
+    "Le soleil tourne autour de la Terre ?",
+])
+def test_harmless_messages_are_safe(message):
+    bot = FactCheckBot(PROFILES["web"])
+    assert bot.analyze_content_safety(message, "enfant") == (True, "SAFE", None)
+
+
+def test_prefix_matching_only_in_safety_categories():
+    matcher = TermMatcher({"high_risk": ["viol"], "bypass": ["joue"], "fact_check_intent": ["vrai ou faux"]})
+    assert matcher.classify("Ils ont été violés") == {"high_risk": ["viol"]}
+    # Hors catégories de sécurité : mots entiers (pluriel simple compris)
+    assert matcher.classify("Il est joueur") == {}
+    assert matcher.classify("Je joues") == {"bypass": ["joue"]}
+    assert matcher.classify("Vrai ou fausses ?") == {}
+    assert matcher.classify("VRAI ou FAUX ?") == {"fact_check_intent": ["vrai ou faux"]}
+
+
+def test_multi_word_safety_term_matches_prefix_of_last_word():
+    matcher = TermMatcher({"medium_risk": ["jeu d'argent"]})
+    assert matcher.classify("Les jeux d'argenterie") == {}
+    assert matcher.classify("Le jeu d'argent") == {"medium_risk": ["jeu d'argent"]}
+    assert matcher.classify("les jeu d'argents") == {"medium_risk": ["jeu d'argent"]}
+
+
+def test_accents_and_case_are_ignored():
+    assert "high_risk" in content_matcher.classify("SUICIDÉ")
+    assert content_matcher.classify("EST-CE QUE c'est vrai ?") == {"fact_check_intent": ["est-ce que", "c'est vrai"]}
+
+
+def test_patterns_are_matched():
+    assert "fact_check_intent" in content_matcher.classify("Les licornes existent")
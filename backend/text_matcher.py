@@ -0,0 +1,114 @@
+# Moteur de correspondance précompilé pour les filtres de sécurité et de fact-check
+import json
+import os
+import re
+import unicodedata
+from typing import Dict, Iterable, List, Optional, Tuple
+
+MODERATION_TERMS_PATH = os.getenv(
+    "MODERATION_TERMS_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "moderation_terms.json"),
+)
+
+CATEGORIES = ("high_risk", "medium_risk", "topics_needing_adult", "bypass", "fact_check_intent")
+# Catégories de sécurité : le dernier mot d'un terme est un préfixe ("viol" trouve
+# "violée", "violeurs" ; "alcool" trouve "alcoolique"), comme l'ancien filtre par
+# sous-chaîne. Mieux vaut bloquer "violon" pour un enfant que laisser passer "violée".
+PREFIX_CATEGORIES = ("high_risk", "medium_risk", "topics_needing_adult")
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def fold_accents(text: str) -> str:
+    """Minuscules et suppression des accents ("Violencé" -> "violence")"""
+    text = unicodedata.normalize("NFKD", text.lower())
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+
+def _stem(token: str) -> str:
+    # Pluriel simple : "drogues" et "drogue" donnent la même forme
+    return token[:-1] if len(token) > 3 and token.endswith("s") else token
+
+
+def tokenize(text: str) -> List[str]:
+    return [_stem(t) for t in _TOKEN_RE.findall(fold_accents(text))]
+
+
+class TermMatcher:
+    """
+    Classe un message en une seule passe sur ses mots.
+
+    Les termes littéraux sont indexés par n-grammes de mots normalisés : le coût
+    d'une requête dépend de la longueur du message et de la taille de la plus
+    longue expression, pas du nombre de termes. Dans `prefix_categories`, le
+    dernier mot d'un terme est comparé au début du mot du message (une recherche
+    par longueur de préfixe distincte). Les quelques motifs qui ne sont pas des
+    expressions fixes sont regroupés dans une seule regex compilée.
+    """
+
+    def __init__(self, terms: Dict[str, Iterable[str]], patterns: Optional[Dict[str, Iterable[str]]] = None,
+                 prefix_categories: Iterable[str] = PREFIX_CATEGORIES):
+        prefix_categories = set(prefix_categories)
+        self._phrases: Dict[str, Dict[str, str]] = {}
+        # (mots précédents, préfixe du dernier mot) -> {catégorie: terme}
+        self._prefixes: Dict[Tuple[str, str], Dict[str, str]] = {}
+        self._prefix_lengths: List[int] = []
+        self._max_words = 1
+        for category, words in terms.items():
+            for word in words:
+                tokens = tokenize(word)
+                if not tokens:
+                    continue
+                if category in prefix_categories:
+                    self._prefixes.setdefault((" ".join(tokens[:-1]), tokens[-1]), {})[category] = word
+                    self._prefix_lengths.append(len(tokens[-1]))
+                else:
+                    self._phrases.setdefault(" ".join(tokens), {})[category] = word
+                self._max_words = max(self._max_words, len(tokens))
+        self._prefix_lengths = sorted(set(self._prefix_lengths))
+        groups = [
+            f"(?P<{category}>{'|'.join(f'(?:{fold_accents(p)})' for p in pats)})"
+            for category, pats in (patterns or {}).items() if pats
+        ]
+        self._pattern_re = re.compile("|".join(groups)) if groups else None
+
+    @classmethod
+    def from_file(cls, path: str = MODERATION_TERMS_PATH) -> "TermMatcher":
+        """Charge les listes de mots depuis un fichier JSON éditable par les modérateurs"""
+        with open(path, encoding="utf-8") as f:
+            config = json.load(f)
+        return cls(config.get("terms", {}), config.get("patterns", {}))
+
+    def classify(self, text: str) -> Dict[str, List[str]]:
+        """Renvoie {catégorie: [termes trouvés]} pour toutes les catégories touchées"""
+        hits: Dict[str, List[str]] = {}
+        tokens = tokenize(text)
+        phrases, prefixes, lengths = self._phrases, self._prefixes, self._prefix_lengths
+        for i in range(len(tokens)):
+            for n in range(1, min(self._max_words, len(tokens) - i) + 1):
+                found = phrases.get(" ".join(tokens[i:i + n]))
+                if found:
+                    for category, word in found.items():
+                        hits.setdefault(category, []).append(word)
+                if prefixes:
+                    head, last = " ".join(tokens[i:i + n - 1]), tokens[i + n - 1]
+                    for length in lengths:
+                        if length > len(last):
+                            break
+                        found = prefixes.get((head, last[:length]))
+                        if found:
+                            for category, word in found.items():
+                                hits.setdefault(category, []).append(word)
+        if self._pattern_re is not None:
+            for match in self._pattern_re.finditer(fold_accents(text)):
+                hits.setdefault(match.lastgroup, []).append(match.group())
+        return hits
+
+    def classify_many(self, texts: Iterable[str]) -> List[Dict[str, List[str]]]:
+        """classify() sur une liste de textes, dans l'ordre (vérification par lots)"""
+        classify = self.classify
+        return [classify(text) for text in texts]
+
+
+# Instance partagée, compilée une seule fois au chargement du module
+content_matcher = TermMatcher.from_file()
@@ -0,0 +1,75 @@
+# Tokens consommés par niveau et coût estimé des questions
+#
+# Alimenté par le champ `usage` des complétions renvoyées aux utilisateurs. Les
+# tokens d'entrée lus dans le cache de préfixe du fournisseur (cached_tokens,
+# quand il les signale) sont comptés à part : leur part montre si le préfixe
+# statique des prompts est bien réutilisé d'un utilisateur à l'autre.
+import os
+from typing import Dict, Optional
+
+from metrics import LEVEL_TOKENS, cached_tokens
+
+# Prix en dollars par million de tokens (Mixtral 8x7B sur Together : 0,60 $ en entrée comme en sortie)
+LLM_PRICE_INPUT_PER_M = float(os.getenv("LLM_PRICE_INPUT_PER_M", "0.6"))
+LLM_PRICE_OUTPUT_PER_M = float(os.getenv("LLM_PRICE_OUTPUT_PER_M", "0.6"))
+# Prix des tokens d'entrée lus dans le cache du fournisseur ; par défaut sans remise
+LLM_PRICE_CACHED_INPUT_PER_M = float(os.getenv("LLM_PRICE_CACHED_INPUT_PER_M", "") or LLM_PRICE_INPUT_PER_M)
+
+KINDS = ("prompt_tokens", "cached_tokens", "completion_tokens")
+
+
+class TokenUsage:
+    """Cumul des tokens par niveau et coût estimé pour 1 000 questions envoyées au LLM"""
+
+    def __init__(self, price_input_per_m: float = LLM_PRICE_INPUT_PER_M,
+                 price_cached_input_per_m: float = LLM_PRICE_CACHED_INPUT_PER_M,
+                 price_output_per_m: float = LLM_PRICE_OUTPUT_PER_M):
+        self.price_input_per_m = price_input_per_m
+        self.price_cached_input_per_m = price_cached_input_per_m
+        self.price_output_per_m = price_output_per_m
+        self.by_level: Dict[str, Dict[str, int]] = {}
+
+    def record(self, niveau: Optional[str], usage: Optional[dict]):
+        if not usage:
+            return
+        niveau = niveau or "inconnu"
+        counts = self.by_level.get(niveau)
+        if counts is None:
+            counts = self.by_level[niveau] = dict.fromkeys(("completions",) + KINDS, 0)
+        values = {
+            "prompt_tokens": int(usage.get("prompt_tokens") or 0),
+            "cached_tokens": cached_tokens(usage),
+            "completion_tokens": int(usage.get("completion_tokens") or 0),
+        }
+        counts["completions"] += 1
+        for kind, value in values.items():
+            if value:
+                counts[kind] += value
+                LEVEL_TOKENS.inc(niveau, kind[:-len("_tokens")], amount=value)
+
+    def cost(self, prompt_tokens: float, cached: float, completion_tokens: float) -> float:
+        """Coût en dollars ; les tokens en cache sont inclus dans prompt_tokens"""
+        return ((prompt_tokens - cached) * self.price_input_per_m
+                + cached * self.price_cached_input_per_m
+                + completion_tokens * self.price_output_per_m) / 1_000_000
+
+    def _summary(self, counts: Dict[str, int]) -> dict:
+        n = counts["completions"]
+        per_question = {kind: round(counts[kind] / n, 1) for kind in KINDS}
+        return dict(
+            counts,
+            per_question=per_question,
+            cached_ratio=round(counts["cached_tokens"] / counts["prompt_tokens"], 3) if counts["prompt_tokens"] else 0.0,
+            cost_per_1000_questions_usd=round(1000 * self.cost(*(counts[kind] / n for kind in KINDS)), 4),
+        )
+
+    def get_report(self) -> dict:
+        """Par niveau et au total : tokens, moyenne par question, part en cache et coût pour 1 000 questions"""
+        levels = {niveau: self._summary(counts) for niveau, counts in self.by_level.items() if counts["completions"]}
+        report = {"prices_per_m_usd": {"input": self.price_input_per_m, "cached_input": self.price_cached_input_per_m,
+                                       "output": self.price_output_per_m},
+                  "levels": levels}
+        if levels:
+            total = {key: sum(counts[key] for counts in self.by_level.values()) for key in ("completions",) + KINDS}
+            report["total"] = self._summary(total)
+        return report
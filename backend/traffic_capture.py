@@ -0,0 +1,133 @@
+# Capture du trafic réel pour le rejouer hors ligne (voir bench/replay.py)
+#
+# Désactivée par défaut. Une fois activée, chaque question qui entre dans /chat,
+# /chat/stream ou le bot Telegram est écrite en entier (message, prénom, âge,
+# session, client) avec son heure d'arrivée ; les réponses du fournisseur LLM
+# sont aussi enregistrées (latence, texte, usage) pour servir de faux amont
+# réaliste au rejeu. L'écriture passe par le thread de logging_pipeline.
+import gzip
+import hashlib
+import json
+import logging
+import os
+import re
+import secrets
+import time
+from typing import List, Optional
+
+from logging_pipeline import LOG_DIR, attach_jsonl_file
+
+TRAFFIC_CAPTURE = os.getenv("TRAFFIC_CAPTURE", "0") == "1"
+TRAFFIC_CAPTURE_DIR = os.getenv("TRAFFIC_CAPTURE_DIR", LOG_DIR)
+# Pseudonymes à la place des identifiants, coordonnées masquées, réponses LLM réduites à leur taille
+TRAFFIC_CAPTURE_ANONYMIZE = os.getenv("TRAFFIC_CAPTURE_ANONYMIZE", "1") == "1"
+# Sel des pseudonymes : à fixer pour garder les mêmes pseudonymes d'un redémarrage à l'autre
+TRAFFIC_CAPTURE_SALT = os.getenv("TRAFFIC_CAPTURE_SALT") or secrets.token_hex(16)
+
+logger = logging.getLogger(__name__)
+# Logger dédié aux enveloppes capturées (une ligne JSON par événement)
+capture_logger = logging.getLogger("factcheck.capture")
+
+_SCRUB_PATTERNS = [
+    (re.compile(r"\b[\w.+-]+@[\w-]+\.[\w.-]+\b"), "<email>"),
+    (re.compile(r"https?://\S+|www\.\S+"), "<url>"),
+    (re.compile(r"(?<!\w)(?:\+?\d[\s.-]?){8,}\d\b"), "<tel>"),
+]
+
+
+def scrub(text: str) -> str:
+    """Masque adresses e-mail, liens et numéros de téléphone (sans effet sur un texte déjà masqué)"""
+    for pattern, replacement in _SCRUB_PATTERNS:
+        text = pattern.sub(replacement, text)
+    return text
+
+
+def upstream_key(messages: List[dict]) -> str:
+    """
+    Clé d'une requête au fournisseur : prompt statique du niveau et question. Elle ne
+    dépend pas de l'utilisateur, ce qui permet de la retrouver lors d'un rejeu anonymisé.
+    """
+    question = messages[-1].get("content", "") if messages else ""
+    system = messages[0].get("content", "") if len(messages) > 1 else ""
+    return hashlib.sha1(f"{system}\x00{question}".encode("utf-8")).hexdigest()[:16]
+
+
+class TrafficCapture:
+    """Enveloppes complètes des requêtes entrantes et réponses du fournisseur, en JSONL"""
+
+    def __init__(self, enabled: bool = TRAFFIC_CAPTURE, anonymize: bool = TRAFFIC_CAPTURE_ANONYMIZE,
+                 salt: str = TRAFFIC_CAPTURE_SALT):
+        self.enabled = enabled
+        self.anonymize = anonymize
+        self.salt = salt
+        self.path: Optional[str] = None
+
+    def setup(self, service: str):
+        """Ouvre capture_<service>.jsonl (un fichier par processus, avec rotation)"""
+        if not self.enabled or self.path is not None:
+            return
+        os.makedirs(TRAFFIC_CAPTURE_DIR, exist_ok=True)
+        self.path = os.path.join(TRAFFIC_CAPTURE_DIR, f"capture_{service}.jsonl")
+        attach_jsonl_file(capture_logger, self.path)
+        logger.info(f"Traffic capture enabled ({'anonymized' if self.anonymize else 'raw'}): {self.path}")
+
+    def pseudonym(self, value) -> Optional[str]:
+        if value is None or not self.anonymize:
+            return value
+        return "u-" + hashlib.sha256(f"{self.salt}:{value}".encode("utf-8")).hexdigest()[:12]
+
+    def _write(self, event: dict):
+        capture_logger.info("capture", extra={"event": event})
+
+    def record_request(self, source: str, message: str, name: str, age: int,
+                       session_id: Optional[str] = None, client: Optional[str] = None):
+        """
+        Question reçue par une interface : `source` vaut "web", "web_stream" ou "telegram".
+        Appelé à l'arrivée, avant tout filtre : le rejeu reproduit aussi les refus.
+        """
+        if not self.enabled:
+            return
+        self._write({
+            "kind": "request",
+            "ts": time.time(),
+            "source": source,
+            "message": scrub(message) if self.anonymize else message,
+            "name": self.pseudonym(name),
+            "age": age,
+            "session_id": self.pseudonym(session_id),
+            "client": self.pseudonym(client),
+        })
+
+    def record_upstream(self, payload: dict, latency_s: float, content: str, usage: Optional[dict]):
+        """Réponse 200 du fournisseur à une complétion (non streamée)"""
+        if not self.enabled:
+            return
+        messages = payload.get("messages", [])
+        if self.anonymize:
+            # La question est masquée comme dans l'enveloppe de la requête, pour que la clé corresponde au rejeu
+            messages = messages[:-1] + [dict(messages[-1], content=scrub(messages[-1].get("content", "")))]
+        self._write({
+            "kind": "upstream",
+            "ts": time.time(),
+            "key": upstream_key(messages),
+            "latency_s": round(latency_s, 4),
+            # Anonymisé : la réponse peut citer le prénom, seule sa longueur (en mots) est gardée
+            "words": len(content.split()) if self.anonymize else None,
+            "content": None if self.anonymize else content,
+            "usage": usage,
+        })
+
+
+def read_capture(paths: List[str]) -> List[dict]:
+    """Événements de un ou plusieurs fichiers de capture (rotations .gz comprises), par heure d'arrivée"""
+    events = []
+    for path in paths:
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, "rt", encoding="utf-8") as f:
+            events.extend(json.loads(line) for line in f if line.strip())
+    events.sort(key=lambda event: event["ts"])
+    return events
+
+
+# Instance partagée ; chaque interface appelle setup() avec son nom de service
+traffic_capture = TrafficCapture()
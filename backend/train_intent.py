@@ -0,0 +1,163 @@
+# Entraînement du classifieur d'intention (intent_classifier.py)
+#
+# Usage :
+#   python train_intent.py                                  # exemples de intent_data.jsonl
+#   python train_intent.py etiquetes_2024-06.jsonl --cv 5   # + exemples étiquetés tirés des journaux
+#
+# Chaque ligne d'entrée est un objet JSON avec "label" (claim, question,
+# off_topic ou bypass) et "text" ou "message" : un extrait de interactions_*.jsonl
+# ou capture_*.jsonl auquel on a ajouté l'étiquette convient tel quel. Les
+# doublons (même texte normalisé) ne comptent qu'une fois, la dernière étiquette
+# l'emporte. Le script affiche la validation croisée (exactitude, précision et
+# rappel par étiquette, et précision des seules prédictions au-dessus du seuil
+# --threshold, celles sur lesquelles le service agit) puis écrit le modèle
+# entraîné sur toutes les données ; le fichier produit est versionné avec le code.
+# L'entraînement est déterministe (--seed) : mêmes données, même modèle.
+import argparse
+import json
+import math
+import os
+import random
+from collections import Counter
+from typing import Dict, List, Tuple
+
+from intent_classifier import INTENT_MODEL_PATH, INTENT_THRESHOLD, LABELS, IntentModel, featurize
+from text_matcher import fold_accents
+
+INTENT_DATA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "intent_data.jsonl")
+# 2^18 seaux : collisions négligeables pour quelques milliers d'exemples, modèle compact
+BUCKETS = 1 << 18
+
+Example = Tuple[List[int], int]
+
+
+def load_examples(paths: List[str]) -> List[Tuple[str, str]]:
+    by_text: Dict[str, Tuple[str, str]] = {}
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                item = json.loads(line)
+                text, label = item.get("text") or item.get("message"), item.get("label")
+                if not text or label not in LABELS:
+                    continue
+                by_text[" ".join(fold_accents(text).split())] = (text, label)
+    return list(by_text.values())
+
+
+def train(examples: List[Example], epochs: int, learning_rate: float, l2: float, seed: int
+          ) -> Tuple[List[float], Dict[int, List[float]]]:
+    """Régression logistique multiclasse (softmax), descente de gradient stochastique avec pénalité L2"""
+    n_labels = len(LABELS)
+    bias = [0.0] * n_labels
+    weights: Dict[int, List[float]] = {}
+    order = list(range(len(examples)))
+    rng = random.Random(seed)
+    for epoch in range(epochs):
+        rng.shuffle(order)
+        rate = learning_rate / (1 + epoch * 0.1)
+        for index in order:
+            features, target = examples[index]
+            scale = 1 / math.sqrt(len(features)) if features else 0.0
+            logits = list(bias)
+            for feature in features:
+                row = weights.get(feature)
+                if row is not None:
+                    for k in range(n_labels):
+                        logits[k] += row[k] * scale
+            top = max(logits)
+            exps = [math.exp(logit - top) for logit in logits]
+            total = sum(exps)
+            gradient = [exps[k] / total - (k == target) for k in range(n_labels)]
+            for k in range(n_labels):
+                bias[k] -= rate * gradient[k]
+            for feature in features:
+                row = weights.setdefault(feature, [0.0] * n_labels)
+                for k in range(n_labels):
+                    row[k] -= rate * (gradient[k] * scale + l2 * row[k])
+    return bias, weights
+
+
+def build_model(examples: List[Example], args) -> IntentModel:
+    bias, weights = train(examples, args.epochs, args.learning_rate, args.l2, args.seed)
+    # Poids négligeables retirés et arrondis : fichier plus petit, scores inchangés à 1e-3 près
+    pruned = {feature: [round(weight, 4) for weight in row] for feature, row in weights.items()
+              if max(abs(weight) for weight in row) >= args.prune}
+    return IntentModel(list(LABELS), [round(value, 4) for value in bias], pruned, BUCKETS)
+
+
+def predict(model: IntentModel, features: List[int]) -> Tuple[int, float]:
+    """Étiquette la plus probable et sa probabilité"""
+    logits = model.logits(features)
+    top = max(logits)
+    exps = [math.exp(logit - top) for logit in logits]
+    best = max(range(len(exps)), key=exps.__getitem__)
+    return best, exps[best] / sum(exps)
+
+
+def cross_validate(examples: List[Example], folds: int, args) -> dict:
+    shuffled = list(examples)
+    random.Random(args.seed).shuffle(shuffled)
+    confusion = Counter()
+    # Prédictions au-dessus du seuil : seules celles-ci changent la décision du service
+    confident = Counter()
+    for fold in range(folds):
+        test = shuffled[fold::folds]
+        model = build_model([example for i, example in enumerate(shuffled) if i % folds != fold], args)
+        for features, target in test:
+            guess, probability = predict(model, features)
+            confusion[(target, guess)] += 1
+            if probability >= args.threshold:
+                confident[(target, guess)] += 1
+    report = {"accuracy": round(sum(confusion[(k, k)] for k in range(len(LABELS))) / len(examples), 3)}
+    for k, label in enumerate(LABELS):
+        predicted = sum(count for (_, guess), count in confusion.items() if guess == k)
+        actual = sum(count for (truth, _), count in confusion.items() if truth == k)
+        above = sum(count for (_, guess), count in confident.items() if guess == k)
+        report[label] = {
+            "precision": round(confusion[(k, k)] / predicted, 3) if predicted else None,
+            "recall": round(confusion[(k, k)] / actual, 3) if actual else None,
+            "support": actual,
+            "precision_above_threshold": round(confident[(k, k)] / above, 3) if above else None,
+            "predicted_above_threshold": above,
+        }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Entraîne le classifieur d'intention")
+    parser.add_argument("data", nargs="*", help="exemples étiquetés supplémentaires (JSONL)")
+    parser.add_argument("--seed-data", default=INTENT_DATA_PATH, help="exemples de base ('' : aucun)")
+    parser.add_argument("--output", default=INTENT_MODEL_PATH)
+    parser.add_argument("--epochs", type=int, default=30)
+    parser.add_argument("--learning-rate", type=float, default=0.5)
+    parser.add_argument("--l2", type=float, default=1e-4)
+    parser.add_argument("--prune", type=float, default=0.01, help="poids absolu minimal conservé")
+    parser.add_argument("--cv", type=int, default=5, help="plis de validation croisée (0 : aucune)")
+    parser.add_argument("--threshold", type=float, default=INTENT_THRESHOLD,
+                        help="seuil de confiance évalué (INTENT_THRESHOLD)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    raw = load_examples(([args.seed_data] if args.seed_data else []) + args.data)
+    if not raw:
+        parser.error("aucun exemple étiqueté")
+    examples = [(featurize(text, BUCKETS), LABELS.index(label)) for text, label in raw]
+    print(f"{len(examples)} exemples : {dict(Counter(label for _, label in raw))}")
+
+    if args.cv > 1:
+        report = cross_validate(examples, args.cv, args)
+        print(f"Validation croisée ({args.cv} plis) : exactitude {report['accuracy']}, "
+              f"seuil {args.threshold}")
+        for label in LABELS:
+            print(f"  {label:<10} {report[label]}")
+
+    model = build_model(examples, args)
+    model.save(args.output, {"examples": len(examples), "epochs": args.epochs, "l2": args.l2})
+    print(f"Modèle : {args.output} ({len(model.weights)} caractéristiques, "
+          f"{os.path.getsize(args.output) // 1024} Ko)")
+
+
+if __name__ == "__main__":
+    main()
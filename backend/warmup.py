@@ -0,0 +1,139 @@
+# Démarrage rapide : initialisations différées, préchauffage en tâche de fond et état de disponibilité
+#
+# Le serveur accepte des requêtes dès que le module de l'application est importé ;
+# ce qui peut attendre (index de la base de faits, connexions vers le fournisseur
+# LLM...) est fait juste après, en tâche de fond, ou à la première utilisation si
+# une requête arrive avant. /healthz (vivant) répond toujours, /readyz (prêt)
+# seulement une fois le préchauffage terminé.
+import asyncio
+import inspect
+import logging
+import os
+import time
+from typing import Callable, Dict, Optional
+
+from metrics import STARTUP_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Préchauffage en tâche de fond au démarrage ; sinon tout est initialisé à la première requête
+WARMUP_ENABLED = os.getenv("WARMUP", "1") == "1"
+
+
+def process_start_time() -> float:
+    """Heure (epoch) de lancement du processus, interpréteur compris (Linux, /proc), sinon maintenant"""
+    try:
+        with open("/proc/self/stat") as f:
+            # Le nom du programme (2e champ) peut contenir des espaces : on repart de la parenthèse fermante
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/stat") as f:
+            boot_time = next(int(line.split()[1]) for line in f if line.startswith("btime"))
+        return boot_time + start_ticks / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError, StopIteration):
+        return time.time()
+
+
+PROCESS_START = process_start_time()
+
+
+class Warmup:
+    """
+    Étapes d'initialisation (fonctions ou coroutines) exécutées une fois, dans
+    l'ordre, après le démarrage. Chaque étape doit aussi être faite à la demande
+    par le code qui en dépend : le préchauffage n'est qu'une avance, une requête
+    arrivée trop tôt est servie quand même. L'échec d'une étape est journalisé
+    et n'empêche pas de devenir prêt.
+    """
+
+    def __init__(self):
+        self._steps: Dict[str, Callable] = {}
+        self.steps: Dict[str, dict] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.ready_at: Optional[float] = None
+        self.first_request_at: Optional[float] = None
+
+    def add(self, name: str, step: Callable):
+        self._steps[name] = step
+        self.steps[name] = {"status": "pending"}
+
+    def start(self) -> asyncio.Task:
+        """Lance le préchauffage en tâche de fond (une seule fois par processus)"""
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self.run())
+        return self._task
+
+    def cancel(self):
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+
+    async def run(self):
+        for name, step in self._steps.items():
+            state = self.steps[name]
+            state["status"] = "running"
+            start = time.perf_counter()
+            try:
+                result = step()
+                if inspect.isawaitable(result):
+                    await result
+                state["status"] = "done"
+            except Exception as e:
+                state["status"] = "failed"
+                state["error"] = str(e)
+                logger.warning(f"Warm-up step {name} failed: {e}")
+            state["seconds"] = round(time.perf_counter() - start, 4)
+            # Laisse passer les requêtes déjà arrivées entre deux étapes
+            await asyncio.sleep(0)
+        self.ready_at = time.time()
+        STARTUP_SECONDS.set(self.ready_at - PROCESS_START, "ready")
+        logger.info(f"Warm-up done {self.ready_at - PROCESS_START:.3f}s after process start: {self.steps}")
+
+    @property
+    def ready(self) -> bool:
+        # Sans préchauffage, l'initialisation se fait à la demande : prêt dès le démarrage
+        return self.ready_at is not None or not WARMUP_ENABLED
+
+    def request_served(self):
+        """À appeler après chaque réponse : mesure le délai jusqu'à la première requête servie"""
+        if self.first_request_at is None:
+            self.first_request_at = time.time()
+            STARTUP_SECONDS.set(self.first_request_at - PROCESS_START, "first_request")
+            logger.info(f"First request served {self.first_request_at - PROCESS_START:.3f}s after process start")
+
+    def get_state(self) -> dict:
+        def since_start(moment):
+            return round(moment - PROCESS_START, 4) if moment is not None else None
+        return {
+            "status": "ready" if self.ready else "warming",
+            "uptime_s": round(time.time() - PROCESS_START, 3),
+            "ready_after_s": since_start(self.ready_at),
+            "first_request_after_s": since_start(self.first_request_at),
+            "steps": self.steps,
+        }
+
+
+class FirstRequestMiddleware:
+    """
+    Middleware ASGI : note la fin de la première réponse servie (hors sondes et
+    métriques). Ensuite, une seule comparaison par requête.
+    """
+
+    IGNORED_PATHS = ("/", "/healthz", "/readyz", "/metrics")
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if warmup.first_request_at is not None or scope["type"] != "http" or scope["path"] in self.IGNORED_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_and_mark(message):
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body"):
+                warmup.request_served()
+
+        await self.app(scope, receive, send_and_mark)
+
+
+# Instance partagée par les interfaces d'un même processus
+warmup = Warmup()
@@ -24,6 +24,12 @@ export default function Home() {
   const [loading, setLoading] = useState(false);
   const [year, setYear] = useState<number | null>(null);
   const chatEndRef = useRef<HTMLDivElement>(null);
+  // Identifiant de conversation de la page : le backend garde les échanges précédents
+  const sessionIdRef = useRef<string>("");
+  // Index de la dernière réponse à une question, et question de suivi en cours de saisie :
+  // l'historique n'est envoyé (sans cache côté serveur) que pour une question de suivi
+  const [lastAnswerIdx, setLastAnswerIdx] = useState<number | null>(null);
+  const [followUp, setFollowUp] = useState(false);
 
   useEffect(() => {
     chatEndRef.current?.scrollIntoView({ behavior: "smooth" });
@@ -31,13 +37,20 @@ export default function Home() {
 
   useEffect(() => {
     setYear(new Date().getFullYear());
+    sessionIdRef.current = crypto.randomUUID();
   }, []);
 
   const handleSend = async () => {
     if (!input.trim()) return;
+    // Position de la réponse : après le message de l'utilisateur ajouté ci-dessous
+    const answerIdx = messages.length + 1;
     setMessages((prev) => [...prev, { role: "user", content: input }]);
     setLoading(true);
-    let payload: { message: string; name: string; age: number } = { message: "", name: "", age: 0 };
+    let payload: { message: string; name: string; age: number; session_id?: string; follow_up?: boolean } = {
+      message: "",
+      name: "",
+      age: 0,
+    };
     let nextStep = step;
     if (step === "awaiting_name") {
       payload = { message: input, name: input.trim(), age: 0 };
@@ -53,25 +66,56 @@ export default function Home() {
         payload = { message: input, name, age: 0 };
       }
     } else if (step === "ready") {
-      payload = { message: input, name, age: age ?? 0 };
+      payload = { message: input, name, age: age ?? 0, session_id: sessionIdRef.current, follow_up: followUp };
     }
+    const askedInReadyStep = step === "ready";
     setInput("");
+    setFollowUp(false);
+    setLastAnswerIdx(null);
     try {
       const apiUrl = (process.env.NEXT_PUBLIC_API_URL || "http://localhost:8000").replace(/\/$/, "");
-      const res = await fetch(`${apiUrl}/chat`, {
+      const res = await fetch(`${apiUrl}/chat/stream`, {
         method: "POST",
         headers: { "Content-Type": "application/json" },
         body: JSON.stringify(payload),
       });
-      const data = await res.json();
-      setMessages((prev) => [
-        ...prev,
-        { role: "assistant", content: data.response },
-      ]);
-      if (data.response && data.response.includes("Quel âge as-tu")) {
+      if (!res.ok || !res.body) throw new Error(`HTTP ${res.status}`);
+      // Les tokens arrivent en Server-Sent Events : on affiche la réponse au fil de l'eau,
+      // puis l'événement final ("done") contient la réponse complète.
+      setMessages((prev) => [...prev, { role: "assistant", content: "" }]);
+      const updateLastMessage = (update: (content: string) => string) =>
+        setMessages((prev) => {
+          const last = prev[prev.length - 1];
+          return [...prev.slice(0, -1), { ...last, content: update(last.content) }];
+        });
+      const reader = res.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = "";
+      let finalResponse = "";
+      while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        const events = buffer.split("\n\n");
+        buffer = events.pop() ?? "";
+        for (const event of events) {
+          if (!event.startsWith("data:")) continue;
+          const data = JSON.parse(event.slice(5).trim());
+          if (data.done) {
+            finalResponse = data.response;
+            updateLastMessage(() => data.response);
+          } else if (data.token) {
+            updateLastMessage((content) => content + data.token);
+          }
+        }
+      }
+      if (askedInReadyStep && finalResponse) {
+        setLastAnswerIdx(answerIdx);
+      }
+      if (finalResponse.includes("Quel âge as-tu")) {
         setStep("awaiting_age");
         setInput("");
-      } else if (data.response && data.response.includes("Pose-moi une question")) {
+      } else if (finalResponse.includes("Pose-moi une question")) {
         setStep("ready");
         setInput("");
       } else if (nextStep) {
@@ -130,6 +174,17 @@ export default function Home() {
                 }`}
               >
                 {msg.content}
+                {idx === lastAnswerIdx && !loading && (
+                  <button
+                    onClick={() => setFollowUp(!followUp)}
+                    className={`block mt-2 text-sm font-semibold underline ${
+                      followUp ? "text-[#242672]" : "text-[#9F7AF8]"
+                    }`}
+                    aria-pressed={followUp}
+                  >
+                    {followUp ? "✖️ Nouvelle question" : "↩️ Une question sur cette réponse ?"}
+                  </button>
+                )}
               </div>
               {msg.role === "user" && (
                 <Image
@@ -153,6 +208,8 @@ export default function Home() {
                 ? "Tape ton prénom ici..."
                 : step === "awaiting_age"
                 ? "Tape ton âge ici..."
+                : followUp
+                ? "Ta question sur la réponse précédente..."
                 : "Pose ta question ici..."
             }
             value={input}